@@ -1,21 +1,217 @@
+import base64
+import csv
+import hashlib
 import json
 import os
 import datetime
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, request, jsonify, stream_with_context
 from flask_cors import CORS
-from openai import OpenAI
-from config import supabase
+from bulk_import import ImportReport, import_rows, iter_csv, iter_json_array
+from cache import DEFAULT_VERSION_DB, TTLCache, VersionStore
+from chat_aggregates import run_aggregate, validate_plan
+from chat_compaction import TokenLedger, compact_rows, selected_columns
+from compression import ResponseCompressor
+from config import LazyClient, make_supabase
+from dashboard_stats import DashboardStats
+from delta_sync import advance, changed_ids, decode_token, encode_token
+from export import (
+    CONTACT_FIELDS, EXPORT_FORMATS, INTERACTION_FIELDS, created_range, csv_chunks, iter_pages, ndjson_chunks,
+)
+from follow_ups import FollowUpAgenda
+from json_provider import FastJSONProvider
+from openai_pool import ClientPool
+from plan_cache import DEFAULT_PLAN_DB, PlanCache
+from query_pool import QueryPool
+from search_index import DEFAULT_CHANGES_DB, ChangeLog, SearchIndex
+from single_flight import FlightTimeout, SingleFlight
+from tracing import Tracer
 
 app = Flask(__name__)
+# orjson when installed; JSON_ENCODER=stdlib forces the json module
+app.json = FastJSONProvider(app, encoder=os.environ.get("JSON_ENCODER") or None)
 cors_origin = os.environ.get("CORS_ORIGIN", "*")
 CORS(app, resources={r"/api/*": {"origins": cors_origin}})
 
+# Request timing and upstream spans for /api/metrics; PROFILE_SAMPLE_RATE > 0 stack-samples requests
+tracer = Tracer(
+    slow_ms=float(os.environ.get("TRACE_SLOW_MS", 1000)),
+    profile_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+    profile_interval=float(os.environ.get("PROFILE_INTERVAL_MS", 10)) / 1000,
+    logger=app.logger,
+)
+
+# Supabase client with upstream spans, built on first use in each worker
+supabase = LazyClient(lambda: make_supabase(event_hooks=tracer.httpx_hooks("supabase")))
+
+# gzip/brotli for buffered /api/* responses of at least COMPRESS_MIN_SIZE bytes
+compressor = ResponseCompressor(
+    min_size=int(os.environ.get("COMPRESS_MIN_SIZE", 1024)),
+    gzip_level=int(os.environ.get("COMPRESS_GZIP_LEVEL", 6)),
+    brotli_quality=int(os.environ.get("COMPRESS_BROTLI_QUALITY", 4)),
+)
+
+# Independent Supabase queries of one request run in parallel, bounded per worker and per request
+queries = QueryPool(
+    max_workers=int(os.environ.get("SUPABASE_QUERY_THREADS", 8)),
+    fanout=int(os.environ.get("SUPABASE_QUERY_FANOUT", 4)),
+)
+
+# Hebrew-aware contact search, kept current across workers via a shared change log
+search_index = SearchIndex(
+    ChangeLog(os.environ.get("SEARCH_CHANGES_DB", DEFAULT_CHANGES_DB) or None),
+    rebuild_every=float(os.environ.get("SEARCH_INDEX_REBUILD", 600)),
+)
+
+# Per-worker dashboard aggregates; writes from other workers show up after the TTL
+dashboard_stats = DashboardStats(ttl=float(os.environ.get("DASHBOARD_CACHE_TTL", 30)), gather=queries.gather)
+
+# Concurrent identical reads of the contact list and dashboard share one upstream call
+read_flights = SingleFlight(
+    timeout=float(os.environ.get("COALESCE_TIMEOUT", 10)),
+    enabled=os.environ.get("COALESCE_READS", "1") != "0",
+    registry=tracer.registry,
+)
+
+# Follow-up agenda, read from the follow_ups table that triggers keep current
+follow_up_agenda = FollowUpAgenda(gather=queries.gather)
+
+# Serialized contact detail responses, invalidated across workers via a shared version file
+contact_cache = TTLCache(
+    "contact",
+    maxsize=int(os.environ.get("CONTACT_CACHE_SIZE", 1000)),
+    ttl=float(os.environ.get("CONTACT_CACHE_TTL", 60)),
+    versions=VersionStore(os.environ.get("CACHE_VERSION_DB", DEFAULT_VERSION_DB) or None),
+)
+
+# Chat query plans keyed on (normalized question, date), shared by workers via SQLite
+plan_cache = PlanCache(
+    os.environ.get("CHAT_PLAN_CACHE_DB", DEFAULT_PLAN_DB) or None,
+    maxsize=int(os.environ.get("CHAT_PLAN_CACHE_SIZE", 2000)),
+    flush_interval=float(os.environ.get("CHAT_PLAN_CACHE_FLUSH", 5)),
+)
+
+# Size limits for query results passed to the summary model
+CHAT_MAX_ROWS = int(os.environ.get("CHAT_MAX_ROWS", 200))
+CHAT_TOKEN_BUDGET = int(os.environ.get("CHAT_TOKEN_BUDGET", 4000))
+chat_tokens = TokenLedger()
+
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", 60))
+OPENAI_KEEPALIVE = float(os.environ.get("OPENAI_KEEPALIVE", 120))
+
+
+def make_openai_client(api_key):
+    # The SDK takes longer to import than the rest of the app, so it loads with the first chat
+    import openai
+
+    # Limits must be the SDK's own class (httpx or httpx2 depending on the openai version)
+    limits = type(openai.DEFAULT_CONNECTION_LIMITS)(
+        max_connections=20, max_keepalive_connections=5, keepalive_expiry=OPENAI_KEEPALIVE
+    )
+    return openai.OpenAI(
+        api_key=api_key,
+        timeout=openai.Timeout(OPENAI_TIMEOUT, connect=5.0),
+        max_retries=1,
+        http_client=openai.DefaultHttpxClient(limits=limits, event_hooks=tracer.httpx_hooks("openai")),
+    )
+
+
+# One OpenAI client (and connection pool) per API key, reused across chat requests
+openai_pool = ClientPool(
+    make_openai_client,
+    maxsize=int(os.environ.get("OPENAI_POOL_SIZE", 32)),
+    idle_ttl=float(os.environ.get("OPENAI_POOL_IDLE_TTL", 300)),
+)
+
+
+@app.before_request
+def start_trace():
+    if request.path.startswith("/api/"):
+        tracer.start(request.method, request.url_rule.rule if request.url_rule else "unmatched")
+
+
+@app.after_request
+def finish_trace(response):
+    trace = tracer.current()
+    if trace is not None:
+        if not response.is_streamed:
+            response.headers["Server-Timing"] = trace.server_timing()
+        # On close, so streamed responses are timed to their last byte
+        response.call_on_close(lambda: tracer.finish(trace, response.status_code))
+    return response
+
+
+@app.after_request
+def compress_api_response(response):
+    if request.path.startswith("/api/"):
+        return compressor.compress(response, request.headers.get("Accept-Encoding"))
+    return response
+
 # ─── Health Check ────────────────────────────────────────────────────────────
 
 @app.route("/api/health")
 def health():
     return jsonify({"status": "ok"})
 
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    return jsonify({
+        "contact_detail": contact_cache.stats(),
+        "chat_plans": plan_cache.stats(),
+        "openai_clients": openai_pool.stats(),
+        "supabase_queries": queries.stats(),
+        "search_index": search_index.stats(),
+        "compression": compressor.stats(),
+        "read_flights": read_flights.stats(),
+    })
+
+
+@app.route("/api/chat/stats")
+def chat_stats():
+    return jsonify(chat_tokens.stats())
+
+
+@app.route("/api/metrics")
+def metrics():
+    """Prometheus text format: request/upstream histograms and counters."""
+    return app.response_class(tracer.registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.route("/api/metrics/slow")
+def slow_requests():
+    return jsonify({
+        "threshold_ms": tracer.slow_ms,
+        "profile_rate": tracer.profile_rate,
+        "requests": tracer.slow_reports(),
+    })
+
+# ─── Pagination ──────────────────────────────────────────────────────────────
+
+CONTACTS_PAGE_SIZE = 50
+CONTACTS_MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(row):
+    """Opaque keyset cursor pointing just past `row` in (created_at, id) order."""
+    raw = json.dumps([row["created_at"], row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor, raising ValueError if malformed."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (TypeError, ValueError):
+        raise ValueError("invalid cursor")
+    for value in (created_at, row_id):
+        # Values are quoted into a PostgREST filter, so keep them inert
+        if not isinstance(value, str) or '"' in value or "\\" in value:
+            raise ValueError("invalid cursor")
+    return created_at, row_id
+
+
 # ─── Contacts ────────────────────────────────────────────────────────────────
 
 @app.route("/api/contacts", methods=["GET"])
@@ -23,89 +219,165 @@ def get_contacts():
     try:
         search = request.args.get("search", "").strip()
         status = request.args.get("status", "").strip()
+        cursor = request.args.get("cursor", "").strip()
+        limit = request.args.get("limit", CONTACTS_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, CONTACTS_MAX_PAGE_SIZE))
+
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+        # Identical lists requested at the same time share one set of queries
+        body = read_flights.do(
+            ("contacts", search, status, cursor, limit), lambda: load_contact_list(search, status, after, limit)
+        )
+        return app.response_class(body, mimetype="application/json"), 200
+    except FlightTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        query = supabase.table("contacts").select("*").order("created_at", desc=True)
 
+def load_contact_list(search, status, after, limit):
+    """One page of the contact list as a serialized JSON body."""
+    # Embed each contact's latest interaction so the whole list is one round trip
+    query = contact_list_query()
+
+    if search and search_index.refresh(supabase):
+        # The index resolves search, status and cursor to the page's ids. It
+        # may lag the database, so status is checked again there, and the
+        # next cursor follows the index so rows gone from the database do
+        # not end paging early.
+        found = search_index.search(search, status=status or None, after=after, limit=limit + 1, with_keys=True)
+        next_cursor = None
+        if len(found) > limit:
+            found = found[:limit]
+            created_at, contact_id = found[-1][1]
+            next_cursor = encode_cursor({"created_at": created_at, "id": contact_id})
+        if not found:
+            return app.json.dumps({"contacts": [], "next_cursor": None}) + "\n"
+        query = query.in_("id", [contact_id for contact_id, _ in found])
+        if status:
+            query = query.eq("status", status)
+        contacts = query.execute().data
+    else:
         if status:
             query = query.eq("status", status)
         if search:
             query = query.or_(
                 f"name.ilike.%{search}%,email.ilike.%{search}%,company.ilike.%{search}%"
             )
-
-        result = query.execute()
-        contacts = result.data
-
-        # Enrich each contact with latest interaction's next_action info
-        for contact in contacts:
-            interaction_result = (
-                supabase.table("interactions")
-                .select("next_action, next_action_date, summary, type, created_at")
-                .eq("contact_id", contact["id"])
-                .order("created_at", desc=True)
-                .limit(1)
-                .execute()
+        if after:
+            after_created_at, after_id = after
+            query = query.or_(
+                f'created_at.lt."{after_created_at}",'
+                f'and(created_at.eq."{after_created_at}",id.lt."{after_id}")'
             )
-            if interaction_result.data:
-                latest = interaction_result.data[0]
-                contact["latest_interaction_summary"] = latest["summary"]
-                contact["latest_interaction_type"] = latest["type"]
-                contact["latest_interaction_date"] = latest["created_at"]
-                contact["next_action"] = latest["next_action"]
-                contact["next_action_date"] = latest["next_action_date"]
-            else:
-                contact["latest_interaction_summary"] = None
-                contact["latest_interaction_type"] = None
-                contact["latest_interaction_date"] = None
-                contact["next_action"] = None
-                contact["next_action_date"] = None
 
-        return jsonify({"contacts": contacts}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        # Fetch one extra row to learn whether another page exists
+        contacts = query.limit(limit + 1).execute().data
+        next_cursor = None
+        if len(contacts) > limit:
+            contacts = contacts[:limit]
+            next_cursor = encode_cursor(contacts[-1])
+
+    for contact in contacts:
+        flatten_latest_interaction(contact)
+
+    return app.json.dumps({"contacts": contacts, "next_cursor": next_cursor}) + "\n"
+
+
+def contact_list_query():
+    """Contacts with their latest interaction embedded, as the contact list shows them."""
+    return (
+        supabase.table("contacts")
+        .select("*, interactions(next_action, next_action_date, summary, type, created_at)")
+        .order("created_at", desc=True)
+        .order("id", desc=True)
+        .order("created_at", desc=True, foreign_table="interactions")
+        .limit(1, foreign_table="interactions")
+    )
+
+
+def flatten_latest_interaction(contact):
+    """Replace the embedded interaction with the latest_interaction_* fields."""
+    interactions = contact.pop("interactions", None) or []
+    latest = interactions[0] if interactions else {}
+    contact["latest_interaction_summary"] = latest.get("summary")
+    contact["latest_interaction_type"] = latest.get("type")
+    contact["latest_interaction_date"] = latest.get("created_at")
+    contact["next_action"] = latest.get("next_action")
+    contact["next_action_date"] = latest.get("next_action_date")
+    return contact
+
+
+def load_contact_detail(contact_id):
+    """Fetch a contact and its timeline; returns (json body, etag) or None."""
+    contact_result, interactions_result = queries.gather(
+        lambda: supabase.table("contacts").select("*").eq("id", contact_id).execute(),
+        lambda: (
+            supabase.table("interactions")
+            .select("*")
+            .eq("contact_id", contact_id)
+            .order("created_at", desc=True)
+            .execute()
+        ),
+    )
+    if not contact_result.data:
+        return None
+
+    body = app.json.dumps({
+        "contact": contact_result.data[0],
+        "interactions": interactions_result.data,
+    }) + "\n"
+    etag = hashlib.sha256(body.encode()).hexdigest()[:32]
+    return body, etag
 
 
 @app.route("/api/contacts/<contact_id>", methods=["GET"])
 def get_contact(contact_id):
     try:
-        contact_result = (
-            supabase.table("contacts").select("*").eq("id", contact_id).execute()
-        )
-        if not contact_result.data:
+        detail = contact_cache.get_or_load(contact_id, lambda: load_contact_detail(contact_id))
+        if detail is None:
             return jsonify({"error": "Contact not found"}), 404
 
-        interactions_result = (
-            supabase.table("interactions")
-            .select("*")
-            .eq("contact_id", contact_id)
-            .order("created_at", desc=True)
-            .execute()
-        )
-
-        return jsonify({
-            "contact": contact_result.data[0],
-            "interactions": interactions_result.data,
-        }), 200
+        body, etag = detail
+        response = app.response_class(body, mimetype="application/json")
+        response.set_etag(etag)
+        # Let browsers keep the body but revalidate every time (304 if unchanged)
+        response.headers["Cache-Control"] = "no-cache"
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def contact_from_payload(data):
+    """Build a contacts row from request data; returns (row, None) or (None, error)."""
+    if not isinstance(data, dict) or not data.get("name"):
+        return None, "name is required"
+    return {
+        "name": data["name"],
+        "email": data.get("email", ""),
+        "phone": data.get("phone", ""),
+        "company": data.get("company", ""),
+        "status": data.get("status", "ליד"),
+    }, None
+
+
 @app.route("/api/contacts", methods=["POST"])
 def create_contact():
     try:
-        data = request.get_json()
-        if not data or not data.get("name"):
-            return jsonify({"error": "name is required"}), 400
-
-        contact = {
-            "name": data["name"],
-            "email": data.get("email", ""),
-            "phone": data.get("phone", ""),
-            "company": data.get("company", ""),
-            "status": data.get("status", "ליד"),
-        }
+        contact, error = contact_from_payload(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
 
         result = supabase.table("contacts").insert(contact).execute()
+        dashboard_stats.contact_created(result.data[0]["status"])
+        search_index.put(result.data[0])
+        read_flights.forget("contacts", "dashboard")
         return jsonify({"contact": result.data[0]}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -128,6 +400,11 @@ def update_contact(contact_id):
         if not result.data:
             return jsonify({"error": "Contact not found"}), 404
 
+        contact_cache.invalidate(contact_id)
+        search_index.put(result.data[0])
+        if "status" in update_data:
+            dashboard_stats.contacts_changed()
+        read_flights.forget("contacts", "dashboard")
         return jsonify({"contact": result.data[0]}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -137,34 +414,108 @@ def update_contact(contact_id):
 def delete_contact(contact_id):
     try:
         supabase.table("contacts").delete().eq("id", contact_id).execute()
+        contact_cache.invalidate(contact_id)
+        search_index.remove(contact_id)
+        # Interactions cascade with the contact
+        dashboard_stats.contacts_changed()
+        dashboard_stats.interactions_changed()
+        read_flights.forget("contacts", "dashboard")
         return jsonify({"message": "Contact deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# ─── Contact Sync ────────────────────────────────────────────────────────────
+
+SYNC_PAGE_SIZE = 200
+SYNC_ROW_LIMIT = 1000
+# Oldest token that can resume; keep it below the age at which contact_changes rows are pruned
+SYNC_MAX_AGE = float(os.environ.get("CONTACT_SYNC_MAX_AGE", 7 * 24 * 3600))
+
+
+def latest_sync_token():
+    rows = supabase.table("contact_changes").select("seq").order("seq", desc=True).limit(1).execute().data
+    return encode_token(rows[0]["seq"] if rows else 0)
+
+
+@app.route("/api/contacts/changes", methods=["GET"])
+def get_contact_changes():
+    """Contacts changed since `since`, as /api/contacts lists them, plus the ids of deleted ones.
+
+    Without `since` only a token is returned: take one before loading the
+    list, then sync from it after writes. `more` means another call with the
+    new token has further changes; `reset` means the token is too old and
+    the list should be reloaded.
+    """
+    try:
+        since = request.args.get("since", "").strip()
+        if not since:
+            return jsonify({"contacts": [], "deleted": [], "next": latest_sync_token(), "more": False}), 200
+        try:
+            seq, issued, gaps = decode_token(since)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if time.time() - issued > SYNC_MAX_AGE:
+            return jsonify({"reset": True, "next": latest_sync_token()}), 200
+
+        query = supabase.table("contact_changes").select("seq, contact_id")
+        if gaps:
+            query = query.or_(f"seq.gt.{seq},seq.in.({','.join(map(str, gaps))})")
+        else:
+            query = query.gt("seq", seq)
+        rows = query.order("seq").limit(SYNC_ROW_LIMIT).execute().data
+
+        ids, seen, more = changed_ids(rows, SYNC_PAGE_SIZE)
+        contacts = []
+        if ids:
+            contacts = [flatten_latest_interaction(c) for c in contact_list_query().in_("id", ids).execute().data]
+        # A changed contact that no longer exists was deleted
+        found = {c["id"] for c in contacts}
+        deleted = [contact_id for contact_id in ids if contact_id not in found]
+
+        seq, gaps = advance(seq, gaps, seen)
+        return jsonify({
+            "contacts": contacts,
+            "deleted": deleted,
+            "next": encode_token(seq, gaps),
+            "more": more or len(rows) == SYNC_ROW_LIMIT,
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # ─── Interactions ────────────────────────────────────────────────────────────
 
+def interaction_from_payload(data):
+    """Build an interactions row from request data; returns (row, None) or (None, error)."""
+    if not isinstance(data, dict) or not data:
+        return None, "No data provided"
+
+    required = ["contact_id", "type", "summary"]
+    for field in required:
+        if not data.get(field):
+            return None, f"{field} is required"
+
+    return {
+        "contact_id": data["contact_id"],
+        "type": data["type"],
+        "summary": data["summary"],
+        "next_action": data.get("next_action", ""),
+        "next_action_date": data.get("next_action_date") or None,
+    }, None
+
+
 @app.route("/api/interactions", methods=["POST"])
 def create_interaction():
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
-
-        required = ["contact_id", "type", "summary"]
-        for field in required:
-            if not data.get(field):
-                return jsonify({"error": f"{field} is required"}), 400
-
-        interaction = {
-            "contact_id": data["contact_id"],
-            "type": data["type"],
-            "summary": data["summary"],
-            "next_action": data.get("next_action", ""),
-            "next_action_date": data.get("next_action_date") or None,
-        }
+        interaction, error = interaction_from_payload(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
 
         result = supabase.table("interactions").insert(interaction).execute()
+        contact_cache.invalidate(interaction["contact_id"])
+        dashboard_stats.interactions_changed()
+        read_flights.forget("contacts", "dashboard")
         return jsonify({"interaction": result.data[0]}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -173,44 +524,193 @@ def create_interaction():
 @app.route("/api/interactions/<interaction_id>", methods=["DELETE"])
 def delete_interaction(interaction_id):
     try:
-        supabase.table("interactions").delete().eq("id", interaction_id).execute()
+        result = supabase.table("interactions").delete().eq("id", interaction_id).execute()
+        for deleted in result.data:
+            contact_cache.invalidate(deleted["contact_id"])
+        dashboard_stats.interactions_changed()
+        read_flights.forget("contacts", "dashboard")
         return jsonify({"message": "Interaction deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# ─── Bulk Import ─────────────────────────────────────────────────────────────
+
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", 500))
+BULK_MAX_BATCH_SIZE = 5000
+
+
+def bulk_upload_rows():
+    """Incremental reader for the request body: CSV (raw or a multipart "file") or a JSON array."""
+    if request.mimetype == "multipart/form-data":
+        upload = request.files.get("file")
+        if upload is None:
+            raise ValueError("file is required")
+        is_json = upload.filename.lower().endswith(".json") or upload.mimetype == "application/json"
+        return iter_json_array(upload.stream) if is_json else iter_csv(upload.stream)
+    if request.mimetype in ("text/csv", "application/csv"):
+        return iter_csv(request.stream)
+    return iter_json_array(request.stream)
+
+
+def run_bulk_import(build, insert):
+    """Stream the upload through `build` and `insert`; respond with the per-row report."""
+    try:
+        batch_size = int(request.args.get("batch_size", BULK_BATCH_SIZE))
+    except ValueError:
+        return jsonify({"error": "batch_size must be an integer"}), 400
+    batch_size = max(1, min(batch_size, BULK_MAX_BATCH_SIZE))
+
+    report = ImportReport()
+    try:
+        import_rows(bulk_upload_rows(), build, insert, batch_size, report)
+    except (ValueError, csv.Error) as e:
+        return jsonify({"error": f"Malformed upload: {e}", **report.as_dict()}), 400
+    except Exception as e:
+        # The batch in flight may or may not have been written; rows after it were not
+        app.logger.exception("bulk import aborted")
+        return jsonify({"error": f"Import aborted: {e}", **report.as_dict()}), 500
+    return jsonify(report.as_dict()), 200
+
+
+def insert_contacts(rows):
+    supabase.table("contacts").insert(rows, returning="minimal").execute()
+
+
+def insert_interactions(rows):
+    supabase.table("interactions").insert(rows, returning="minimal").execute()
+    for contact_id in {r["contact_id"] for r in rows}:
+        contact_cache.invalidate(contact_id)
+
+
+@app.route("/api/contacts/bulk", methods=["POST"])
+def bulk_create_contacts():
+    try:
+        response = run_bulk_import(contact_from_payload, insert_contacts)
+        dashboard_stats.contacts_changed()
+        search_index.invalidate()
+        read_flights.forget("contacts", "dashboard")
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/interactions/bulk", methods=["POST"])
+def bulk_create_interactions():
+    try:
+        response = run_bulk_import(interaction_from_payload, insert_interactions)
+        dashboard_stats.interactions_changed()
+        read_flights.forget("contacts", "dashboard")
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# ─── Export ──────────────────────────────────────────────────────────────────
+
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 1000))
+EXPORT_MAX_CHUNK_SIZE = 5000
+
+
+def contact_pages(status=None, created=(), with_interactions=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Page source for export: contacts oldest first, one keyset query per page."""
+    columns = ", ".join(CONTACT_FIELDS)
+    if with_interactions:
+        columns += f", interactions({', '.join(INTERACTION_FIELDS)})"
+
+    def fetch_page(after, limit):
+        query = supabase.table("contacts").select(columns).order("created_at").order("id")
+        if with_interactions:
+            query = query.order("created_at", foreign_table="interactions")
+        if status:
+            query = query.eq("status", status)
+        for op, value in created:
+            query = query.filter("created_at", op, value)
+        if after:
+            after_created_at, after_id = after
+            query = query.or_(
+                f'created_at.gt."{after_created_at}",'
+                f'and(created_at.eq."{after_created_at}",id.gt."{after_id}")'
+            )
+        return query.limit(limit).execute().data
+
+    return iter_pages(fetch_page, chunk_size)
+
+
+@app.route("/api/export/contacts", methods=["GET"])
+def export_contacts():
+    """Stream contacts as NDJSON or CSV, optionally with their interactions.
+
+    Query params: format (ndjson|csv), status, from / to (created_at range),
+    include=interactions, chunk_size (rows per database page).
+    """
+    fmt = request.args.get("format", "ndjson").strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    status = request.args.get("status", "").strip()
+    with_interactions = request.args.get("include", "").strip() == "interactions"
+    try:
+        created = created_range(request.args.get("from", "").strip(), request.args.get("to", "").strip())
+        chunk_size = int(request.args.get("chunk_size", EXPORT_CHUNK_SIZE))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    chunk_size = max(1, min(chunk_size, EXPORT_MAX_CHUNK_SIZE))
+
+    pages = contact_pages(status or None, created, with_interactions, chunk_size)
+    chunks = ndjson_chunks(pages, app.json.dumps) if fmt == "ndjson" else csv_chunks(pages, with_interactions)
+
+    def generate():
+        try:
+            yield from chunks
+        except Exception as e:
+            # Headers are already sent. NDJSON readers get a final error record;
+            # CSV has no room for one, so the connection is dropped before the
+            # terminating chunk and the client sees an incomplete download
+            app.logger.exception("export failed")
+            if fmt != "ndjson":
+                raise
+            yield json.dumps({"error": f"Export failed: {e}"}, ensure_ascii=False) + "\n"
+
+    filename = f"contacts-{datetime.date.today().isoformat()}.{fmt}"
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
+
+
 # ─── Dashboard ───────────────────────────────────────────────────────────────
 
 @app.route("/api/dashboard", methods=["GET"])
 def get_dashboard():
     try:
-        # Count contacts by status
-        contacts_result = supabase.table("contacts").select("id, status").execute()
-        contacts = contacts_result.data
+        body = read_flights.do("dashboard", lambda: app.json.dumps(dashboard_stats.snapshot(supabase)) + "\n")
+        return app.response_class(body, mimetype="application/json"), 200
+    except FlightTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        total_contacts = len(contacts)
-        by_status = {}
-        for c in contacts:
-            s = c["status"]
-            by_status[s] = by_status.get(s, 0) + 1
 
-        # Count overdue / due today interactions
-        today = datetime.date.today().isoformat()
-        overdue_result = (
-            supabase.table("interactions")
-            .select("id, contact_id, type, summary, next_action, next_action_date")
-            .not_.is_("next_action_date", "null")
-            .lte("next_action_date", today)
-            .execute()
-        )
-        follow_up_count = len(overdue_result.data)
+# ─── Follow-ups ──────────────────────────────────────────────────────────────
 
-        return jsonify({
-            "total_contacts": total_contacts,
-            "by_status": by_status,
-            "follow_up_count": follow_up_count,
-            "overdue_interactions": overdue_result.data,
-        }), 200
+FOLLOW_UPS_PAGE_SIZE = 50
+FOLLOW_UPS_MAX_PAGE_SIZE = 200
+
+
+@app.route("/api/follow-ups", methods=["GET"])
+def get_follow_ups():
+    try:
+        bucket = request.args.get("bucket", "").strip() or None
+        cursor = request.args.get("cursor", "").strip() or None
+        limit = request.args.get("limit", FOLLOW_UPS_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, FOLLOW_UPS_MAX_PAGE_SIZE))
+        try:
+            # Bucket counts come with the first page, fetched alongside it
+            body = follow_up_agenda.page(supabase, bucket, cursor, limit, with_counts=cursor is None)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(body), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -255,6 +755,17 @@ For queries needing a join (e.g., interactions with contact name), use:
   "table": "interactions",
   "select": "*, contacts(name)"
 
+For counting or other aggregate questions ("how many", "per company", "by month", "most recent"),
+add an "aggregate" object so the database computes the numbers instead of returning rows:
+  "aggregate": {
+    "function": "count" | "min" | "max",
+    "column": "column_name" or null (null counts rows),
+    "group_by": ["column_name", {"column": "date_column", "bucket": "day|week|month|year"}]
+  }
+With "aggregate", "select" is ignored, "order" may use "value" to sort by the aggregate result,
+and "limit" caps the number of groups. On interactions, aggregates may use contact columns as
+"contacts.name", "contacts.company" or "contacts.status" in group_by, column and filters.
+
 Use "ilike" with %wildcards% for text search.
 Today's date is: {today}
 """
@@ -265,112 +776,253 @@ Be concise and helpful. If the results are empty, say so clearly.
 If specific contact names appear in the results, include them in your response."""
 
 
+FALLBACK_SYSTEM_PROMPT = "אתה עוזר CRM שמדבר עברית. עזור למשתמש עם שאלות כלליות על ניהול לקוחות."
+
+
+def plan_query(openai_client, user_message, today):
+    """Step 1: natural language -> query plan dict, or None if the model gave no usable plan."""
+    plan_key = plan_cache.key(user_message, today, CHAT_SYSTEM_PROMPT)
+    query_plan = plan_cache.get(plan_key)
+    if query_plan is not None:
+        return query_plan
+    started = time.perf_counter()
+    query_response = openai_client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {
+                "role": "system",
+                "content": CHAT_SYSTEM_PROMPT.replace("{today}", today),
+            },
+            {"role": "user", "content": user_message},
+        ],
+        temperature=0.2,
+        response_format={"type": "json_object"},
+    )
+    try:
+        query_plan = validate_plan(json.loads(query_response.choices[0].message.content or ""))
+    except ValueError:  # includes json.JSONDecodeError
+        return None
+    plan_cache.put(plan_key, query_plan, today, (time.perf_counter() - started) * 1000)
+    return query_plan
+
+
+def execute_plan(query_plan, max_rows=None):
+    """Step 2: run a query plan against Supabase; return (rows, total matching rows).
+
+    At most `max_rows` rows are fetched; the total comes from an exact count.
+    Aggregate plans run in the database and return one row per group.
+    """
+    if query_plan.get("aggregate"):
+        from postgrest.exceptions import APIError
+
+        try:
+            rows = run_aggregate(supabase, query_plan)
+            return rows, len(rows)
+        except APIError as e:
+            if e.code != "PGRST202":
+                raise
+            # crm_aggregate() is not installed yet: send rows and let the model count
+            app.logger.warning("crm_aggregate() missing; run the SQL from the README setup")
+
+    table = query_plan.get("table", "contacts")
+    select = query_plan.get("select", "*")
+    filters = query_plan.get("filters", [])
+    order = query_plan.get("order")
+    limit = query_plan.get("limit")
+
+    query = supabase.table(table).select(select, count="exact")
+
+    for f in filters:
+        col = f.get("column", "")
+        op = f.get("op", "eq")
+        val = f.get("value", "")
+
+        if op == "eq":
+            query = query.eq(col, val)
+        elif op == "neq":
+            query = query.neq(col, val)
+        elif op == "ilike":
+            query = query.ilike(col, val)
+        elif op == "lt":
+            query = query.lt(col, val)
+        elif op == "gt":
+            query = query.gt(col, val)
+        elif op == "lte":
+            query = query.lte(col, val)
+        elif op == "gte":
+            query = query.gte(col, val)
+        elif op == "is_null":
+            query = query.is_(col, "null")
+        elif op == "not_null":
+            query = query.not_.is_(col, "null")
+
+    if order:
+        query = query.order(
+            order.get("column", "created_at"),
+            desc=order.get("desc", True),
+        )
+
+    if max_rows and (not limit or limit > max_rows):
+        query = query.limit(max_rows)
+    elif limit:
+        query = query.limit(limit)
+
+    result = query.execute()
+    total = result.count if result.count is not None else len(result.data)
+    if limit:
+        total = min(total, limit)
+    return result.data, total
+
+
+def fallback_messages(user_message):
+    return [
+        {"role": "system", "content": FALLBACK_SYSTEM_PROMPT},
+        {"role": "user", "content": user_message},
+    ]
+
+
+def summary_messages(user_message, query_results, total=None, query_plan=None):
+    """Step 3 prompt: ask for a Hebrew summary of the rows, compacted to the token budget."""
+    query_plan = query_plan or {}
+    results_text, stats = compact_rows(
+        query_results, total=total, token_budget=CHAT_TOKEN_BUDGET, max_rows=CHAT_MAX_ROWS,
+        keep=selected_columns(query_plan.get("select")), prune_ids=not query_plan.get("aggregate"),
+    )
+    chat_tokens.record(stats)
+    app.logger.info(
+        "chat summary: %(rows_sent)d/%(rows_total)d rows, ~%(tokens)d tokens (was ~%(tokens_uncompacted)d)", stats
+    )
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"השאלה המקורית: {user_message}\n\nתוצאות השאילתה:\n{results_text}",
+        },
+    ]
+
+
+def parse_chat_request():
+    """Return (message, api_key) or an error response tuple."""
+    data = request.get_json(silent=True)
+    if not data or not data.get("message"):
+        return None, (jsonify({"error": "message is required"}), 400)
+    if not data.get("api_key"):
+        return None, (jsonify({"error": "יש להזין OpenAI API Key"}), 400)
+    return (data["message"], data["api_key"]), None
+
+
 @app.route("/api/chat", methods=["POST"])
 def chat():
+    openai_client = None
     try:
-        data = request.get_json()
-        if not data or not data.get("message"):
-            return jsonify({"error": "message is required"}), 400
+        parsed, error = parse_chat_request()
+        if error:
+            return error
+        user_message, api_key = parsed
 
-        user_message = data["message"]
-        api_key = data.get("api_key")
-        if not api_key:
-            return jsonify({"error": "יש להזין OpenAI API Key"}), 400
-
-        openai_client = OpenAI(api_key=api_key)
+        openai_client = openai_pool.acquire(api_key)
         today = datetime.date.today().isoformat()
 
-        # Step 1: Convert natural language to query plan
-        try:
-            query_response = openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": CHAT_SYSTEM_PROMPT.replace("{today}", today),
-                    },
-                    {"role": "user", "content": user_message},
-                ],
-                temperature=0.2,
-                response_format={"type": "json_object"},
-            )
-            query_plan = json.loads(query_response.choices[0].message.content)
-        except (json.JSONDecodeError, Exception) as parse_err:
+        query_plan = plan_query(openai_client, user_message, today)
+        if query_plan is None:
             # Fallback: general conversational response without DB query
             fallback_response = openai_client.chat.completions.create(
                 model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "אתה עוזר CRM שמדבר עברית. עזור למשתמש עם שאלות כלליות על ניהול לקוחות.",
-                    },
-                    {"role": "user", "content": user_message},
-                ],
+                messages=fallback_messages(user_message),
                 temperature=0.5,
             )
-            return jsonify({
-                "reply": fallback_response.choices[0].message.content
-            }), 200
-
-        # Step 2: Execute query against Supabase
-        table = query_plan.get("table", "contacts")
-        select = query_plan.get("select", "*")
-        filters = query_plan.get("filters", [])
-        order = query_plan.get("order")
-        limit = query_plan.get("limit")
-
-        query = supabase.table(table).select(select)
-
-        for f in filters:
-            col = f.get("column", "")
-            op = f.get("op", "eq")
-            val = f.get("value", "")
-
-            if op == "eq":
-                query = query.eq(col, val)
-            elif op == "neq":
-                query = query.neq(col, val)
-            elif op == "ilike":
-                query = query.ilike(col, val)
-            elif op == "lt":
-                query = query.lt(col, val)
-            elif op == "gt":
-                query = query.gt(col, val)
-            elif op == "lte":
-                query = query.lte(col, val)
-            elif op == "gte":
-                query = query.gte(col, val)
-
-        if order:
-            query = query.order(
-                order.get("column", "created_at"),
-                desc=order.get("desc", True),
-            )
-
-        if limit:
-            query = query.limit(limit)
+            reply = fallback_response.choices[0].message.content
+            return jsonify({"reply": reply, "contacts": contact_mentions(reply)}), 200
 
-        result = query.execute()
-        query_results = result.data
+        query_results, total = execute_plan(query_plan, max_rows=CHAT_MAX_ROWS)
 
-        # Step 3: Summarize results in Hebrew
         summary_response = openai_client.chat.completions.create(
             model="gpt-4o",
-            messages=[
-                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
-                {
-                    "role": "user",
-                    "content": f"השאלה המקורית: {user_message}\n\nתוצאות השאילתה:\n{json.dumps(query_results, ensure_ascii=False, indent=2)}",
-                },
-            ],
+            messages=summary_messages(user_message, query_results, total, query_plan),
             temperature=0.5,
         )
 
         reply = summary_response.choices[0].message.content
-        return jsonify({"reply": reply}), 200
+        return jsonify({"reply": reply, "contacts": contact_mentions(reply)}), 200
 
     except Exception as e:
         return jsonify({"error": f"Chat error: {str(e)}"}), 500
+    finally:
+        if openai_client is not None:
+            openai_pool.release(openai_client)
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def contact_mentions(reply):
+    """Contacts named in a chat reply, for linking in the UI."""
+    try:
+        if not search_index.refresh(supabase):
+            return []  # index still loading: the reply goes out without links
+        return search_index.mentions(reply)
+    except Exception:
+        # The reply is already written; missing links must not turn it into an error
+        app.logger.warning("contact mentions unavailable", exc_info=True)
+        return []
+
+
+def stream_completion(openai_client, messages, parts):
+    """Yield SSE token events for a streamed completion, collecting the text in `parts`."""
+    stream = openai_client.chat.completions.create(
+        model="gpt-4o",
+        messages=messages,
+        temperature=0.5,
+        stream=True,
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield sse("token", {"text": chunk.choices[0].delta.content})
+
+
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    """Same pipeline as /api/chat, sent as Server-Sent Events.
+
+    Events: plan (query plan ready), rows (query executed), token (a piece of
+    the reply), done (with the contacts named in the reply), error.
+    """
+    parsed, error = parse_chat_request()
+    if error:
+        return error
+    user_message, api_key = parsed
+
+    def generate():
+        openai_client = None
+        parts = []
+        try:
+            openai_client = openai_pool.acquire(api_key)
+            today = datetime.date.today().isoformat()
+            query_plan = plan_query(openai_client, user_message, today)
+            if query_plan is None:
+                yield sse("plan", {"table": None})
+                yield from stream_completion(openai_client, fallback_messages(user_message), parts)
+            else:
+                yield sse("plan", {"table": query_plan.get("table", "contacts")})
+                query_results, total = execute_plan(query_plan, max_rows=CHAT_MAX_ROWS)
+                yield sse("rows", {"count": total})
+                yield from stream_completion(
+                    openai_client, summary_messages(user_message, query_results, total, query_plan), parts
+                )
+            yield sse("done", {"contacts": contact_mentions("".join(parts))})
+        except Exception as e:
+            yield sse("error", {"error": f"Chat error: {str(e)}"})
+        finally:
+            if openai_client is not None:
+                openai_pool.release(openai_client)
+
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ─── Run Server ──────────────────────────────────────────────────────────────
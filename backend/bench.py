@@ -0,0 +1,258 @@
+"""
+Load/benchmark suite for the Flask API against the in-process FakeSupabase.
+
+Run:  cd backend && python bench.py --contacts 100000 --requests 200
+      python bench.py --save bench_baseline.json        # record a baseline
+      python bench.py --compare bench_baseline.json     # diff against it
+
+Each scenario reports p50/p95/p99 latency, throughput and the number of
+Supabase round trips and OpenAI calls per request. OpenAI is replaced by a
+stub that returns a fixed query plan and summary after --model-latency-ms.
+"""
+import argparse
+import datetime
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+
+import app as crm_app
+from fake_supabase import FakeSupabase, LatencyModel
+from plan_cache import PlanCache
+from seed import generate_dataset
+
+CHAT_MESSAGE = "מי צריך מעקב היום?"
+
+# Metrics where larger is worse; throughput is compared the other way round
+LOWER_IS_BETTER = ["p50_ms", "p95_ms", "p99_ms", "upstream_calls", "model_calls"]
+
+
+# ─── OpenAI stub ─────────────────────────────────────────────────────────────
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class StubOpenAI:
+    """Stands in for `openai.OpenAI`; counts calls across all instances."""
+
+    calls = 0
+    latency_ms = 0.0
+    _lock = threading.Lock()
+
+    def __init__(self, api_key=None, **kwargs):
+        self.api_key = api_key
+        self.chat = _Obj(completions=_Obj(create=self._create))
+
+    @classmethod
+    def plan(cls):
+        today = datetime.date.today().isoformat()
+        return {
+            "table": "interactions",
+            "select": "*, contacts(name)",
+            "filters": [{"column": "next_action_date", "op": "lte", "value": today}],
+            "order": {"column": "next_action_date", "desc": False},
+            "limit": 20,
+        }
+
+    def _create(self, model=None, messages=None, response_format=None, stream=False, **kwargs):
+        with StubOpenAI._lock:
+            StubOpenAI.calls += 1
+        if StubOpenAI.latency_ms:
+            time.sleep(StubOpenAI.latency_ms / 1000.0)
+        if response_format and response_format.get("type") == "json_object":
+            content = json.dumps(self.plan(), ensure_ascii=False)
+        else:
+            content = "נמצאו מספר אנשי קשר שדורשים מעקב היום."
+        if stream:
+            return iter([_Obj(choices=[_Obj(delta=_Obj(content=word + " "))]) for word in content.split()])
+        return _Obj(choices=[_Obj(message=_Obj(content=content))])
+
+
+# ─── Harness ─────────────────────────────────────────────────────────────────
+
+def build_fake(contacts, latency, seed=0):
+    fake = FakeSupabase(latency=latency)
+    rows, interactions = generate_dataset(contacts, seed=seed)
+    fake.load("contacts", rows)
+    fake.load("interactions", interactions)
+    return fake
+
+
+def install(fake):
+    """Point app.py at the fake database and the OpenAI stub."""
+    crm_app.supabase = fake
+    crm_app.openai_pool.factory = StubOpenAI  # skips make_openai_client, so openai never loads
+    crm_app.dashboard_stats.invalidate()
+    crm_app.contact_cache.clear()
+    crm_app.plan_cache = PlanCache(path=None)
+    crm_app.openai_pool.clear()
+
+
+def scenarios(fake, rng):
+    contact_ids = [c["id"] for c in fake.tables["contacts"]]
+    return {
+        "contacts": lambda: ("GET", "/api/contacts", None),
+        "contact_detail": lambda: ("GET", f"/api/contacts/{rng.choice(contact_ids)}", None),
+        "dashboard": lambda: ("GET", "/api/dashboard", None),
+        "chat": lambda: ("POST", "/api/chat", {"message": CHAT_MESSAGE, "api_key": "sk-bench"}),
+        "chat_stream": lambda: ("POST", "/api/chat/stream", {"message": CHAT_MESSAGE, "api_key": "sk-bench"}),
+    }
+
+
+def percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1]
+
+
+def run_scenario(fake, make_request, requests, concurrency, warmup=2):
+    client = crm_app.app.test_client()
+    for _ in range(warmup):
+        method, path, body = make_request()
+        client.open(path, method=method, json=body)
+
+    fake.reset_counters()
+    StubOpenAI.calls = 0
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def worker():
+        local = crm_app.app.test_client()
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+                method, path, body = make_request()
+            start = time.perf_counter()
+            res = local.open(path, method=method, json=body)
+            elapsed = (time.perf_counter() - start) * 1000.0
+            with lock:
+                latencies.append(elapsed)
+                if res.status_code >= 400:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "errors": errors[0],
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "throughput_rps": round(requests / wall, 2),
+        "upstream_calls": round(fake.calls / requests, 3),
+        "model_calls": round(StubOpenAI.calls / requests, 3),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of human-readable regressions versus `baseline`."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        for metric in LOWER_IS_BETTER:
+            old, new = before.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > 1e-6:
+                regressions.append(f"{name}.{metric}: {old} -> {new}")
+        old, new = before.get("throughput_rps"), current.get("throughput_rps")
+        if old and new < old * (1 - tolerance):
+            regressions.append(f"{name}.throughput_rps: {old} -> {new}")
+    return regressions
+
+
+def print_table(results, baseline=None):
+    header = f"{'scenario':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'upstream':>10}{'model':>8}{'errors':>8}"
+    print(header)
+    print("─" * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<16}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+            f"{r['throughput_rps']:>10.1f}{r['upstream_calls']:>10.2f}{r['model_calls']:>8.2f}{r['errors']:>8}"
+        )
+        before = (baseline or {}).get("results", {}).get(name)
+        if before:
+            print(
+                f"{'  baseline':<16}{before['p50_ms']:>10.2f}{before['p95_ms']:>10.2f}{before['p99_ms']:>10.2f}"
+                f"{before['throughput_rps']:>10.1f}{before['upstream_calls']:>10.2f}{before['model_calls']:>8.2f}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--scenarios", default="contacts,contact_detail,dashboard,chat")
+    parser.add_argument("--db-latency-ms", type=float, default=5.0, help="per Supabase round trip")
+    parser.add_argument("--db-row-latency-ms", type=float, default=0.002, help="per returned row")
+    parser.add_argument("--db-jitter-ms", type=float, default=1.0)
+    parser.add_argument("--model-latency-ms", type=float, default=50.0, help="per OpenAI call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    print(f"Generating {args.contacts} contacts...")
+    latency = LatencyModel(args.db_latency_ms, args.db_row_latency_ms, args.db_jitter_ms, seed=args.seed)
+    fake = build_fake(args.contacts, latency, seed=args.seed)
+    install(fake)
+    StubOpenAI.latency_ms = args.model_latency_ms
+
+    rng = random.Random(args.seed)
+    available = scenarios(fake, rng)
+    results = {}
+    for name in args.scenarios.split(","):
+        print(f"Running {name}...")
+        results[name] = run_scenario(fake, available[name], args.requests, args.concurrency)
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+        "results": results,
+        "caches": crm_app.app.test_client().get("/api/cache/stats").get_json(),
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print()
+    print_table(results, baseline)
+    for name, cache in report["caches"].items():
+        print(f"{name} cache: " + ", ".join(f"{k}={v}" for k, v in cache.items()))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nSaved baseline to {args.save}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Before/after measurement of HTTP client reuse against a local mock server.
+
+Run:  cd backend && python bench_clients.py --requests 50 --handshake-ms 30
+
+The mock speaks just enough of the OpenAI and PostgREST APIs, counts the TCP
+connections it accepts, and sleeps --handshake-ms on each new connection to
+stand in for TCP + TLS setup to a remote host. Scenarios:
+
+  openai_fresh    new OpenAI client per chat request (the old behaviour)
+  openai_pooled   clients from app.openai_pool, reused across requests
+  supabase_default  create_client() with library defaults
+  supabase_tuned    the config.py client (shared pool, longer keep-alive)
+
+Each chat request makes two completions, like /api/chat. Use --idle-gap-ms
+above 5000 to see httpx's default 5s keep-alive expire between requests.
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETION = {
+    "id": "chatcmpl-mock",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "{\"table\": \"contacts\"}"},
+        "finish_reason": "stop",
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handshake_ms):
+        super().__init__(("127.0.0.1", 0), MockHandler)
+        self.handshake_ms = handshake_ms
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.handshake_ms / 1000.0)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._send(COMPLETION)
+
+    def do_GET(self):
+        self._send([])
+
+
+def measure(name, server, requests, gap_ms, run_one):
+    server.connections = 0
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        run_one()
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        if gap_ms:
+            time.sleep(gap_ms / 1000.0)
+    return {
+        "scenario": name,
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": statistics.quantiles(latencies, n=20, method="inclusive")[18] if len(latencies) > 1 else latencies[0],
+        "connections": server.connections,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--handshake-ms", type=float, default=30.0)
+    parser.add_argument("--idle-gap-ms", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    server = MockServer(args.handshake_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Point both SDKs at the mock before app/config build their clients
+    os.environ["OPENAI_BASE_URL"] = f"{server.url}/v1"
+    os.environ["SUPABASE_URL"] = server.url
+    os.environ.setdefault("SUPABASE_KEY", "mock-key")
+    from openai import OpenAI
+    from supabase import create_client
+
+    import app as crm_app
+    import config
+
+    def chat_request(client):
+        for _ in range(2):
+            client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "hi"}])
+
+    def fresh():
+        chat_request(OpenAI(api_key="sk-mock"))
+
+    def pooled():
+        with crm_app.openai_pool.client("sk-mock") as client:
+            chat_request(client)
+
+    default_supabase = create_client(server.url, "mock-key")
+
+    results = [
+        measure("openai_fresh", server, args.requests, args.idle_gap_ms, fresh),
+        measure("openai_pooled", server, args.requests, args.idle_gap_ms, pooled),
+        measure("supabase_default", server, args.requests, args.idle_gap_ms,
+                lambda: default_supabase.table("contacts").select("*").limit(1).execute()),
+        measure("supabase_tuned", server, args.requests, args.idle_gap_ms,
+                lambda: config.supabase.table("contacts").select("*").limit(1).execute()),
+    ]
+
+    print(f"{'scenario':<18}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'connections':>13}")
+    for r in results:
+        print(f"{r['scenario']:<18}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['connections']:>13}")
+    server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Burst benchmark for read coalescing (single_flight.py) on /api/contacts and
+/api/dashboard.
+
+Run:  cd backend && python bench_coalescing.py --burst 50 --bursts 10
+
+Each burst releases --burst identical requests at once, like a team opening
+the app at the start of the day, against FakeSupabase with
+--db-latency-ms per round trip. The dashboard's own cache is dropped before
+every burst so each one has to refresh it. Every scenario runs with
+coalescing off and on; the table shows Supabase round trips per request,
+the upstream calls coalescing avoided, and latency.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import app as crm_app
+from bench import build_fake, install, percentile
+from fake_supabase import LatencyModel
+from single_flight import SingleFlight
+
+PATHS = {"contacts": "/api/contacts", "dashboard": "/api/dashboard"}
+
+
+def run_burst(path, size):
+    """Fire `size` identical GETs at once; return (latencies in ms, error count)."""
+    barrier = threading.Barrier(size)
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def worker():
+        client = crm_app.app.test_client()
+        barrier.wait()
+        start = time.perf_counter()
+        res = client.get(path)
+        elapsed = (time.perf_counter() - start) * 1000.0
+        with lock:
+            latencies.append(elapsed)
+            if res.status_code >= 400:
+                errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(size)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0]
+
+
+def run_scenario(fake, name, size, bursts, coalesce):
+    crm_app.read_flights = SingleFlight(timeout=crm_app.read_flights.timeout, enabled=coalesce)
+    fake.reset_counters()
+    latencies, errors = [], 0
+    for _ in range(bursts):
+        crm_app.dashboard_stats.invalidate()
+        burst_latencies, burst_errors = run_burst(PATHS[name], size)
+        latencies += burst_latencies
+        errors += burst_errors
+    requests = size * bursts
+    stats = crm_app.read_flights.stats()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "upstream_calls": round(fake.calls / requests, 3),
+        "avoided": stats["coalesced"],
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "mean_ms": round(statistics.fmean(latencies), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--burst", type=int, default=50, help="identical requests per burst")
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--scenarios", default="contacts,dashboard")
+    parser.add_argument("--db-latency-ms", type=float, default=20.0, help="per Supabase round trip")
+    parser.add_argument("--db-row-latency-ms", type=float, default=0.002, help="per returned row")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(f"Generating {args.contacts} contacts...")
+    fake = build_fake(args.contacts, LatencyModel(args.db_latency_ms, args.db_row_latency_ms, seed=args.seed),
+                      seed=args.seed)
+    install(fake)
+    saved = crm_app.read_flights
+
+    print(f"\n{'scenario':<11}{'coalesce':>9}{'requests':>10}{'db calls/req':>14}{'avoided':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}")
+    results = {}
+    try:
+        for name in args.scenarios.split(","):
+            for coalesce in (False, True):
+                r = run_scenario(fake, name, args.burst, args.bursts, coalesce)
+                results[(name, coalesce)] = r
+                print(f"{name:<11}{'on' if coalesce else 'off':>9}{r['requests']:>10}{r['upstream_calls']:>14}"
+                      f"{r['avoided']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['errors']:>8}")
+    finally:
+        crm_app.read_flights = saved
+    return results
+
+
+if __name__ == "__main__":
+    main()
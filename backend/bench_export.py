@@ -0,0 +1,92 @@
+"""
+Throughput of the streaming export on a large synthetic dataset.
+
+Run:  cd backend && python bench_export.py --rows 1000000
+      python bench_export.py --rows 1000000 --format csv --interactions
+
+Pages come from seed.generate_contacts (and generate_interactions) on the
+fly instead of a database, so the numbers are the server-side cost of
+paging, encoding and streaming through Flask; --db-latency-ms adds a
+simulated round trip per page to estimate end-to-end time. Peak RSS is
+reported to show that memory does not grow with the row count.
+"""
+import argparse
+import resource
+import sys
+import time
+from itertools import islice
+
+import app as crm_app
+from export import iter_pages
+from seed import generate_contacts, generate_interactions
+
+
+def synthetic_pages(rows, with_interactions, db_latency_ms, timings):
+    """Stand-in for app.contact_pages backed by the seed generators; page time goes to `timings`."""
+    def factory(status=None, created=(), with_interactions=with_interactions, chunk_size=1000):
+        source = generate_contacts(rows)
+        state = {"last": None}
+
+        def fetch_page(after, limit):
+            started = time.perf_counter()
+            assert after == state["last"], "pages must continue from the previous keyset"
+            page = list(islice(source, limit))
+            if with_interactions:
+                by_contact = {c["id"]: c.setdefault("interactions", []) for c in page}
+                for interaction in generate_interactions(page):
+                    by_contact[interaction.pop("contact_id")].append(interaction)
+            if page:
+                state["last"] = (page[-1]["created_at"], page[-1]["id"])
+            if db_latency_ms:
+                time.sleep(db_latency_ms / 1000.0)
+            timings.append(time.perf_counter() - started)
+            return page
+
+        return iter_pages(fetch_page, chunk_size)
+    return factory
+
+
+def peak_rss_mib():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--interactions", action="store_true", help="embed each contact's interactions")
+    parser.add_argument("--chunk-size", type=int, default=crm_app.EXPORT_CHUNK_SIZE)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="simulated round trip per page")
+    args = parser.parse_args(argv)
+
+    timings = []
+    crm_app.contact_pages = synthetic_pages(args.rows, args.interactions, args.db_latency_ms, timings)
+    client = crm_app.app.test_client()
+    query = {"format": args.format, "chunk_size": args.chunk_size}
+    if args.interactions:
+        query["include"] = "interactions"
+
+    rss_before = peak_rss_mib()
+    started = time.perf_counter()
+    res = client.get("/api/export/contacts", query_string=query, buffered=False)
+    size = lines = 0
+    for chunk in res.response:
+        size += len(chunk)
+        lines += chunk.count(b"\n")
+    res.close()
+    elapsed = time.perf_counter() - started
+    # Generating rows stands in for the database; what's left is the export's own work
+    export_time = elapsed - sum(timings)
+
+    print(f"rows      {args.rows:,} contacts ({lines:,} lines, {args.format})")
+    print(f"time      {elapsed:.1f} s total, {sum(timings):.1f} s in {len(timings)} page fetches")
+    print(f"export    {args.rows / export_time:,.0f} contacts/s, {size / export_time / 2**20:.1f} MiB/s")
+    print(f"overall   {args.rows / elapsed:,.0f} contacts/s")
+    print(f"output    {size / 2**20:,.0f} MiB")
+    print(f"peak RSS  {peak_rss_mib():.0f} MiB (was {rss_before:.0f} MiB before the export)")
+
+
+if __name__ == "__main__":
+    main()
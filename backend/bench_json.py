@@ -0,0 +1,78 @@
+"""
+Serialization time and bytes sent for a large /api/contacts-style payload.
+
+Run:  cd backend && python bench_json.py --contacts 10000
+
+Compares Flask's default JSON provider (ASCII-escaped, sorted keys) with
+FastJSONProvider on the json module and on orjson, then the compression
+levels the API uses (COMPRESS_GZIP_LEVEL, COMPRESS_BROTLI_QUALITY) on the
+fast provider's output. Times are the median of --repeat runs.
+"""
+import argparse
+import statistics
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+import app as crm_app
+from compression import brotli
+from json_provider import FastJSONProvider, orjson
+from seed import generate_contacts, generate_interactions
+
+
+def contacts_payload(count):
+    """Contacts flattened with their latest interaction, as GET /api/contacts returns them."""
+    contacts = list(generate_contacts(count))
+    latest = {}
+    for interaction in generate_interactions(contacts):
+        latest[interaction["contact_id"]] = interaction
+    for contact in contacts:
+        interaction = latest.get(contact["id"], {})
+        contact["latest_interaction_summary"] = interaction.get("summary")
+        contact["latest_interaction_type"] = interaction.get("type")
+        contact["latest_interaction_date"] = interaction.get("created_at")
+        contact["next_action"] = interaction.get("next_action")
+        contact["next_action_date"] = interaction.get("next_action_date")
+    return {"contacts": contacts, "next_cursor": None}
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    payload = contacts_payload(args.contacts)
+    app = crm_app.app
+    providers = [("flask default", DefaultJSONProvider(app)), ("fast / json", FastJSONProvider(app, "stdlib"))]
+    if orjson is not None:
+        providers.append(("fast / orjson", FastJSONProvider(app, "orjson")))
+
+    print(f"{args.contacts:,} contacts")
+    print(f"{'step':<22} {'ms':>8} {'KiB':>9}")
+    body = None
+    with app.app_context():
+        for name, provider in providers:
+            ms, response = timed(lambda: provider.response(payload), args.repeat)
+            body = response.get_data()
+            print(f"{name:<22} {ms:8.1f} {len(body) / 1024:9.0f}")
+
+    compressor = crm_app.compressor
+    for encoding in (["gzip", "br"] if brotli is not None else ["gzip"]):
+        ms, data = timed(lambda: compressor.encode(body, encoding), args.repeat)
+        print(f"  + {encoding:<18} {ms:8.1f} {len(data) / 1024:9.0f}")
+    if brotli is None:
+        print("  (pip install Brotli to include br)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Cold start and serving benchmark: import time, worker boot and throughput
+under gunicorn, old profile against the one in gunicorn.conf.py.
+
+Run:  cd backend && python bench_serving.py --budget-ms 150
+
+  import     `import app` in a fresh interpreter, against importing the
+             OpenAI and Supabase SDKs up front as app.py used to. Exits 1 if
+             the median is over --budget-ms.
+  boot       per-worker boot time (fork to ready, from the config's log
+             line) and time until /api/health answers.
+  throughput GET /api/contacts served while --chats chat requests, each
+             waiting --model-latency-ms per OpenAI call, are in flight.
+
+Profiles:  sync     sync workers, no preload, SDKs imported at startup
+           gthread  gunicorn.conf.py as deployed (threads + preload)
+
+Both run the app against FakeSupabase and the OpenAI stub from bench.py via
+the serving_app() factory, so only the serving model differs.
+"""
+import argparse
+import http.client
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PROFILES = {
+    # gunicorn quietly runs gthread instead of sync when threads > 1
+    "sync": {"args": ["-k", "sync"], "env": {"GUNICORN_PRELOAD": "0", "GUNICORN_THREADS": "1",
+                                             "BENCH_EAGER_IMPORTS": "1"}},
+    "gthread": {"args": [], "env": {}},
+}
+
+
+# ─── App factory (runs inside gunicorn) ──────────────────────────────────────
+
+def boot_app():
+    """The app as deployed, with the SDKs imported up front under BENCH_EAGER_IMPORTS=1."""
+    if os.environ.get("BENCH_EAGER_IMPORTS") == "1":
+        # What `import app` cost before the clients were made lazy
+        import openai  # noqa: F401
+        import supabase  # noqa: F401
+
+    import app as crm_app
+    return crm_app.app
+
+
+def serving_app():
+    """boot_app() on FakeSupabase and the OpenAI stub, configured from BENCH_* env vars."""
+    app = boot_app()
+    from bench import StubOpenAI, build_fake, install
+    from fake_supabase import LatencyModel
+
+    latency = LatencyModel(float(os.environ.get("BENCH_DB_LATENCY_MS", 5)), 0.002, 1.0, seed=0)
+    install(build_fake(int(os.environ.get("BENCH_CONTACTS", 2000)), latency))
+    StubOpenAI.latency_ms = float(os.environ.get("BENCH_MODEL_LATENCY_MS", 1000))
+    return app
+
+
+# ─── Import time ─────────────────────────────────────────────────────────────
+
+def import_ms(statement, runs):
+    """Median wall time of `statement` in a fresh interpreter, in ms."""
+    code = f"import time; t = time.perf_counter(); {statement}; print((time.perf_counter() - t) * 1000)"
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+# ─── Gunicorn harness ────────────────────────────────────────────────────────
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    """A gunicorn process running `target` (an app factory here) under one profile."""
+
+    def __init__(self, profile, target, workers, threads, env):
+        self.port = free_port()
+        self.boot_ms = []
+        self._booted = threading.Event()
+        self._workers = workers
+        env = {**os.environ, "WEB_CONCURRENCY": str(workers), "GUNICORN_THREADS": str(threads),
+               **env, **PROFILES[profile]["env"]}
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{self.port}",
+               *PROFILES[profile]["args"], f"bench_serving:{target}"]
+        self.started = time.perf_counter()
+        self.proc = subprocess.Popen(cmd, cwd=HERE, env=env, stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE, text=True)
+        threading.Thread(target=self._read_log, daemon=True).start()
+
+    def _read_log(self):
+        for line in self.proc.stderr:
+            match = re.search(r"Worker booted in ([\d.]+) ms", line)
+            if match:
+                self.boot_ms.append(float(match.group(1)))
+                if len(self.boot_ms) == self._workers:
+                    self._booted.set()
+
+    def wait_ready(self, timeout=60):
+        """Seconds from launch until every worker booted and /api/health answers."""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            try:
+                if request(self.port, "GET", "/api/health") == 200:
+                    ready = time.perf_counter() - self.started
+                    self._booted.wait(max(0, deadline - time.perf_counter()))
+                    return ready
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError("gunicorn did not become ready")
+
+    def stop(self):
+        self.proc.terminate()
+        self.proc.wait(10)
+
+
+def request(port, method, path, body=None, timeout=60):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        payload = json.dumps(body).encode() if body is not None else None
+        conn.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def contacts_throughput(port, seconds, concurrency, chats):
+    """Serve GET /api/contacts for `seconds` with `chats` chat requests kept in flight."""
+    stop = threading.Event()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def chat_loop(n):
+        while not stop.is_set():
+            try:
+                request(port, "POST", "/api/chat", {"message": f"מי צריך מעקב היום? {n}", "api_key": "sk-bench"})
+            except OSError:
+                pass  # the server is stopped before the last chat returns
+
+    def contacts_loop():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                status = request(port, "GET", "/api/contacts", timeout=30)
+            except OSError as e:
+                status = str(e)
+            with lock:
+                if status == 200:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                else:
+                    errors.append(status)
+
+    chat_threads = [threading.Thread(target=chat_loop, args=(n,), daemon=True) for n in range(chats)]
+    for t in chat_threads:
+        t.start()
+    if chats:
+        time.sleep(0.2)  # let the chats occupy their workers first
+    threads = [threading.Thread(target=contacts_loop, daemon=True) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) if latencies else None,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] if latencies else None,
+        "errors": len(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="allowed median `import app` time")
+    parser.add_argument("--import-runs", type=int, default=5)
+    parser.add_argument("--profiles", default="sync,gthread")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--chats", type=int, default=2, help="chat requests kept in flight")
+    parser.add_argument("--concurrency", type=int, default=4, help="contact list clients")
+    parser.add_argument("--seconds", type=float, default=5.0, help="per throughput run")
+    parser.add_argument("--contacts", type=int, default=2000)
+    parser.add_argument("--model-latency-ms", type=float, default=1000.0, help="per OpenAI call")
+    parser.add_argument("--skip-serving", action="store_true", help="only measure import time")
+    args = parser.parse_args(argv)
+
+    lazy = import_ms("import app", args.import_runs)
+    eager = import_ms("import openai, supabase, app", args.import_runs)
+    print(f"import app:           {lazy:8.1f} ms  (budget {args.budget_ms:.0f} ms)")
+    print(f"with SDKs up front:   {eager:8.1f} ms")
+
+    if not args.skip_serving:
+        profiles = args.profiles.split(",")
+        print(f"\n{'profile':<9}{'ready s':>9}{'boot ms':>9}")
+        for profile in profiles:
+            server = Server(profile, "boot_app()", args.workers, args.threads, {})
+            try:
+                ready = server.wait_ready()
+                print(f"{profile:<9}{ready:9.2f}{statistics.mean(server.boot_ms):9.1f}")
+            finally:
+                server.stop()
+
+        env = {"BENCH_CONTACTS": str(args.contacts), "BENCH_MODEL_LATENCY_MS": str(args.model_latency_ms)}
+        print(f"\n{'profile':<9}{'chats':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}")
+        for profile in profiles:
+            server = Server(profile, "serving_app()", args.workers, args.threads, env)
+            try:
+                server.wait_ready()
+                for chats in (0, args.chats):
+                    r = contacts_throughput(server.port, args.seconds, args.concurrency, chats)
+                    latency = "".join(f"{v:9.1f}" if v is not None else f"{'-':>9}" for v in (r["p50_ms"], r["p95_ms"]))
+                    print(f"{profile:<9}{chats:7}{r['rps']:9.1f}{latency}{r['errors']:8}")
+            finally:
+                server.stop()
+
+    if lazy > args.budget_ms:
+        print(f"\n`import app` took {lazy:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
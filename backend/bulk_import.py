@@ -0,0 +1,185 @@
+"""
+Streaming row import for the bulk endpoints.
+
+Rows are read incrementally from the request body (a JSON array or CSV),
+validated one at a time and inserted in batches, so memory stays flat no
+matter how large the upload is: at most one batch of rows, one read chunk
+(or one array item of up to MAX_ITEM_SIZE characters) and a capped error
+list are held at once.
+
+A batch that the database rejects (a check constraint, a missing contact)
+is retried row by row, so the report can name the offending rows while the
+rest of the batch still goes in. Any other error (a timeout, a dropped
+connection) aborts the import: the batch may already be committed, so
+retrying it could insert rows twice.
+"""
+import codecs
+import csv
+import io
+import json
+import re
+
+READ_CHUNK = 64 * 1024
+MAX_ITEM_SIZE = 1024 * 1024  # characters of one JSON array item
+MAX_REPORTED_ERRORS = 1000
+# SQLSTATE classes that reject rows, not the request: data exception, integrity constraint violation
+ROW_ERROR_CLASSES = ("22", "23")
+# Characters that end a JSON token: one must follow an item, and a decode error
+# followed by one is not truncation
+TOKEN_END = re.compile(r'[\s,:\[\]{}"]')
+
+
+# ─── Readers ────────────────────────────────────────────────────────────────
+
+def iter_json_array(stream, chunk_size=READ_CHUNK, max_item_size=MAX_ITEM_SIZE):
+    """Yield the items of a top-level JSON array without loading it whole.
+
+    A malformed item raises as soon as the decoder fails before the end of
+    what has been read, or once the item runs past `max_item_size`, rather
+    than buffering the rest of the upload.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + text.decode(chunk or b"", final=eof)
+        pos = 0
+
+    def skip_space():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip_space()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("expected a JSON array")
+    pos += 1
+    first = True
+    while True:
+        skip_space()
+        if pos >= len(buf):
+            raise ValueError("unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        if not first:
+            if buf[pos] != ",":
+                raise ValueError(f"expected ',' at offset {pos}")
+            pos += 1
+            skip_space()
+        first = False
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                # Truncation fails on the last token read (a string is reported at its start)
+                truncated = e.msg.startswith("Unterminated string") or not TOKEN_END.search(buf, e.pos)
+                if eof or not truncated:
+                    raise ValueError(f"invalid JSON in array item: {e.msg}")
+            else:
+                if eof or TOKEN_END.search(buf, end):
+                    pos = end
+                    break
+                # A number could continue in the next chunk ("1" then ".5")
+            if len(buf) - pos > max_item_size:
+                raise ValueError(f"array item longer than {max_item_size} characters")
+            fill()
+        yield item
+
+
+def iter_csv(stream, encoding="utf-8-sig"):
+    """Yield CSV records (dicts keyed by the header row) from a byte stream.
+
+    Empty cells are left out, as if the field had not been sent.
+    """
+    if isinstance(stream, io.RawIOBase):
+        stream = io.BufferedReader(stream, buffer_size=READ_CHUNK)
+    text = io.TextIOWrapper(stream, encoding=encoding, newline="")
+    for record in csv.DictReader(text):
+        yield {k.strip(): v.strip() for k, v in record.items() if k and isinstance(v, str) and v.strip()}
+
+
+# ─── Import ─────────────────────────────────────────────────────────────────
+
+class ImportReport:
+    def __init__(self, max_errors=MAX_REPORTED_ERRORS):
+        self.received = self.inserted = self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "error": message})
+
+    def as_dict(self):
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda e: e["row"]),
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def is_row_error(error):
+    """True if the database rejected the rows themselves (PostgREST APIError with a 22/23 code)."""
+    return str(getattr(error, "code", None) or "")[:2] in ROW_ERROR_CLASSES
+
+
+def import_rows(rows, build, insert, batch_size=500, report=None):
+    """Validate `rows` with `build` and insert them `batch_size` at a time.
+
+    `build(data)` returns (row, None) or (None, error message), like the
+    single-row endpoints. `insert(rows)` writes one batch and raises if the
+    database rejects it. Row numbers in the report start at 1. Errors
+    raised while reading `rows` propagate after the pending batch is written;
+    errors from `insert` other than row errors (`is_row_error`) propagate at
+    once, and the rows of that batch are counted in neither total.
+    """
+    report = report or ImportReport()
+    batch, numbers = [], []
+
+    def flush():
+        pending = list(zip(numbers, batch))
+        batch.clear()
+        numbers.clear()
+        try:
+            insert([row for _, row in pending])
+            report.inserted += len(pending)
+            return
+        except Exception as e:
+            if not is_row_error(e):
+                raise
+        for number, row in pending:
+            try:
+                insert([row])
+                report.inserted += 1
+            except Exception as e:
+                if not is_row_error(e):
+                    raise
+                report.error(number, str(e))
+
+    try:
+        for number, data in enumerate(rows, start=1):
+            report.received += 1
+            row, error = build(data)
+            if error:
+                report.error(number, error)
+                continue
+            batch.append(row)
+            numbers.append(number)
+            if len(batch) >= batch_size:
+                flush()
+    finally:
+        # A malformed upload still keeps the rows validated before the bad spot
+        if batch:
+            flush()
+    return report
@@ -0,0 +1,143 @@
+"""
+Bounded in-process read cache (LRU + TTL) with cross-worker invalidation.
+
+Each gunicorn worker keeps its own TTLCache. To make invalidation precise
+across workers on the same host, every cached key also has a version
+counter in a small SQLite file (VersionStore); writes bump the counter and
+readers drop entries whose stored version no longer matches. A version
+lookup is a local SQLite read, far cheaper than a Supabase round trip.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_VERSION_DB = os.path.join(tempfile.gettempdir(), "crm-cache-versions.sqlite3")
+
+
+class VersionStore:
+    """Per-key version counters shared by all processes using the same file.
+
+    With `path=None` the counters live in memory (single process only).
+    """
+
+    def __init__(self, path=DEFAULT_VERSION_DB):
+        self.path = path
+        self._local = threading.local()
+        self._memory = {}
+        self._memory_lock = threading.Lock()
+        if path:
+            conn = self._conn()
+            conn.execute("CREATE TABLE IF NOT EXISTS versions (key TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # A connection inherited across fork (gunicorn --preload) must not be used
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        if not self.path:
+            with self._memory_lock:
+                return self._memory.get(key, 0)
+        row = self._conn().execute("SELECT version FROM versions WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, key):
+        if not self.path:
+            with self._memory_lock:
+                self._memory[key] = self._memory.get(key, 0) + 1
+            return
+        self._conn().execute(
+            "INSERT INTO versions (key, version) VALUES (?, 1) "
+            "ON CONFLICT(key) DO UPDATE SET version = version + 1",
+            (key,),
+        )
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, name, maxsize=1024, ttl=60.0, versions=None, clock=time.monotonic):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.versions = versions or VersionStore(path=None)
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _version_key(self, key):
+        return f"{self.name}:{key}"
+
+    def version(self, key):
+        """Current version of `key`; pass it to `set` after loading the value."""
+        return self.versions.get(self._version_key(key))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.clock() - entry[0] >= self.ttl:
+                del self._data[key]
+                entry = None
+        if entry is not None and entry[1] != self.version(key):
+            with self._lock:
+                if self._data.get(key) is entry:
+                    del self._data[key]
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, value, version):
+        with self._lock:
+            self._data[key] = (self.clock(), version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Return the cached value, or call `loader()` and cache a non-None result."""
+        value = self.get(key)
+        if value is None:
+            version = self.version(key)
+            value = loader()
+            if value is not None:
+                self.set(key, value, version)
+        return value
+
+    def invalidate(self, key):
+        self.versions.bump(self._version_key(key))
+        with self._lock:
+            self._data.pop(key, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,200 @@
+"""
+Validation and server-side execution of chat query plans.
+
+A plan may carry an "aggregate" object (count / min / max, optional
+group-by with day/week/month/year buckets). Such plans run through the
+crm_aggregate() SQL function from the README setup, so only the grouped
+numbers leave the database. Every plan is checked against the two-table
+schema first; a ValueError means the model's plan is unusable.
+
+Row plans that filter on the parent ("contacts.status" on interactions)
+get their select rewritten to embed the parent with `!inner`: PostgREST
+only filters the top-level rows by an inner-joined embed. A null filter
+value becomes an is_null / not_null test.
+"""
+import re
+
+# Mirrors the CREATE TABLE statements in the README
+SCHEMA = {
+    "contacts": {
+        "id": "uuid", "name": "text", "email": "text", "phone": "text",
+        "company": "text", "status": "text", "created_at": "timestamptz",
+    },
+    "interactions": {
+        "id": "uuid", "contact_id": "uuid", "type": "text", "summary": "text",
+        "next_action": "text", "next_action_date": "date", "created_at": "timestamptz",
+    },
+}
+# Parent table a plan may reach as "<parent>.<column>"
+JOINS = {"interactions": "contacts"}
+
+FILTER_OPS = ("eq", "neq", "ilike", "lt", "gt", "lte", "gte")
+# What eq / neq become for a null value
+NULL_OPS = {"eq": "is_null", "neq": "not_null"}
+FUNCTIONS = ("count", "min", "max")
+BUCKETS = ("day", "week", "month", "year")
+MAX_GROUP_COLUMNS = 3
+MAX_GROUPS = 500
+DEFAULT_GROUPS = 100
+MAX_LIMIT = 1000
+
+
+def column_type(table, ref, allow_join=False):
+    """Type of `ref` on `table`; raises ValueError for unknown columns."""
+    if not isinstance(ref, str):
+        raise ValueError(f"invalid column {ref!r}")
+    if allow_join and "." in ref:
+        parent, column = ref.split(".", 1)
+        if JOINS.get(table) != parent:
+            raise ValueError(f"{table} has no relation {parent}")
+        table = parent
+    else:
+        column = ref
+    kind = SCHEMA[table].get(column)
+    if kind is None:
+        raise ValueError(f"unknown column {ref!r} on {table}")
+    return kind
+
+
+def _filters(table, filters, allow_join):
+    if not isinstance(filters or [], list):
+        raise ValueError("filters must be a list")
+    checked = []
+    for f in filters or []:
+        if not isinstance(f, dict):
+            raise ValueError("each filter must be an object")
+        op = f.get("op", "eq")
+        if op not in FILTER_OPS:
+            raise ValueError(f"unsupported operator {op!r}")
+        kind = column_type(table, f.get("column", ""), allow_join)
+        if op == "ilike" and kind != "text":
+            raise ValueError(f"ilike needs a text column, not {f['column']!r}")
+        value = f.get("value", "")
+        if value is None:
+            if op not in NULL_OPS:
+                raise ValueError(f"cannot compare {f['column']!r} with null using {op!r}")
+            checked.append({"column": f["column"], "op": NULL_OPS[op], "value": None})
+        elif isinstance(value, (dict, list)):
+            raise ValueError(f"invalid value for {f['column']!r}")
+        else:
+            checked.append({"column": f["column"], "op": op, "value": str(value)})
+    return checked
+
+
+def _inner_select(table, select, filters):
+    """`select` with the parent embedded as `!inner` when a filter reaches it."""
+    parent = JOINS.get(table)
+    columns = [f["column"].split(".", 1)[1] for f in filters if parent and f["column"].startswith(f"{parent}.")]
+    if not columns:
+        return select
+    embed = re.compile(rf"\b{parent}(?:!\w+)?\(")
+    if embed.search(select):
+        return embed.sub(f"{parent}!inner(", select)
+    return f"{select}, {parent}!inner({', '.join(dict.fromkeys(columns))})"
+
+
+def _limit(limit):
+    """The plan's row or group limit as an int in 1..MAX_LIMIT, or None if unset."""
+    if limit is None or limit == "":
+        return None
+    if isinstance(limit, bool):
+        raise ValueError(f"invalid limit {limit!r}")
+    try:
+        limit = int(float(limit))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"invalid limit {limit!r}") from None
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def validate_plan(plan):
+    """Check a query plan against SCHEMA and return a normalized copy."""
+    if not isinstance(plan, dict):
+        raise ValueError("plan must be an object")
+    table = plan.get("table", "contacts")
+    if table not in SCHEMA:
+        raise ValueError(f"unknown table {table!r}")
+    aggregate = plan.get("aggregate")
+    if not isinstance(plan.get("order") or {}, dict):
+        raise ValueError("order must be an object")
+    if not isinstance(plan.get("select", "*"), str):
+        raise ValueError("select must be a string")
+    normalized = dict(
+        plan,
+        table=table,
+        # Row plans filter on parent columns through the embedded select ("contacts.name")
+        filters=_filters(table, plan.get("filters"), allow_join=True),
+        limit=_limit(plan.get("limit")),
+    )
+    if aggregate:
+        normalized["aggregate"] = _aggregate_spec(
+            table, aggregate, normalized["filters"], plan.get("order"), normalized["limit"]
+        )
+    else:
+        normalized["select"] = _inner_select(table, plan.get("select") or "*", normalized["filters"])
+        if plan.get("order"):
+            column_type(table, plan["order"].get("column", "created_at"))
+    return normalized
+
+
+def _aggregate_spec(table, aggregate, filters, order, limit):
+    if not isinstance(aggregate, dict):
+        raise ValueError("aggregate must be an object")
+    function = aggregate.get("function", "count")
+    if function not in FUNCTIONS:
+        raise ValueError(f"unsupported aggregate {function!r}")
+    column = aggregate.get("column") or None
+    if column is None and function != "count":
+        raise ValueError(f"{function} needs a column")
+    if column is not None and column_type(table, column, allow_join=True) == "uuid" and function != "count":
+        raise ValueError(f"cannot take {function} of an id column")
+
+    group_by = []
+    for item in aggregate.get("group_by") or []:
+        if isinstance(item, str):
+            item = {"column": item}
+        elif not isinstance(item, dict):
+            raise ValueError("each group-by entry must be a column or an object")
+        ref, bucket = item.get("column", ""), item.get("bucket") or None
+        kind = column_type(table, ref, allow_join=True)
+        if bucket is not None:
+            if bucket not in BUCKETS:
+                raise ValueError(f"unsupported bucket {bucket!r}")
+            if kind not in ("date", "timestamptz"):
+                raise ValueError(f"cannot bucket non-date column {ref!r}")
+        elif kind == "uuid":
+            raise ValueError(f"group by a name rather than {ref!r}")
+        group_by.append({"column": ref, "bucket": bucket, "as": f"{ref}_{bucket}" if bucket else ref})
+    if len(group_by) > MAX_GROUP_COLUMNS:
+        raise ValueError("too many group-by columns")
+
+    value_as = function if column is None else f"{function}_{column}"
+    # Default: biggest groups first, but date buckets read best in time order
+    order = order or {}
+    if order.get("column") in ("value", value_as) or not group_by:
+        order_by, desc = "value", order.get("desc", True)
+    elif order.get("column") in {g["as"] for g in group_by} | {g["column"] for g in group_by}:
+        order_by, desc = "group", order.get("desc", False)
+    elif any(g["bucket"] for g in group_by):
+        order_by, desc = "group", False
+    else:
+        order_by, desc = "value", True
+
+    parent = JOINS.get(table)
+    refs = [column or ""] + [g["column"] for g in group_by] + [f["column"] for f in filters]
+    return {
+        "table": table,
+        "function": function,
+        "column": column,
+        "as": value_as,
+        "group_by": group_by,
+        "filters": filters,
+        "join": parent is not None and any(r.startswith(f"{parent}.") for r in refs),
+        "order_by": order_by,
+        "desc": bool(desc),
+        "limit": max(1, min(int(limit or DEFAULT_GROUPS), MAX_GROUPS)),
+    }
+
+
+def run_aggregate(supabase, plan):
+    """Execute a validated aggregate plan in the database; return the grouped rows."""
+    return supabase.rpc("crm_aggregate", {"spec": plan["aggregate"]}).execute().data
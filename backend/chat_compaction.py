@@ -0,0 +1,167 @@
+"""
+Shrink chat query results before they are sent to the summary model.
+
+The rows are pruned (empty columns, and id columns the plan did not ask
+for), flattened, trimmed (long texts, timestamp precision) and serialized
+column-wise without indentation. Aggregate results keep every column: an
+id there is a group key. The row count is then cut until the estimated
+token count fits the budget. The prompt notes how many rows were left out,
+so the model can still quote the true total.
+"""
+import json
+import math
+import re
+import threading
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+_encoding = None
+
+
+def estimate_tokens(text):
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        return len(_encoding.encode(text))
+    # GPT-4o averages roughly 3 characters per token on mixed Hebrew/English
+    return math.ceil(len(text) / 3)
+
+
+def _flatten(row, prefix=""):
+    flat = {}
+    for key, value in row.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif isinstance(value, list):
+            # Embedded one-to-many rows: keep a short textual digest
+            flat[name] = "; ".join(
+                ", ".join(str(v) for v in _flatten(item).values() if v not in (None, ""))
+                if isinstance(item, dict) else str(item)
+                for item in value
+            )
+        else:
+            flat[name] = value
+    return flat
+
+
+def selected_columns(select):
+    """Flattened names listed in a PostgREST select ("contact_id, contacts(name)")."""
+    select = (select or "") + ","
+    names, depth, start = set(), 0, 0
+    for i, char in enumerate(select):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            item = select[start:i].strip()
+            start = i + 1
+            head, _, inner = item.partition("(")
+            # "alias:column" names the key in the result; "!hint" only picks the relation
+            name = head.split(":", 1)[0].split("!", 1)[0].strip()
+            if inner:
+                names.update(f"{name}.{n}" for n in selected_columns(inner.rstrip(")")))
+            elif name and name != "*":
+                names.add(name)
+    return names
+
+
+def _is_id_column(name):
+    leaf = name.rsplit(".", 1)[-1]
+    return leaf == "id" or leaf.endswith("_id")
+
+
+# "2024-01-01T10:15:30.123456+02:00": minute, dropped seconds, offset
+TIMESTAMP = re.compile(r"(\d{4}-\d\d-\d\dT\d\d:\d\d)(?::\d\d(?:\.\d+)?)?(Z|[+-]\d\d(?::?\d\d)?)?")
+
+
+def _trim(value, max_text):
+    if isinstance(value, str):
+        match = TIMESTAMP.fullmatch(value)
+        if match:
+            # Minute precision is plenty for a summary; the offset stays so the
+            # model does not read a UTC time as local
+            return match.group(1) + (match.group(2) or "")
+        if len(value) > max_text:
+            return value[:max_text] + "…"
+    return value
+
+
+def _serialize(columns, rows):
+    return json.dumps({"columns": columns, "rows": rows}, ensure_ascii=False, separators=(",", ":"))
+
+
+def compact_rows(rows, total=None, token_budget=4000, max_rows=200, max_text=300, keep=(), prune_ids=True):
+    """Return (text for the prompt, stats dict).
+
+    Id columns are dropped unless `prune_ids` is false or they are named in
+    `keep` (flattened names, as from `selected_columns`). `rows` may already
+    be capped below `total`; the uncompacted size is then extrapolated from
+    the average row to all `total` rows.
+    """
+    total = len(rows) if total is None else max(total, len(rows))
+    uncompacted = estimate_tokens(json.dumps(rows, ensure_ascii=False, indent=2))
+    if rows and total > len(rows):
+        uncompacted = math.ceil(uncompacted * total / len(rows))
+
+    flat = [_flatten(r) for r in rows[:max_rows]]
+    columns = []
+    for row in flat:
+        for name in row:
+            if name not in columns and (not prune_ids or name in keep or not _is_id_column(name)):
+                columns.append(name)
+    columns = [c for c in columns if any(r.get(c) not in (None, "") for r in flat)]
+    table = [[_trim(r.get(c), max_text) for c in columns] for r in flat]
+
+    count = len(table)
+    text = _serialize(columns, table)
+    tokens = estimate_tokens(text)
+    while tokens > token_budget and count > 0:
+        count = min(count - 1, int(count * token_budget / tokens * 0.95))
+        count = max(count, 0)
+        text = _serialize(columns, table[:count])
+        tokens = estimate_tokens(text)
+
+    omitted = total - count
+    if omitted:
+        text += f"\n(הוצגו {count} מתוך {total} שורות; {omitted} שורות נוספות הושמטו)"
+    stats = {
+        "rows_total": total,
+        "rows_sent": count,
+        "rows_omitted": omitted,
+        "columns": len(columns),
+        "tokens": estimate_tokens(text),
+        "tokens_uncompacted": uncompacted,
+    }
+    return text, stats
+
+
+class TokenLedger:
+    """Running totals of result tokens sent to the summary model."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = self.tokens_sent = self.tokens_uncompacted = self.rows_omitted = 0
+
+    def record(self, stats):
+        with self._lock:
+            self.requests += 1
+            self.tokens_sent += stats["tokens"]
+            self.tokens_uncompacted += stats["tokens_uncompacted"]
+            self.rows_omitted += stats["rows_omitted"]
+
+    def stats(self):
+        with self._lock:
+            saved = self.tokens_uncompacted - self.tokens_sent
+            return {
+                "requests": self.requests,
+                "result_tokens_sent": self.tokens_sent,
+                "result_tokens_saved": saved,
+                "avg_tokens_per_request": round(self.tokens_sent / self.requests, 1) if self.requests else 0.0,
+                "rows_omitted": self.rows_omitted,
+            }
@@ -0,0 +1,104 @@
+"""
+Negotiated gzip / brotli compression of buffered API responses.
+
+Only bodies of at least `min_size` bytes with a text-like mimetype are
+compressed; brotli is preferred when the `brotli` package is installed and
+the client accepts it. Streamed responses (SSE chat, exports) pass through
+untouched so they keep flushing as they go. A strong ETag becomes weak on
+a compressed response, since the bytes differ from the identity body the
+tag was computed over, while If-None-Match still matches it.
+"""
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE = {"application/json", "text/csv", "text/plain", "text/html", "application/x-ndjson"}
+
+
+def accepted_encodings(header):
+    """Encodings the client accepts (q > 0) from an Accept-Encoding header."""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class ResponseCompressor:
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._lock = threading.Lock()
+        self.responses = self.compressed = self.bytes_in = self.bytes_out = 0
+
+    def choose(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        if brotli is not None and ("br" in accepted or "*" in accepted):
+            return "br"
+        if "gzip" in accepted or "*" in accepted:
+            return "gzip"
+        return None
+
+    def encode(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, self.gzip_level, mtime=0)
+
+    def compress(self, response, accept_encoding):
+        """Compress `response` in place for a client sending `accept_encoding`."""
+        if (
+            response.is_streamed
+            or response.direct_passthrough
+            or response.mimetype not in COMPRESSIBLE
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        body = response.get_data()
+        encoding = self.choose(accept_encoding) if len(body) >= self.min_size else None
+        with self._lock:
+            self.responses += 1
+        if encoding is None:
+            return response
+
+        data = self.encode(body, encoding)
+        if len(data) >= len(body):
+            return response
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(data)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                "brotli": brotli is not None,
+                "min_size": self.min_size,
+                "responses": self.responses,
+                "compressed": self.compressed,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+            }
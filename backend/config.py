@@ -1,7 +1,7 @@
 import os
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
 # Load .env from the backend directory (if it exists locally)
 env_path = Path(__file__).resolve().parent / ".env"
@@ -12,5 +12,58 @@ if env_path.exists():
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://placeholder.supabase.co")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY", "placeholder")
 
-# Supabase client singleton
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+SUPABASE_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", 10))
+SUPABASE_KEEPALIVE = float(os.environ.get("SUPABASE_KEEPALIVE", 60))
+
+
+class LazyClient:
+    """Stands in for a client that is built by `factory` on first use.
+
+    Importing supabase and httpx and building the client is most of a cold
+    start, so it waits for the first request that needs it. The client is
+    built once per process: one inherited across a fork (gunicorn
+    --preload) is replaced, since connection pools cannot be shared.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = self._factory()
+                    self._pid = os.getpid()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def make_supabase_http(event_hooks=None):
+    # Shared HTTP/2 connection pool; httpx's default keep-alive is only 5s, which
+    # would force a new TLS handshake after any short pause in traffic
+    import httpx
+
+    return httpx.Client(
+        http2=True,
+        follow_redirects=True,
+        timeout=httpx.Timeout(SUPABASE_TIMEOUT, connect=5.0),
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=SUPABASE_KEEPALIVE),
+        event_hooks=event_hooks,
+    )
+
+
+def make_supabase(event_hooks=None):
+    from supabase import ClientOptions, create_client
+
+    return create_client(
+        SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=make_supabase_http(event_hooks))
+    )
+
+
+# Supabase client singleton, created on first use
+supabase = LazyClient(make_supabase)
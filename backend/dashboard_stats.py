@@ -0,0 +1,153 @@
+"""
+Cached dashboard aggregates.
+
+Status counts and the follow-up count come from count-only queries
+(`count="exact", head=True`), so no rows cross the wire, and are then kept
+in memory. Write endpoints adjust the counts in place when the change is
+known (a new contact) and invalidate them otherwise. Follow-ups are read
+from the precomputed follow_ups table (see follow_ups.py), one open action
+per contact; they are tied to the date they were computed for and are
+recomputed after midnight.
+
+Each gunicorn worker holds its own copy, so a write served by another
+worker is only picked up after `ttl` seconds. Stale parts are refreshed
+with one round of concurrent queries through `gather` (see query_pool).
+"""
+import datetime
+import threading
+import time
+from functools import partial
+
+CONTACT_STATUSES = ("ליד", "לקוח פעיל", "לא פעיל")
+
+
+class DashboardStats:
+    def __init__(self, ttl=30.0, overdue_limit=50, clock=time.monotonic, today=datetime.date.today, gather=None):
+        self.ttl = ttl
+        self.gather = gather or (lambda *calls: [call() for call in calls])
+        self.overdue_limit = overdue_limit
+        self.clock = clock
+        self.today = today
+        self.lock = threading.Lock()
+        self.version = 0
+        self._drop_all()
+
+    # ─── Reads ───────────────────────────────────────────────────────────
+
+    def snapshot(self, supabase):
+        """Return the /api/dashboard payload, refreshing stale parts first."""
+        today = self.today().isoformat()
+        with self.lock:
+            contacts_fresh = self._fresh(self.contacts_loaded_at)
+            follow_ups_fresh = self._fresh(self.follow_ups_loaded_at) and self.follow_ups_date == today
+            overdue_fresh = follow_ups_fresh and self.overdue is not None
+            version = self.version
+            by_status = dict(self.by_status)
+            follow_up_count = self.follow_up_count
+            overdue = list(self.overdue or ())
+
+        calls = []
+        if not contacts_fresh:
+            calls += [partial(self._count_status, supabase, s) for s in CONTACT_STATUSES]
+        if not follow_ups_fresh:
+            calls.append(partial(self._count_follow_ups, supabase, today))
+        if not overdue_fresh:
+            calls.append(partial(self._fetch_overdue, supabase, today))
+        results = iter(self.gather(*calls))
+        if not contacts_fresh:
+            by_status = {s: next(results) for s in CONTACT_STATUSES}
+        if not follow_ups_fresh:
+            follow_up_count = next(results)
+        if not overdue_fresh:
+            overdue = next(results)
+
+        with self.lock:
+            # Only install results if no write happened while we were querying
+            if self.version == version:
+                now = self.clock()
+                if not contacts_fresh:
+                    self.by_status, self.contacts_loaded_at = dict(by_status), now
+                if not follow_ups_fresh:
+                    self.follow_up_count, self.follow_ups_date = follow_up_count, today
+                    self.follow_ups_loaded_at = now
+                if not overdue_fresh:
+                    self.overdue = list(overdue)
+
+        return {
+            "total_contacts": sum(by_status.values()),
+            "by_status": {s: n for s, n in by_status.items() if n},
+            "follow_up_count": follow_up_count,
+            "overdue_interactions": overdue,
+        }
+
+    def _fresh(self, loaded_at):
+        return loaded_at is not None and self.clock() - loaded_at < self.ttl
+
+    def _count_status(self, supabase, status):
+        result = (
+            supabase.table("contacts")
+            .select("id", count="exact", head=True)
+            .eq("status", status)
+            .execute()
+        )
+        return result.count or 0
+
+    def _count_follow_ups(self, supabase, today):
+        result = (
+            supabase.table("follow_ups")
+            .select("contact_id", count="exact", head=True)
+            .lte("next_action_date", today)
+            .execute()
+        )
+        return result.count or 0
+
+    def _fetch_overdue(self, supabase, today):
+        result = (
+            supabase.table("follow_ups")
+            # Same row shape as before follow_ups existed: "id" is the interaction's id
+            .select("id:interaction_id, contact_id, type, summary, next_action, next_action_date")
+            .lte("next_action_date", today)
+            .order("next_action_date")
+            .order("contact_id")
+            .limit(self.overdue_limit)
+            .execute()
+        )
+        return result.data
+
+    # ─── Write hooks ─────────────────────────────────────────────────────
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self._drop_all()
+
+    def _drop_all(self):
+        self.by_status = {}
+        self.contacts_loaded_at = None
+        self._drop_follow_ups()
+
+    def _drop_follow_ups(self):
+        self.follow_up_count = 0
+        self.follow_ups_date = None
+        self.follow_ups_loaded_at = None
+        self.overdue = None
+
+    def contact_created(self, status):
+        with self.lock:
+            self.version += 1
+            if self.contacts_loaded_at is not None and status in self.by_status:
+                self.by_status[status] += 1
+            else:
+                self.contacts_loaded_at = None
+
+    def contacts_changed(self):
+        """A status changed or a contact (and its interactions) was deleted."""
+        with self.lock:
+            self.version += 1
+            self.contacts_loaded_at = None
+
+    def interactions_changed(self):
+        """Any interaction write: it may replace its contact's open follow-up."""
+        with self.lock:
+            self.version += 1
+            self._drop_follow_ups()
@@ -0,0 +1,70 @@
+"""
+Sync tokens for GET /api/contacts/changes.
+
+Triggers on contacts and interactions (see the README schema) append a row,
+numbered by a sequence, to contact_changes for every write that changes a
+contact or its interactions. A client keeps the token from its last sync
+and asks for the rows after it, so a refresh reads only what changed.
+
+Sequence numbers are taken when a write runs but become visible when it
+commits, so a slow transaction can show up below a number a client has
+already read past. A token therefore carries the missing numbers among the
+last GAP_WINDOW below its high-water mark and the next sync asks for them
+again; numbers of rolled-back writes never show up and age out of the
+window. Tokens also record when they were issued: one older than the
+change log's retention cannot be resumed and gets a reset instead.
+"""
+import base64
+import json
+import time
+
+GAP_WINDOW = 1000
+MAX_GAPS = 100
+
+
+def encode_token(seq, gaps=(), issued=None):
+    """Opaque token: high-water sequence number, issue time and pending gaps."""
+    issued = int(time.time() if issued is None else issued)
+    raw = json.dumps([seq, issued, list(gaps)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token):
+    """Return (seq, issued, gaps) from a token, raising ValueError if malformed."""
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        seq, issued, gaps = json.loads(base64.urlsafe_b64decode(padded))
+    except (TypeError, ValueError):
+        raise ValueError("invalid sync token")
+    # Numbers are formatted into a PostgREST filter, so accept plain integers only
+    values = [seq, issued, *gaps] if isinstance(gaps, list) else None
+    if not values or not all(type(v) is int and v >= 0 for v in values) or len(gaps) > MAX_GAPS:
+        raise ValueError("invalid sync token")
+    return seq, issued, gaps
+
+
+def changed_ids(rows, limit):
+    """Contact ids from change rows (ascending seq) in first-change order, at most `limit`.
+
+    Returns (ids, seqs of the rows covered, whether rows were left over).
+    """
+    ids, seen = [], []
+    known = set()
+    for row in rows:
+        contact_id = row["contact_id"]
+        if contact_id not in known:
+            if len(ids) == limit:
+                return ids, seen, True
+            known.add(contact_id)
+            ids.append(contact_id)
+        seen.append(row["seq"])
+    return ids, seen, False
+
+
+def advance(seq, gaps, seen):
+    """New (high-water mark, gaps) after reading the rows numbered `seen`."""
+    high = max([seq, *seen])
+    seen = set(seen)
+    pending = {g for g in gaps if g not in seen}
+    pending.update(n for n in range(max(seq + 1, high - GAP_WINDOW + 1), high) if n not in seen)
+    return high, sorted(g for g in pending if g > high - GAP_WINDOW)[-MAX_GAPS:]
@@ -0,0 +1,90 @@
+"""
+Streaming export of contacts (optionally with their interactions).
+
+Rows are read from the database a page at a time with keyset pagination on
+(created_at, id) and encoded page by page, so the server holds at most one
+page of rows and one encoded chunk regardless of how many rows are exported.
+The page source is a plain `fetch_page(after, limit)` function, which keeps
+this module independent of the Supabase client.
+"""
+import csv
+import datetime
+import io
+import json
+
+CONTACT_FIELDS = ["id", "name", "email", "phone", "company", "status", "created_at"]
+INTERACTION_FIELDS = ["id", "type", "summary", "next_action", "next_action_date", "created_at"]
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def created_range(start=None, end=None):
+    """Filters [(op, value)] for a created_at range; dates are whole days, both ends inclusive."""
+    filters = []
+    for value, is_end in ((start, False), (end, True)):
+        if not value:
+            continue
+        try:
+            if len(value) == 10:
+                day = datetime.date.fromisoformat(value)
+                if is_end:
+                    filters.append(("lt", (day + datetime.timedelta(days=1)).isoformat()))
+                else:
+                    filters.append(("gte", day.isoformat()))
+            else:
+                filters.append(("lte" if is_end else "gte", datetime.datetime.fromisoformat(value).isoformat()))
+        except ValueError:
+            raise ValueError(f"invalid date: {value!r} (use YYYY-MM-DD or an ISO timestamp)")
+    return filters
+
+
+def iter_pages(fetch_page, chunk_size=1000):
+    """Yield lists of rows, each fetched after the last (created_at, id) of the previous one."""
+    after = None
+    while True:
+        rows = fetch_page(after, chunk_size)
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+def ndjson_chunks(pages, dumps=None):
+    """One JSON object per line; embedded interactions stay nested.
+
+    `dumps` encodes one row (compact, no newlines); defaults to the json module.
+    """
+    dumps = dumps or json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str).encode
+    for rows in pages:
+        yield "".join(dumps(row) + "\n" for row in rows)
+
+
+def _csv_records(row, with_interactions):
+    contact = [row.get(f) for f in CONTACT_FIELDS]
+    if not with_interactions:
+        yield contact
+        return
+    interactions = row.get("interactions") or []
+    if not interactions:
+        yield contact + [None] * len(INTERACTION_FIELDS)
+    for interaction in interactions:
+        yield contact + [interaction.get(f) for f in INTERACTION_FIELDS]
+
+
+def csv_chunks(pages, with_interactions=False):
+    """CSV with a header row; with interactions, one line per interaction (contact columns repeated)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = list(CONTACT_FIELDS)
+    if with_interactions:
+        header += [f"interaction_{f}" for f in INTERACTION_FIELDS]
+    # BOM so Excel opens the Hebrew text as UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    yield buffer.getvalue()
+    for rows in pages:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            writer.writerows(_csv_records(row, with_interactions))
+        yield buffer.getvalue()
@@ -0,0 +1,614 @@
+"""
+In-process stand-in for the Supabase client used by app.py.
+
+Implements the subset of the postgrest query builder the API relies on
+(select with embedded resources, filters, or_/and logic trees, ordering,
+limits, counts, insert/update/delete with the schema's CHECK and foreign
+key constraints) over plain Python lists, plus the crm_aggregate() RPC
+and the contact_changes and follow_ups triggers from the README, with a configurable per-call latency model and upstream
+call counters.
+
+    from fake_supabase import FakeSupabase, LatencyModel
+    fake = FakeSupabase(latency=LatencyModel(base_ms=20, per_row_ms=0.01))
+    fake.load("contacts", rows)
+"""
+import datetime
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+
+# child table -> (parent table, foreign key column); mirrors the README schema
+FOREIGN_KEYS = {
+    "interactions": ("contacts", "contact_id"),
+    "follow_ups": ("contacts", "contact_id"),
+}
+
+# Primary keys other than "id"
+PRIMARY_KEYS = {"follow_ups": "contact_id"}
+
+# date_trunc(unit, value)::date
+BUCKETS = {
+    "day": lambda d: d,
+    "week": lambda d: d - datetime.timedelta(days=d.weekday()),
+    "month": lambda d: d.replace(day=1),
+    "year": lambda d: d.replace(month=1, day=1),
+}
+
+# CHECK constraints from the README schema
+CHECKS = {
+    "contacts": {"status": ("ליד", "לקוח פעיל", "לא פעיל")},
+    "interactions": {"type": ("שיחה", "מייל", "פגישה", "הערה")},
+}
+
+# BIGSERIAL columns, numbered per table from 1
+SERIALS = {"contact_changes": "seq"}
+
+DEFAULTS = {
+    "contacts": {"email": None, "phone": None, "company": None, "status": "ליד"},
+    "interactions": {"next_action": None, "next_action_date": None},
+}
+
+
+class LatencyModel:
+    """Simulated round-trip cost: base + per returned row + uniform jitter."""
+
+    def __init__(self, base_ms=0.0, per_row_ms=0.0, jitter_ms=0.0, seed=None):
+        self.base_ms = base_ms
+        self.per_row_ms = per_row_ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, rows):
+        with self._lock:
+            jitter = self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        return (self.base_ms + self.per_row_ms * rows + jitter) / 1000.0
+
+    def wait(self, rows):
+        seconds = self.delay(rows)
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class FakeAPIError(Exception):
+    """Shaped like postgrest's APIError (code / message)."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+# ─── Filter expressions ─────────────────────────────────────────────────────
+
+def split_top_level(text):
+    """Split on commas that are not nested in parentheses or double quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += ch
+    parts.append(current)
+    return parts
+
+
+def like_regex(pattern, flags=0):
+    regex = re.escape(pattern).replace("%", ".*").replace(r"\*", ".*").replace("_", ".")
+    return re.compile(regex, flags | re.DOTALL)
+
+
+def compare(op, left, right):
+    if op in ("ilike", "like"):
+        if left is None:
+            return False
+        flags = re.IGNORECASE if op == "ilike" else 0
+        return like_regex(right, flags).fullmatch(str(left)) is not None
+    if op == "is":
+        expected = {"null": None, "true": True, "false": False}.get(str(right).lower(), right)
+        return left is expected
+    if op == "in":
+        return left is not None and str(left) in {str(v) for v in right}
+    if op in ("is_null", "not_null"):  # crm_aggregate() null tests
+        return (left is None) == (op == "is_null")
+    if left is None or right is None:
+        return False
+    if op == "eq":
+        return str(left) == str(right)
+    if op == "neq":
+        return str(left) != str(right)
+    if isinstance(left, int) and not isinstance(left, bool):
+        right = int(right)
+        return {"lt": left < right, "lte": left <= right, "gt": left > right, "gte": left >= right}[op]
+    left, right = str(left), str(right)
+    return {"lt": left < right, "lte": left <= right, "gt": left > right, "gte": left >= right}[op]
+
+
+def parse_in_list(value):
+    return [v.strip().strip('"') for v in split_top_level(value.strip()[1:-1]) if v.strip()]
+
+
+def logic_predicate(expr):
+    """Build a row predicate from PostgREST or/and filter syntax."""
+    expr = expr.strip()
+    negate = expr.startswith("not.")
+    if negate:
+        expr = expr[4:]
+    for joiner, combine in (("and(", all), ("or(", any)):
+        if expr.startswith(joiner):
+            children = [logic_predicate(p) for p in split_top_level(expr[len(joiner):-1])]
+            predicate = lambda row, c=children, f=combine: f(child(row) for child in c)  # noqa: E731
+            break
+    else:
+        column, op, value = expr.split(".", 2)
+        if op == "not":
+            op, value = value.split(".", 1)
+            negate = not negate
+        value = parse_in_list(value) if op == "in" else value.strip('"')
+        predicate = lambda row, c=column, o=op, v=value: compare(o, row.get(c), v)  # noqa: E731
+    if negate:
+        return lambda row: not predicate(row)
+    return predicate
+
+
+# ─── Select parsing ─────────────────────────────────────────────────────────
+
+def parse_select(columns):
+    """Return ([plain columns], {embedded table: nested spec}, {tables embedded with !inner})."""
+    plain, embeds, inner = [], {}, set()
+    for part in split_top_level(columns.replace("\n", " ")):
+        part = part.strip()
+        if not part:
+            continue
+        if "(" in part and part.endswith(")"):
+            name, _, hint = part[: part.index("(")].strip().partition("!")
+            embeds[name] = parse_select(part[part.index("(") + 1: -1])
+            if hint == "inner":
+                inner.add(name)
+        else:
+            plain.append(part)
+    return plain, embeds, inner
+
+
+def sort_rows(rows, orders):
+    for column, desc, nullsfirst in reversed(orders):
+        if nullsfirst is None:
+            nullsfirst = desc  # Postgres default: NULLS LAST for ASC, FIRST for DESC
+        present = [r for r in rows if r.get(column) is not None]
+        missing = [r for r in rows if r.get(column) is None]
+        present.sort(key=lambda r, c=column: r[c], reverse=desc)
+        rows = missing + present if nullsfirst else present + missing
+    return rows
+
+
+# ─── Query builder ──────────────────────────────────────────────────────────
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.method = "select"
+        self.columns = "*"
+        self.payload = None
+        self.count = None
+        self.head = False
+        self.filters = []
+        self.orders = {}
+        self.limits = {}
+        self.offsets = {}
+        self.negate_next = False
+        self.candidates = None
+        self.embed_filters = []  # (parent table, predicate on the parent row)
+
+    # Verbs
+
+    def select(self, *columns, count=None, head=None):
+        self.columns = ",".join(columns) if columns else "*"
+        self.count = count
+        self.head = bool(head)
+        return self
+
+    def insert(self, json, count=None, **kwargs):
+        self.method = "insert"
+        self.payload = json if isinstance(json, list) else [json]
+        self.count = count
+        return self
+
+    def upsert(self, json, count=None, on_conflict="id", **kwargs):
+        self.method = "upsert"
+        self.payload = json if isinstance(json, list) else [json]
+        self.count = count
+        self.on_conflict = on_conflict
+        return self
+
+    def update(self, json, count=None, **kwargs):
+        self.method = "update"
+        self.payload = json
+        self.count = count
+        return self
+
+    def delete(self, count=None, **kwargs):
+        self.method = "delete"
+        self.count = count
+        return self
+
+    # Filters
+
+    def _add(self, predicate):
+        if self.negate_next:
+            self.negate_next = False
+            self.filters.append(lambda row: not predicate(row))
+        else:
+            self.filters.append(predicate)
+        return self
+
+    def _on(self, op, column, value):
+        """Filter on `column`; "parent.column" filters the embedded parent, as PostgREST does."""
+        parent, dot, name = column.rpartition(".")
+        if not dot:
+            return self._add(lambda row: compare(op, row.get(name), value))
+        negate, self.negate_next = self.negate_next, False
+        self.embed_filters.append((parent, lambda row: compare(op, row.get(name), value) != negate))
+        return self
+
+    @property
+    def not_(self):
+        self.negate_next = True
+        return self
+
+    def filter(self, column, operator, criteria):
+        return self._add(logic_predicate(f"{column}.{operator}.{criteria}"))
+
+    def eq(self, column, value):
+        # Narrow the scan like a primary key / foreign key index would
+        if not self.negate_next and self.candidates is None:
+            if column == "id":
+                row = self.db._by_id(self.table, value)
+                self.candidates = [row] if row else []
+            elif FOREIGN_KEYS.get(self.table, (None, None))[1] == column:
+                self.candidates = self.db._children(self.table, value)
+        return self._on("eq", column, value)
+
+    def neq(self, column, value):
+        return self._on("neq", column, value)
+
+    def lt(self, column, value):
+        return self._on("lt", column, value)
+
+    def lte(self, column, value):
+        return self._on("lte", column, value)
+
+    def gt(self, column, value):
+        return self._on("gt", column, value)
+
+    def gte(self, column, value):
+        return self._on("gte", column, value)
+
+    def like(self, column, pattern):
+        return self._add(lambda row: compare("like", row.get(column), pattern))
+
+    def ilike(self, column, pattern):
+        return self._on("ilike", column, pattern)
+
+    def is_(self, column, value):
+        return self._on("is", column, value)
+
+    def in_(self, column, values):
+        values = list(values)
+        return self._add(lambda row: compare("in", row.get(column), values))
+
+    def or_(self, filters, reference_table=None):
+        return self._add(logic_predicate(f"or({filters})"))
+
+    # Modifiers
+
+    def order(self, column, *, desc=False, nullsfirst=None, foreign_table=None):
+        self.orders.setdefault(foreign_table, []).append((column, desc, nullsfirst))
+        return self
+
+    def limit(self, size, *, foreign_table=None):
+        self.limits[foreign_table] = size
+        return self
+
+    def offset(self, size):
+        self.offsets[None] = size
+        return self
+
+    def range(self, start, end, foreign_table=None):
+        self.offsets[foreign_table] = start
+        self.limits[foreign_table] = end - start + 1
+        return self
+
+    # Execution
+
+    def _window(self, rows, key):
+        rows = sort_rows(rows, self.orders.get(key, []))
+        start = self.offsets.get(key, 0)
+        if key in self.limits:
+            return rows[start: start + self.limits[key]]
+        return rows[start:]
+
+    def _project(self, row, table, spec, embed_filters=()):
+        plain, embeds, _ = spec
+        if not plain or "*" in plain:
+            out = dict(row)
+        else:
+            # "alias:column" renames a column in the result, as in PostgREST
+            out = {c.partition(":")[0].strip(): row.get(c.rpartition(":")[2].strip()) for c in plain}
+        for name, child_spec in embeds.items():
+            if FOREIGN_KEYS.get(table, (None,))[0] == name:
+                # many-to-one: embed the parent object
+                fk = FOREIGN_KEYS[table][1]
+                parent = self.db._by_id(name, row.get(fk))
+                if parent and not all(f(parent) for p, f in embed_filters if p == name):
+                    parent = None  # a filtered-out embed is null; the row itself stays
+                out[name] = self._project(parent, name, child_spec) if parent else None
+            else:
+                # one-to-many: embed the child rows
+                children = self.db._children(name, row.get("id"))
+                out[name] = [self._project(c, name, child_spec) for c in self._window(children, name)]
+        return out
+
+    def _matching(self):
+        rows = self.db.tables[self.table] if self.candidates is None else self.candidates
+        return [r for r in rows if all(f(r) for f in self.filters)]
+
+    def execute(self):
+        with self.db.lock:
+            self.db.record(self.table, self.method)
+            data, count = getattr(self, f"_execute_{self.method}")()
+        self.db.latency.wait(len(data))
+        return FakeResponse(data, count)
+
+    def _execute_select(self):
+        spec = parse_select(self.columns)
+        rows = self._matching()
+        parent_table, fk = FOREIGN_KEYS.get(self.table, (None, None))
+        for parent, predicate in self.embed_filters:
+            if parent not in spec[1]:
+                raise FakeAPIError("PGRST108", f"'{parent}' needs to be in the select to be filtered")
+            if parent in spec[2] and parent == parent_table:
+                # !inner: rows whose parent does not match are dropped
+                rows = [r for r in rows if (p := self.db._by_id(parent, r.get(fk))) and predicate(p)]
+        count = len(rows) if self.count else None
+        if self.head:
+            return [], count
+        return [self._project(r, self.table, spec, self.embed_filters) for r in self._window(rows, None)], count
+
+    def _execute_insert(self):
+        # One statement: a constraint violation rejects the whole batch
+        for row in self.payload:
+            self.db._check_row(self.table, row)
+        inserted = [self.db._insert_row(self.table, dict(r)) for r in self.payload]
+        return [dict(r) for r in inserted], len(inserted) if self.count else None
+
+    def _execute_upsert(self):
+        out = []
+        for row in self.payload:
+            existing = self.db._find(self.table, self.on_conflict, row.get(self.on_conflict))
+            if existing is not None:
+                existing.update(row)
+                self.db._log_change(self.table, existing)
+                out.append(dict(existing))
+            else:
+                out.append(dict(self.db._insert_row(self.table, dict(row))))
+        return out, len(out) if self.count else None
+
+    def _execute_update(self):
+        rows = self._matching()
+        for row in rows:
+            row.update(self.payload)
+            if self.table == "interactions":
+                self.db._refresh_follow_up(row.get("contact_id"))
+            self.db._log_change(self.table, row)
+        return [dict(r) for r in rows], len(rows) if self.count else None
+
+    def _execute_delete(self):
+        rows = self._matching()
+        for row in rows:
+            self.db._delete_row(self.table, row)
+        return [dict(r) for r in rows], len(rows) if self.count else None
+
+
+class FakeRpc:
+    def __init__(self, db, name, params):
+        self.db = db
+        self.name = name
+        self.params = params or {}
+
+    def execute(self):
+        handler = getattr(self.db, f"_rpc_{self.name}", None)
+        if handler is None:
+            raise ValueError(f"unknown function: {self.name}")
+        with self.db.lock:
+            self.db.record(f"rpc/{self.name}", "rpc")
+            data = handler(**self.params)
+        self.db.latency.wait(len(data))
+        return FakeResponse(data)
+
+
+class FakeSupabase:
+    """Drop-in for `config.supabase`; `calls` counts upstream round trips."""
+
+    def __init__(self, latency=None):
+        self.latency = latency or LatencyModel()
+        self.tables = {"contacts": [], "interactions": [], "contact_changes": [], "follow_ups": []}
+        self.lock = threading.RLock()
+        self.calls = 0
+        self.calls_by_table = Counter()
+        self._index = {name: {} for name in self.tables}
+        self._child_index = {name: {} for name in FOREIGN_KEYS}
+        self._serials = Counter()
+
+    def table(self, name):
+        if name not in self.tables:
+            raise ValueError(f"unknown table: {name}")
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params)
+
+    def record(self, table, method):
+        self.calls += 1
+        self.calls_by_table[(table, method)] += 1
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls = 0
+            self.calls_by_table.clear()
+
+    def load(self, table, rows):
+        """Bulk-load rows without counting upstream calls or simulating latency."""
+        with self.lock:
+            for row in rows:
+                self._insert_row(table, row, log=False)
+
+    # Stored functions (callers hold the lock)
+
+    def _rpc_crm_aggregate(self, spec):
+        """Python mirror of the crm_aggregate() SQL function in the README."""
+        table = spec["table"]
+
+        def value(row, ref):
+            if "." in ref:
+                parent, column = ref.split(".", 1)
+                row = self._by_id(parent, row.get(FOREIGN_KEYS[table][1])) or {}
+                ref = column
+            return row.get(ref)
+
+        groups = {}
+        for row in self.tables[table]:
+            if not all(compare(f["op"], value(row, f["column"]), f["value"]) for f in spec["filters"]):
+                continue
+            key = []
+            for g in spec["group_by"]:
+                v = value(row, g["column"])
+                if g["bucket"] and v is not None:
+                    v = BUCKETS[g["bucket"]](datetime.date.fromisoformat(str(v)[:10])).isoformat()
+                key.append(v)
+            groups.setdefault(tuple(key), []).append(row)
+        if not spec["group_by"]:
+            groups.setdefault((), [])  # an ungrouped aggregate always yields one row
+
+        out = []
+        for key, members in groups.items():
+            if spec["column"] is None:
+                result = len(members)
+            else:
+                values = [v for v in (value(r, spec["column"]) for r in members) if v is not None]
+                if spec["function"] == "count":
+                    result = len(values)
+                else:
+                    result = (min if spec["function"] == "min" else max)(values) if values else None
+            out.append({**{g["as"]: k for g, k in zip(spec["group_by"], key)}, spec["as"]: result})
+
+        if spec["order_by"] == "group":
+            out = sort_rows(out, [(g["as"], spec["desc"], None) for g in spec["group_by"]])
+        else:
+            out = sort_rows(out, [(spec["as"], spec["desc"], None)])
+        return out[: spec["limit"]]
+
+    # Row storage helpers (callers hold the lock)
+
+    def _by_id(self, table, row_id):
+        return self._index[table].get(row_id)
+
+    def _children(self, table, parent_id):
+        return list(self._child_index[table].get(parent_id, ()))
+
+    def _find(self, table, column, value):
+        if column == "id":
+            return self._by_id(table, value)
+        return next((r for r in self.tables[table] if r.get(column) == value), None)
+
+    def _check_row(self, table, row):
+        for column, allowed in CHECKS.get(table, {}).items():
+            value = row.get(column, DEFAULTS.get(table, {}).get(column))
+            if value is not None and value not in allowed:
+                raise FakeAPIError("23514", f'new row for relation "{table}" violates check constraint on {column}')
+        if table in FOREIGN_KEYS:
+            parent, fk = FOREIGN_KEYS[table]
+            if row.get(fk) is not None and self._by_id(parent, row[fk]) is None:
+                raise FakeAPIError("23503", f'insert or update on table "{table}" violates foreign key constraint on {fk}')
+
+    def _insert_row(self, table, row, log=True):
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        if table in SERIALS:
+            self._serials[table] += 1
+            row[SERIALS[table]] = self._serials[table]
+            row.setdefault("changed_at", now)
+            self.tables[table].append(row)
+            return row
+        for column, default in DEFAULTS.get(table, {}).items():
+            row.setdefault(column, default)
+        key = PRIMARY_KEYS.get(table, "id")
+        row.setdefault(key, str(uuid.uuid4()))
+        row.setdefault("created_at", now)
+        self.tables[table].append(row)
+        self._index[table][row[key]] = row
+        if table in FOREIGN_KEYS:
+            fk = FOREIGN_KEYS[table][1]
+            self._child_index[table].setdefault(row.get(fk), []).append(row)
+        if table == "interactions":
+            self._refresh_follow_up(row.get("contact_id"))
+        if log:
+            self._log_change(table, row)
+        return row
+
+    def _log_change(self, table, row):
+        """The crm_log_contact_change() trigger: note the contact a write touched."""
+        if table == "contacts":
+            self._insert_row("contact_changes", {"contact_id": row["id"]})
+        elif table == "interactions" and self._by_id("contacts", row.get("contact_id")):
+            # Interactions removed by their contact's cascade are covered by the contact's row
+            self._insert_row("contact_changes", {"contact_id": row["contact_id"]})
+
+    def _refresh_follow_up(self, contact_id):
+        """The crm_refresh_follow_ups() trigger: the contact's latest interaction, if it has an action."""
+        existing = self._by_id("follow_ups", contact_id)
+        if existing is not None:
+            self._delete_row("follow_ups", existing)
+        interactions = sort_rows(
+            self._children("interactions", contact_id), [("created_at", True, None), ("id", True, None)]
+        )
+        if interactions and interactions[0].get("next_action_date") and self._by_id("contacts", contact_id):
+            latest = interactions[0]
+            self._insert_row("follow_ups", {
+                "contact_id": contact_id,
+                "interaction_id": latest["id"],
+                **{c: latest.get(c) for c in ("type", "summary", "next_action", "next_action_date", "created_at")},
+            })
+
+    def _delete_row(self, table, row):
+        self.tables[table].remove(row)
+        self._index[table].pop(row.get(PRIMARY_KEYS.get(table, "id")), None)
+        if table in FOREIGN_KEYS:
+            siblings = self._child_index[table].get(row.get(FOREIGN_KEYS[table][1]), [])
+            if row in siblings:
+                siblings.remove(row)
+        if table == "interactions":
+            self._refresh_follow_up(row.get("contact_id"))
+        self._log_change(table, row)
+        # ON DELETE CASCADE for child tables
+        for child, (parent, fk) in FOREIGN_KEYS.items():
+            if parent == table:
+                for orphan in self._children(child, row.get("id")):
+                    self._delete_row(child, orphan)
@@ -0,0 +1,119 @@
+"""
+Follow-up agenda: each contact's open next action, bucketed by urgency.
+
+The follow_ups table (README) holds one row per contact whose latest
+interaction has a next_action_date, the same next action the contact list
+shows, so a newer interaction supersedes the actions of older ones.
+Statement triggers on interactions recompute the rows of just the contacts
+a write touched, so reading the agenda is an index range scan instead of a
+pass over every interaction.
+
+Buckets are relative to `today`: overdue (before today), today, and week
+(the six days after today). Entries are ordered by due date, most overdue
+first, then by contact id; that pair is also the keyset for paging.
+"""
+import base64
+import datetime
+import json
+
+BUCKETS = ("overdue", "today", "week")
+WEEK_DAYS = 7
+SELECT_COLUMNS = (
+    "contact_id, interaction_id, type, summary, next_action, next_action_date, created_at, "
+    "contacts(name, company, status)"
+)
+
+
+def bucket_filters(bucket, today):
+    """(op, date) filters on next_action_date for `bucket`, or for all three when None."""
+    week_end = (today + datetime.timedelta(days=WEEK_DAYS - 1)).isoformat()
+    today = today.isoformat()
+    return {
+        "overdue": [("lt", today)],
+        "today": [("eq", today)],
+        "week": [("gt", today), ("lte", week_end)],
+        None: [("lte", week_end)],
+    }[bucket]
+
+
+def bucket_of(next_action_date, today):
+    due = datetime.date.fromisoformat(next_action_date[:10])
+    if due < today:
+        return "overdue"
+    return "today" if due == today else "week"
+
+
+def encode_cursor(row):
+    """Opaque keyset cursor pointing just past `row` in (next_action_date, contact_id) order."""
+    raw = json.dumps([row["next_action_date"], row["contact_id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (next_action_date, contact_id) from a cursor, raising ValueError if malformed."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        due, contact_id = json.loads(base64.urlsafe_b64decode(padded))
+        datetime.date.fromisoformat(due)
+    except (TypeError, ValueError):
+        raise ValueError("invalid cursor")
+    # Values are quoted into a PostgREST filter, so keep them inert
+    if not isinstance(contact_id, str) or '"' in contact_id or "\\" in contact_id:
+        raise ValueError("invalid cursor")
+    return due, contact_id
+
+
+class FollowUpAgenda:
+    def __init__(self, today=datetime.date.today, gather=None):
+        self.today = today
+        self.gather = gather or (lambda *calls: [call() for call in calls])
+
+    def page(self, supabase, bucket=None, cursor=None, limit=50, with_counts=False):
+        """One page of the agenda: {follow_ups, next_cursor}, plus bucket counts if asked.
+
+        Raises ValueError for an unknown bucket or a malformed cursor.
+        """
+        if bucket is not None and bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+        after = decode_cursor(cursor) if cursor else None
+        today = self.today()
+        calls = [lambda: self._fetch(supabase, bucket, after, limit + 1, today)]
+        if with_counts:
+            calls += [lambda b=b: self._count(supabase, b, today) for b in BUCKETS]
+        rows, *counts = self.gather(*calls)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1])
+        body = {"follow_ups": [self._entry(row, today) for row in rows], "next_cursor": next_cursor}
+        if with_counts:
+            body["counts"] = dict(zip(BUCKETS, counts))
+        return body
+
+    def _query(self, supabase, columns, bucket, today, **kwargs):
+        query = supabase.table("follow_ups").select(columns, **kwargs)
+        for op, value in bucket_filters(bucket, today):
+            query = query.filter("next_action_date", op, value)
+        return query
+
+    def _fetch(self, supabase, bucket, after, limit, today):
+        query = self._query(supabase, SELECT_COLUMNS, bucket, today)
+        if after:
+            due, contact_id = after
+            query = query.or_(
+                f"next_action_date.gt.{due},and(next_action_date.eq.{due},contact_id.gt.\"{contact_id}\")"
+            )
+        return query.order("next_action_date").order("contact_id").limit(limit).execute().data
+
+    def _count(self, supabase, bucket, today):
+        result = self._query(supabase, "contact_id", bucket, today, count="exact", head=True).execute()
+        return result.count or 0
+
+    def _entry(self, row, today):
+        contact = row.pop("contacts", None) or {}
+        row["contact_name"] = contact.get("name")
+        row["contact_company"] = contact.get("company")
+        row["contact_status"] = contact.get("status")
+        row["bucket"] = bucket_of(row["next_action_date"], today)
+        return row
@@ -0,0 +1,41 @@
+"""
+Gunicorn serving profile for the API:  gunicorn -c gunicorn.conf.py app:app
+
+Nearly all request time is spent waiting: on Supabase for every request,
+and on OpenAI for seconds per chat. With threaded workers (gthread) a
+request waiting on I/O holds one thread rather than a whole process, so a
+few slow chats no longer stall the contact list. The app is imported once
+in the master (preload) and workers fork with it loaded. Supabase and
+OpenAI clients are built lazily in each worker after the fork.
+
+    WEB_CONCURRENCY   worker processes (default 2)
+    GUNICORN_THREADS  threads per worker, i.e. concurrent requests (default 16)
+    GUNICORN_PRELOAD  0 to import the app in each worker instead
+    PORT              listen port (default 8080)
+"""
+import os
+import time
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+# gthread workers heartbeat from their main loop, so a long chat stream does not trip this
+timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        # Import the SDKs once here so no forked worker pays for them on its first request
+        import openai  # noqa: F401
+        import supabase  # noqa: F401
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    worker.log.info("Worker booted in %.1f ms", (time.perf_counter() - worker.forked_at) * 1000)
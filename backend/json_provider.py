@@ -0,0 +1,64 @@
+"""
+Flask JSON provider with a pluggable encoder.
+
+    app.json = FastJSONProvider(app)                    # orjson if installed
+    app.json = FastJSONProvider(app, encoder="stdlib")  # json module only
+
+Output is compact UTF-8 rather than \\u-escaped (Hebrew text is a third of
+the size) and keys keep their insertion order. With orjson, values it
+cannot encode itself (dates, Decimal, integers beyond 64 bits) go through
+the default provider's rules, so both encoders produce equivalent JSON.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # stdlib json only
+    orjson = None
+
+ENCODERS = ("orjson", "stdlib")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    ensure_ascii = False
+    sort_keys = False
+
+    def __init__(self, app, encoder=None):
+        super().__init__(app)
+        encoder = encoder or ("orjson" if orjson is not None else "stdlib")
+        if encoder not in ENCODERS:
+            raise ValueError(f"unknown JSON encoder {encoder!r}; use one of {', '.join(ENCODERS)}")
+        if encoder == "orjson" and orjson is None:
+            raise ValueError("JSON encoder orjson is not installed")
+        self.encoder = encoder
+
+    def dumps_bytes(self, obj):
+        """Compact UTF-8 JSON for `obj`."""
+        if self.encoder == "orjson":
+            try:
+                return orjson.dumps(
+                    obj,
+                    default=self.default,
+                    option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+                )
+            except TypeError:
+                pass  # e.g. an integer orjson cannot represent
+        return super().dumps(obj, separators=(",", ":")).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs or self.encoder != "orjson":
+            if "indent" not in kwargs:
+                kwargs.setdefault("separators", (",", ":"))
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs or self.encoder != "orjson":
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        body = self.dumps_bytes(self._prepare_response_obj(args, kwargs)) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
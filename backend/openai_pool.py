@@ -0,0 +1,132 @@
+"""
+Per-worker pool of reusable API clients keyed by a hash of the API key.
+
+Building an OpenAI client per request throws away its HTTP connection pool,
+so each model call pays a new TCP + TLS handshake. ClientPool keeps one
+client per key (the key itself is never stored), hands the same instance to
+every request using that key, and closes clients that sit idle longer than
+`idle_ttl` or fall off the end of the LRU. A client that is still in use
+when evicted is closed once its last user releases it.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class _Entry:
+    __slots__ = ("client", "last_used", "in_use", "evicted")
+
+    def __init__(self, client, now):
+        self.client = client
+        self.last_used = now
+        self.in_use = 0
+        self.evicted = False
+
+
+class ClientPool:
+    def __init__(self, factory, maxsize=32, idle_ttl=300.0, clock=time.monotonic):
+        self.factory = factory
+        self.maxsize = maxsize
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._by_client = {}
+        self._lock = threading.Lock()
+        self.created = self.reused = self.evicted = 0
+
+    @staticmethod
+    def _key(api_key):
+        return hashlib.sha256(api_key.encode()).hexdigest()
+
+    def acquire(self, api_key):
+        key = self._key(api_key)
+        to_close = []
+        with self._lock:
+            now = self.clock()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.reused += 1
+            else:
+                entry = _Entry(self.factory(api_key), now)
+                self._entries[key] = entry
+                self._by_client[id(entry.client)] = entry
+                self.created += 1
+            entry.in_use += 1
+            entry.last_used = now
+            to_close = self._evict(now)
+        self._close(to_close)
+        return entry.client
+
+    def release(self, client):
+        to_close = []
+        with self._lock:
+            entry = self._by_client.get(id(client))
+            if entry is None:
+                return
+            entry.in_use -= 1
+            entry.last_used = self.clock()
+            if entry.evicted and entry.in_use == 0:
+                del self._by_client[id(client)]
+                to_close.append(entry.client)
+        self._close(to_close)
+
+    @contextmanager
+    def client(self, api_key):
+        client = self.acquire(api_key)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def _evict(self, now):
+        """Drop idle and over-capacity entries; return clients safe to close now."""
+        doomed = [k for k, e in self._entries.items() if e.in_use == 0 and now - e.last_used > self.idle_ttl]
+        overflow = len(self._entries) - len(doomed) - self.maxsize
+        for k in self._entries:
+            if overflow <= 0:
+                break
+            if k not in doomed:
+                doomed.append(k)
+                overflow -= 1
+        to_close = []
+        for k in doomed:
+            entry = self._entries.pop(k)
+            entry.evicted = True
+            self.evicted += 1
+            if entry.in_use == 0:
+                del self._by_client[id(entry.client)]
+                to_close.append(entry.client)
+        return to_close
+
+    def _close(self, clients):
+        for client in clients:
+            close = getattr(client, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            clients = [e.client for e in self._entries.values() if e.in_use == 0]
+            for entry in self._entries.values():
+                entry.evicted = True
+                if entry.in_use == 0:
+                    self._by_client.pop(id(entry.client), None)
+            self._entries.clear()
+        self._close(clients)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "idle_ttl_seconds": self.idle_ttl,
+                "created": self.created,
+                "reused": self.reused,
+                "evicted": self.evicted,
+            }
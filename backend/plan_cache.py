@@ -0,0 +1,152 @@
+"""
+Cache of AI chat query plans, shared by all gunicorn workers on the host.
+
+The first model call in /api/chat only turns the question into a JSON query
+plan. The plan depends on the normalized question, the date inserted into
+the system prompt, and the prompt itself, so those form the cache key and a
+repeated question skips the model call. Entries live in a small SQLite file,
+are pruned least-recently-used beyond `maxsize`, and are dropped once their
+date has passed. Hit/miss counters and the model time saved are also kept in
+the file, so the figures cover every worker.
+
+A hit is a read only: recency and counters are buffered per process and
+written in one transaction every `flush_interval` seconds, before a put
+(so LRU pruning sees recent hits) and before stats are read. A worker that
+exits loses at most that interval of counts and recency.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+
+DEFAULT_PLAN_DB = os.path.join(tempfile.gettempdir(), "crm-chat-plans.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    key TEXT PRIMARY KEY,
+    plan TEXT NOT NULL,
+    plan_date TEXT NOT NULL,
+    model_ms REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plans_last_used ON plans (last_used);
+CREATE TABLE IF NOT EXISTS plan_stats (name TEXT PRIMARY KEY, value REAL NOT NULL);
+"""
+
+
+def normalize_message(message):
+    """Fold case, Unicode forms, whitespace and trailing punctuation."""
+    text = unicodedata.normalize("NFKC", message).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.strip(" ?!.,;:״\"'")
+
+
+class PlanCache:
+    """With `path=None` the cache is private to this process (tests, bench)."""
+
+    def __init__(self, path=DEFAULT_PLAN_DB, maxsize=2000, flush_interval=5.0, clock=time.monotonic):
+        self.path = path or ":memory:"
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self._touched = {}  # key -> last_used not yet written
+        self._counts = {}  # plan_stats name -> amount not yet written
+        self._flushed_at = clock()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shared = None
+        with self._lock:
+            self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        if self.path == ":memory:":
+            # A private in-memory database must be one shared connection
+            if self._shared is None:
+                self._shared = sqlite3.connect(":memory:", isolation_level=None, check_same_thread=False)
+            return self._shared
+        conn = getattr(self._local, "conn", None)
+        # A connection inherited across fork (gunicorn --preload) must not be used
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def key(message, today, prompt):
+        raw = "\n".join([today, hashlib.sha256(prompt.encode()).hexdigest(), normalize_message(message)])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            conn = self._conn()
+            row = conn.execute("SELECT plan, model_ms FROM plans WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count("misses", 1)
+            else:
+                self._touched[key] = time.time()
+                self._count("hits", 1)
+                self._count("saved_ms", row[1])
+            if self.clock() - self._flushed_at >= self.flush_interval:
+                self._flush(conn)
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key, plan, today, model_ms):
+        with self._lock:
+            conn = self._conn()
+            self._flush(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO plans (key, plan, plan_date, model_ms, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(plan, ensure_ascii=False), today, model_ms, time.time()),
+            )
+            conn.execute("DELETE FROM plans WHERE plan_date < ?", (today,))
+            conn.execute(
+                "DELETE FROM plans WHERE key IN ("
+                " SELECT key FROM plans ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+
+    def _count(self, name, amount):
+        self._counts[name] = self._counts.get(name, 0) + amount
+
+    def _flush(self, conn):
+        self._flushed_at = self.clock()
+        if not self._touched and not self._counts:
+            return
+        touched, counts = self._touched, self._counts
+        self._touched, self._counts = {}, {}
+        with conn:
+            conn.execute("BEGIN")
+            # Another worker may have used the plan more recently
+            conn.executemany(
+                "UPDATE plans SET last_used = MAX(last_used, ?) WHERE key = ?",
+                [(used, key) for key, used in touched.items()],
+            )
+            conn.executemany(
+                "INSERT INTO plan_stats (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(counts.items()),
+            )
+
+    def stats(self):
+        with self._lock:
+            conn = self._conn()
+            self._flush(conn)
+            values = dict(conn.execute("SELECT name, value FROM plan_stats").fetchall())
+            size = conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+        hits, misses = int(values.get("hits", 0)), int(values.get("misses", 0))
+        lookups = hits + misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "model_ms_saved": round(values.get("saved_ms", 0.0), 1),
+        }
@@ -0,0 +1,101 @@
+"""
+Bounded fan-out for independent upstream queries within one request.
+
+    detail, timeline = queries.gather(load_contact, load_interactions)
+
+`gather` runs the calls concurrently and returns their results in argument
+order, so a request waits about as long as its slowest query instead of
+the sum of all of them. Two bounds apply: the worker-wide thread pool
+(`max_workers`) and a per-request cap (`fanout`) on calls in flight at
+once. The calling thread runs one of the calls itself, so every request
+makes progress even while the pool is busy, and calls made from inside a
+pool thread run inline rather than waiting on the pool they occupy.
+
+If a call raises, calls that have not started are cancelled and the
+exception is re-raised in the caller with its original traceback. Pool
+threads run each call in a copy of the caller's context, so context
+variables such as the request trace carry over.
+"""
+import contextvars
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class QueryPool:
+    def __init__(self, max_workers=8, fanout=4):
+        self.max_workers = max_workers
+        self.fanout = max(1, fanout)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.batches = self.calls = self.inline = 0
+
+    def _in_pool(self):
+        return getattr(self._local, "active", False)
+
+    def _run(self, call):
+        self._local.active = True
+        try:
+            return call()
+        finally:
+            self._local.active = False
+
+    def gather(self, *calls):
+        """Run `calls` (zero-argument callables) concurrently; return their results in order."""
+        with self._lock:
+            self.batches += 1
+            self.calls += len(calls)
+        if len(calls) <= 1 or self.fanout == 1 or self._in_pool():
+            with self._lock:
+                self.inline += len(calls)
+            return [call() for call in calls]
+
+        results = [None] * len(calls)
+        errors = {}
+        # The caller takes the first call; the pool gets up to fanout - 1 at a time
+        queue = list(enumerate(calls))[1:]
+        running = {}
+
+        def submit_next():
+            while queue and len(running) < self.fanout - 1:
+                index, call = queue.pop(0)
+                context = contextvars.copy_context()
+                running[self._executor.submit(context.run, self._run, call)] = index
+
+        submit_next()
+        try:
+            results[0] = calls[0]()
+        except Exception as e:
+            errors[0] = e
+        with self._lock:
+            self.inline += 1
+
+        while running and not errors:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    errors[index] = e
+            if not errors:
+                submit_next()
+
+        if errors:
+            for future in running:
+                future.cancel()
+            raise errors[min(errors)]
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "fanout": self.fanout,
+                "batches": self.batches,
+                "calls": self.calls,
+                "ran_inline": self.inline,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,404 @@
+"""
+In-memory contact search index with Hebrew-aware normalization.
+
+`normalize` folds case, strips niqqud and cantillation, maps final letters
+to their regular forms (ך→כ, ם→מ, ן→נ, ף→פ, ץ→צ), drops geresh, gershayim and
+other quote variants, and turns remaining punctuation into spaces. So
+"בע״מ", "בע\"מ" and "בעמ" all match, and so do "שָׁלוֹם" and "שלום".
+
+Queries of three or more characters match substrings through a trigram
+index; shorter queries match word prefixes. `mentions` finds the contact
+names that occur in a piece of text (chat replies) by looking up each run
+of its words in a table of normalized full names.
+
+Each worker keeps its own index. It is loaded in the background on the
+first search (callers fall back to the database until it is ready),
+updated in place by this worker's writes, and brought up to date with
+other workers' writes through a shared ChangeLog file before each search.
+A full reload runs every `rebuild_every` seconds to pick up edits made
+outside the API.
+"""
+import bisect
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+import uuid
+from array import array
+from collections import Counter
+
+DEFAULT_CHANGES_DB = os.path.join(tempfile.gettempdir(), "crm-search-changes.sqlite3")
+
+QUOTES = "'\"`׳״‘’‚‛“”„‟´"
+# Combining marks: Latin accents, Hebrew niqqud and cantillation (not maqaf, paseq, sof pasuq)
+MARKS = "\u0300-\u036f\u0591-\u05bd\u05bf\u05c1\u05c2\u05c4\u05c5\u05c7"
+# Words: letters, digits, marks and quote marks inside them (בע"מ, ג'ורג')
+WORD = re.compile(rf"[\w{MARKS}{re.escape(QUOTES)}]+")
+FOLDED_WORD = re.compile(r"\w+")
+# One-letter prefixes attached to Hebrew words (and, the, in, to, from, that, as)
+PREFIXES = "והבלמשכ"
+LOAD_PAGE = 1000
+SELECT_COLUMNS = "id, name, email, company, status, created_at"
+
+# Final letters to regular forms; combining marks and quotes removed
+_FOLD = str.maketrans("ךםןףץ", "כמנפצ", QUOTES + "".join(re.findall(f"[{MARKS}]", "".join(map(chr, range(0x300, 0x5c8))))))
+
+
+def _fold(text):
+    return unicodedata.normalize("NFKD", text.casefold()).translate(_FOLD)
+
+
+def words(text):
+    """Yield (normalized word, start, end) for each word of `text`."""
+    for match in WORD.finditer(text or ""):
+        raw = match.group()
+        stripped = raw.strip(QUOTES)
+        folded = _fold(stripped)
+        if folded:
+            start = match.start() + len(raw) - len(raw.lstrip(QUOTES))
+            yield folded, start, start + len(stripped)
+
+
+def normalize(text):
+    """Folded words of `text` joined by single spaces (same words as `words`)."""
+    return " ".join(FOLDED_WORD.findall(_fold(text or "")))
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _Doc:
+    __slots__ = ("id", "name", "status", "sort_key", "text", "name_words")
+
+    def __init__(self, contact):
+        self.id = contact["id"]
+        self.name = contact.get("name") or ""
+        self.status = contact.get("status")
+        self.sort_key = (contact.get("created_at") or "", self.id)
+        self.name_words = tuple(w for w, _, _ in words(self.name))
+        fields = (self.name, contact.get("email"), contact.get("company"))
+        self.text = "\n".join(normalize(f) for f in fields)
+
+
+class _Store:
+    """The index structures; SearchIndex swaps in a new one on reload."""
+
+    def __init__(self, docs=()):
+        self.docs = []         # doc number -> _Doc, or None once replaced/deleted
+        self.by_id = {}        # contact id -> doc number
+        self.grams = {}        # trigram -> array of doc numbers
+        self.words = {}        # word -> array of doc numbers
+        self.names = {}        # name as a tuple of words -> list of doc numbers
+        self.name_lengths = Counter()
+        self.sorted_words = None
+        self.dead = 0
+        for doc in docs:
+            self.add(doc)
+
+    def add(self, doc):
+        self.drop(doc.id)
+        number = len(self.docs)
+        self.docs.append(doc)
+        self.by_id[doc.id] = number
+        for gram in trigrams(doc.text):
+            self.grams.setdefault(gram, array("I")).append(number)
+        for word in set(doc.text.split()):
+            if word not in self.words:
+                self.sorted_words = None
+                self.words[word] = array("I")
+            self.words[word].append(number)
+        if doc.name_words:
+            self.names.setdefault(doc.name_words, []).append(number)
+            self.name_lengths[len(doc.name_words)] += 1
+
+    def drop(self, contact_id):
+        number = self.by_id.pop(contact_id, None)
+        if number is not None:
+            doc = self.docs[number]
+            if doc.name_words:
+                self.name_lengths[len(doc.name_words)] -= 1
+            self.docs[number] = None
+            self.dead += 1
+
+    def compacted(self):
+        """This store, or a rebuilt one once replaced entries make up a quarter of it."""
+        if self.dead > 1000 and self.dead * 4 > len(self.docs):
+            return _Store(d for d in self.docs if d is not None)
+        return self
+
+
+class SearchIndex:
+    def __init__(self, changes=None, rebuild_every=600.0, clock=time.monotonic):
+        self.changes = changes or ChangeLog(path=None)
+        self.rebuild_every = rebuild_every
+        self.clock = clock
+        self._origin = self._origin_pid = None
+        self._lock = threading.Lock()
+        self._store = _Store()
+        self._loading = None
+        self.ready = False
+        self.built_at = None
+        self.seq = 0
+        self.generation = 0
+        self._replay_own = False
+        self.searches = self.syncs = self.rebuilds = 0
+
+    @property
+    def origin(self):
+        """Tags this worker's entries in the change log; a forked worker gets its own."""
+        if self._origin_pid != os.getpid():
+            self._origin, self._origin_pid = uuid.uuid4().hex, os.getpid()
+        return self._origin
+
+    # ─── Maintenance ─────────────────────────────────────────────────────
+
+    def put(self, contact):
+        """Index a created or updated contact (id, name, email, company, status, created_at)."""
+        with self._lock:
+            if self.ready:
+                self._store.add(_Doc(contact))
+        self.changes.append(contact["id"], self.origin)
+
+    def remove(self, contact_id):
+        with self._lock:
+            self._store.drop(contact_id)
+            self._store = self._store.compacted()
+        self.changes.append(contact_id, self.origin)
+
+    def invalidate(self):
+        """Many contacts changed at once (bulk import): every worker reloads."""
+        self.changes.append("*", self.origin)
+
+    def rebuild(self, supabase):
+        """Load every contact from the database and swap the new index in."""
+        seq = self.changes.latest()
+        store = _Store()
+        last_id = None
+        while True:
+            query = supabase.table("contacts").select(SELECT_COLUMNS)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            page = query.order("id").limit(LOAD_PAGE).execute().data
+            for contact in page:
+                store.add(_Doc(contact))
+            if len(page) < LOAD_PAGE:
+                break
+            last_id = page[-1]["id"]
+        with self._lock:
+            # The next refresh replays every change logged after `seq`, this
+            # worker's own included: put() skipped them while loading
+            self._store = store
+            self.seq = seq
+            self._replay_own = True
+            self.generation += 1
+            self.ready = True
+            self.built_at = self.clock()
+            self.rebuilds += 1
+
+    def _start_rebuild(self, supabase):
+        with self._lock:
+            if self._loading is not None and self._loading.is_alive():
+                return
+            self._loading = threading.Thread(target=self._rebuild_quietly, args=(supabase,), daemon=True)
+            self._loading.start()
+
+    def _rebuild_quietly(self, supabase):
+        try:
+            self.rebuild(supabase)
+        except Exception:
+            pass  # searches keep using the database (or the previous index)
+
+    def refresh(self, supabase):
+        """Bring the index up to date; returns False while it is still loading."""
+        if not self.ready or self.clock() - self.built_at > self.rebuild_every:
+            self._start_rebuild(supabase)
+        if not self.ready:
+            return False
+        with self._lock:
+            since, generation = self.seq, self.generation
+            origin = None if self._replay_own else self.origin
+        seq, ids = self.changes.since(since, origin)
+        if ids is None:
+            self._start_rebuild(supabase)  # keep answering from the current index meanwhile
+            return True
+        if ids:
+            rows = supabase.table("contacts").select(SELECT_COLUMNS).in_("id", sorted(ids)).execute().data
+            found = {r["id"]: r for r in rows}
+            with self._lock:
+                for contact_id in ids:
+                    if contact_id in found:
+                        self._store.add(_Doc(found[contact_id]))
+                    else:
+                        self._store.drop(contact_id)
+                self._store = self._store.compacted()
+                self.syncs += 1
+        with self._lock:
+            # A rebuild that swapped in meanwhile still needs its own replay
+            if generation == self.generation:
+                self.seq = max(self.seq, seq)
+                self._replay_own = False
+        return True
+
+    # ─── Lookups ─────────────────────────────────────────────────────────
+
+    def search(self, query, status=None, after=None, limit=50, with_keys=False):
+        """Ids of matching contacts, newest first, keyset-paged after (created_at, id).
+
+        With `with_keys`, (id, (created_at, id)) pairs, so callers can page on
+        from the index's order.
+        """
+        needle = normalize(query)
+        if not needle:
+            return []
+        with self._lock:
+            self.searches += 1
+            store = self._store
+            if len(needle) >= 3:
+                postings = [store.grams.get(g) for g in trigrams(needle)]
+                if not all(postings):
+                    return []
+                candidates = set(min(postings, key=len))
+            else:
+                if store.sorted_words is None:
+                    store.sorted_words = sorted(store.words)
+                lo = bisect.bisect_left(store.sorted_words, needle)
+                hi = bisect.bisect_left(store.sorted_words, needle + "\uffff")
+                candidates = set()
+                for word in store.sorted_words[lo:hi]:
+                    candidates.update(store.words[word])
+            matches = []
+            for number in candidates:
+                doc = store.docs[number]
+                if doc is None or (status and doc.status != status):
+                    continue
+                if after is not None and doc.sort_key >= after:
+                    continue
+                if len(needle) >= 3 and needle not in doc.text:
+                    continue
+                matches.append(doc)
+        matches.sort(key=lambda d: d.sort_key, reverse=True)
+        if with_keys:
+            return [(d.id, d.sort_key) for d in matches[:limit]]
+        return [d.id for d in matches[:limit]]
+
+    def mentions(self, text):
+        """Contacts whose full name appears in `text`, as [{id, name, text}].
+
+        `text` is the exact span in the input, for linking. A one-letter
+        prefix on the first word ("ודנה", "לדנה") is tolerated and left out
+        of the span. Where names overlap the longer one wins, between
+        namesakes the newest contact; each span is reported once.
+        """
+        found = list(words(text))
+        out, i = [], 0
+        with self._lock:
+            store = self._store
+            lengths = sorted((n for n, count in store.name_lengths.items() if count > 0), reverse=True)
+            while i < len(found):
+                best, skip = None, 0
+                first = found[i][0]
+                # Also try without a one-letter Hebrew prefix ("ודנה לוי" names "דנה לוי")
+                variants = [(first, 0)] + ([(first[1:], 1)] if len(first) > 1 and first[0] in PREFIXES else [])
+                for n in lengths:
+                    rest = tuple(w for w, _, _ in found[i + 1:i + n])
+                    if len(rest) != n - 1:
+                        continue
+                    for word, skip in variants:
+                        docs = [store.docs[k] for k in store.names.get((word,) + rest, ()) if store.docs[k] is not None]
+                        if docs:
+                            best = max(docs, key=lambda d: d.sort_key)
+                            break
+                    if best is not None:
+                        break
+                if best is None:
+                    i += 1
+                    continue
+                n = len(best.name_words)
+                span = text[found[i][1] + skip:found[i + n - 1][2]]
+                if all(m["text"] != span for m in out):
+                    out.append({"id": best.id, "name": best.name, "text": span})
+                i += n
+        return out
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "contacts": len(self._store.by_id),
+                "trigrams": len(self._store.grams),
+                "searches": self.searches,
+                "syncs": self.syncs,
+                "rebuilds": self.rebuilds,
+            }
+
+
+class ChangeLog:
+    """Contact ids written by any worker, in order, in a shared SQLite file.
+
+    "*" means "reload everything". With `path=None` the log is private to
+    this process. Only the newest `keep` entries are retained; a reader that
+    fell further behind than that reloads in full.
+    """
+
+    def __init__(self, path=DEFAULT_CHANGES_DB, keep=10000):
+        self.path = path or ":memory:"
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shared = None
+        with self._lock:
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS changes ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT, contact_id TEXT NOT NULL, origin TEXT NOT NULL)"
+            )
+
+    def _conn(self):
+        if self.path == ":memory:":
+            if self._shared is None:
+                self._shared = sqlite3.connect(":memory:", isolation_level=None, check_same_thread=False)
+            return self._shared
+        conn = getattr(self._local, "conn", None)
+        # A connection inherited across fork (gunicorn --preload) must not be used
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def append(self, contact_id, origin):
+        with self._lock:
+            conn = self._conn()
+            seq = conn.execute(
+                "INSERT INTO changes (contact_id, origin) VALUES (?, ?)", (contact_id, origin)
+            ).lastrowid
+            if seq % 100 == 0:
+                conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - self.keep,))
+
+    def latest(self):
+        with self._lock:
+            return self._conn().execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def since(self, seq, origin=None):
+        """Return (latest seq, ids changed after `seq`), or ids=None to reload.
+
+        With an `origin`, that origin's own entries are left out.
+        """
+        with self._lock:
+            conn = self._conn()
+            oldest = conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            rows = conn.execute(
+                "SELECT seq, contact_id, origin FROM changes WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+        if not rows:
+            return seq, set()
+        latest = rows[-1][0]
+        if oldest is not None and seq + 1 < oldest:
+            return latest, None
+        if any(contact_id == "*" for _, contact_id, _ in rows):
+            return latest, None
+        return latest, {contact_id for _, contact_id, row_origin in rows if origin is None or row_origin != origin}
@@ -1,18 +1,19 @@
 """
 Seed script: Populate the CRM database with sample Hebrew data.
 Run:  cd backend && python seed.py
+      cd backend && python seed.py --synthetic 100000   # large generated dataset
+
+The synthetic generator reuses the sample names, companies and interaction
+texts below, so generated rows look like the hand-written ones. It is also
+used by bench.py to fill the in-process FakeSupabase.
 """
+import argparse
 import datetime
-from config import supabase
-
-# ─── Clear existing data ────────────────────────────────────────────────────
-print("Clearing existing data...")
-supabase.table("interactions").delete().neq("id", "00000000-0000-0000-0000-000000000000").execute()
-supabase.table("contacts").delete().neq("id", "00000000-0000-0000-0000-000000000000").execute()
-print("Data cleared.")
+import random
+import uuid
 
-# ─── Insert contacts ────────────────────────────────────────────────────────
-contacts_data = [
+# ─── Sample data ─────────────────────────────────────────────────────────────
+CONTACTS_DATA = [
     {"name": "רונית כהן", "email": "ronit@techsolutions.co.il", "phone": "050-1234567", "company": "טכנולוגיות אלון", "status": "לקוח פעיל"},
     {"name": "יוסי לוי", "email": "yossi@startup.io", "phone": "052-9876543", "company": "סטארט-אפ חדשנות", "status": "ליד"},
     {"name": "מירי אברהם", "email": "miri@design.co.il", "phone": "054-5551234", "company": "עיצוב מודרני", "status": "לקוח פעיל"},
@@ -22,106 +23,238 @@ contacts_data = [
     {"name": "נועה פרידמן", "email": "noa@education.co.il", "phone": "052-1112222", "company": "חינוך ולמידה", "status": "ליד"},
 ]
 
-print(f"Inserting {len(contacts_data)} contacts...")
-contacts_result = supabase.table("contacts").insert(contacts_data).execute()
-contacts = contacts_result.data
-print(f"Inserted {len(contacts)} contacts.")
-
-# Map contact names to IDs for interaction references
-contact_ids = {c["name"]: c["id"] for c in contacts}
-
-# ─── Insert interactions ─────────────────────────────────────────────────────
-today = datetime.date.today()
-yesterday = (today - datetime.timedelta(days=1)).isoformat()
-last_week = (today - datetime.timedelta(days=7)).isoformat()
-two_weeks_ago = (today - datetime.timedelta(days=14)).isoformat()
-tomorrow = (today + datetime.timedelta(days=1)).isoformat()
-today_str = today.isoformat()
-
-interactions_data = [
-    # רונית כהן — active customer with recent interactions
-    {
-        "contact_id": contact_ids["רונית כהן"], "type": "פגישה",
-        "summary": "פגישת סטטוס על פרויקט אתר חדש. הלקוחה מרוצה מההתקדמות.",
-        "next_action": "לשלוח הצעת מחיר לשלב הבא", "next_action_date": today_str,
-    },
-    {
-        "contact_id": contact_ids["רונית כהן"], "type": "מייל",
-        "summary": "שלחתי סיכום פגישה ומסמכי דרישות מעודכנים.",
-        "next_action": "", "next_action_date": None,
-    },
-    {
-        "contact_id": contact_ids["רונית כהן"], "type": "שיחה",
-        "summary": "שיחת היכרות ראשונית. רונית מעוניינת בבניית אתר לחברה.",
-        "next_action": "לתאם פגישה פרונטלית", "next_action_date": None,
-    },
-    # יוסי לוי — lead, overdue follow-up
-    {
-        "contact_id": contact_ids["יוסי לוי"], "type": "שיחה",
-        "summary": "שיחת טלפון ראשונית. מעוניין בפתרון CRM לסטארט-אפ שלו.",
-        "next_action": "לשלוח חומרים ולתאם דמו", "next_action_date": yesterday,
-    },
-    {
-        "contact_id": contact_ids["יוסי לוי"], "type": "הערה",
-        "summary": "יוסי ביקש לקבל הצעת מחיר תוך שבוע. תקציב מוגבל.",
-        "next_action": "להכין הצעת מחיר מותאמת", "next_action_date": last_week,
-    },
-    # מירי אברהם — active customer
-    {
-        "contact_id": contact_ids["מירי אברהם"], "type": "פגישה",
-        "summary": "פגישה במשרדי מירי. סיכמנו על חבילת עיצוב שנתית.",
-        "next_action": "לשלוח חוזה לחתימה", "next_action_date": tomorrow,
-    },
-    {
-        "contact_id": contact_ids["מירי אברהם"], "type": "מייל",
-        "summary": "מירי שלחה בריף עיצובי. צריך לבדוק ולהגיב.",
-        "next_action": "להגיב על הבריף", "next_action_date": today_str,
-    },
-    # דוד חיים — inactive
-    {
-        "contact_id": contact_ids["דוד חיים"], "type": "שיחה",
-        "summary": "ניסיתי ליצור קשר אבל דוד לא מעוניין כרגע. אולי בעתיד.",
-        "next_action": "לחזור אליו בעוד 3 חודשים", "next_action_date": None,
-    },
-    {
-        "contact_id": contact_ids["דוד חיים"], "type": "מייל",
-        "summary": "שלחתי מייל מעקב. לא קיבלתי תשובה.",
-        "next_action": "", "next_action_date": two_weeks_ago,
-    },
-    # שרה גולדברג — lead
-    {
-        "contact_id": contact_ids["שרה גולדברג"], "type": "שיחה",
-        "summary": "שרה פנתה דרך האתר. מחפשת פתרון שיווקי דיגיטלי.",
-        "next_action": "לשלוח תיק עבודות", "next_action_date": today_str,
-    },
-    {
-        "contact_id": contact_ids["שרה גולדברג"], "type": "הערה",
-        "summary": "שרה עובדת בחברת שיווק ומחפשת כלי לניהול לידים.",
-        "next_action": "", "next_action_date": None,
-    },
-    # אבי מזרחי — active customer
-    {
-        "contact_id": contact_ids["אבי מזרחי"], "type": "פגישה",
-        "summary": "פגישת סיכום רבעון. הלקוח מרוצה מהשירות.",
-        "next_action": "לשלוח דוח ביצועים רבעוני", "next_action_date": yesterday,
-    },
-    {
-        "contact_id": contact_ids["אבי מזרחי"], "type": "שיחה",
-        "summary": "אבי רוצה להרחיב את החבילה. מעוניין בתוספת אנליטיקה.",
-        "next_action": "להכין הצעה להרחבת שירות", "next_action_date": tomorrow,
-    },
-    # נועה פרידמן — lead
-    {
-        "contact_id": contact_ids["נועה פרידמן"], "type": "מייל",
-        "summary": "נועה שלחה פנייה דרך טופס יצירת קשר.",
-        "next_action": "להתקשר לנועה לשיחת היכרות", "next_action_date": today_str,
-    },
-]
 
-print(f"Inserting {len(interactions_data)} interactions...")
-interactions_result = supabase.table("interactions").insert(interactions_data).execute()
-print(f"Inserted {len(interactions_result.data)} interactions.")
+def sample_interactions(contact_ids, today):
+    """The hand-written interactions, keyed to inserted contact ids by name."""
+    yesterday = (today - datetime.timedelta(days=1)).isoformat()
+    last_week = (today - datetime.timedelta(days=7)).isoformat()
+    two_weeks_ago = (today - datetime.timedelta(days=14)).isoformat()
+    tomorrow = (today + datetime.timedelta(days=1)).isoformat()
+    today_str = today.isoformat()
+
+    return [
+        # רונית כהן — active customer with recent interactions
+        {
+            "contact_id": contact_ids["רונית כהן"], "type": "פגישה",
+            "summary": "פגישת סטטוס על פרויקט אתר חדש. הלקוחה מרוצה מההתקדמות.",
+            "next_action": "לשלוח הצעת מחיר לשלב הבא", "next_action_date": today_str,
+        },
+        {
+            "contact_id": contact_ids["רונית כהן"], "type": "מייל",
+            "summary": "שלחתי סיכום פגישה ומסמכי דרישות מעודכנים.",
+            "next_action": "", "next_action_date": None,
+        },
+        {
+            "contact_id": contact_ids["רונית כהן"], "type": "שיחה",
+            "summary": "שיחת היכרות ראשונית. רונית מעוניינת בבניית אתר לחברה.",
+            "next_action": "לתאם פגישה פרונטלית", "next_action_date": None,
+        },
+        # יוסי לוי — lead, overdue follow-up
+        {
+            "contact_id": contact_ids["יוסי לוי"], "type": "שיחה",
+            "summary": "שיחת טלפון ראשונית. מעוניין בפתרון CRM לסטארט-אפ שלו.",
+            "next_action": "לשלוח חומרים ולתאם דמו", "next_action_date": yesterday,
+        },
+        {
+            "contact_id": contact_ids["יוסי לוי"], "type": "הערה",
+            "summary": "יוסי ביקש לקבל הצעת מחיר תוך שבוע. תקציב מוגבל.",
+            "next_action": "להכין הצעת מחיר מותאמת", "next_action_date": last_week,
+        },
+        # מירי אברהם — active customer
+        {
+            "contact_id": contact_ids["מירי אברהם"], "type": "פגישה",
+            "summary": "פגישה במשרדי מירי. סיכמנו על חבילת עיצוב שנתית.",
+            "next_action": "לשלוח חוזה לחתימה", "next_action_date": tomorrow,
+        },
+        {
+            "contact_id": contact_ids["מירי אברהם"], "type": "מייל",
+            "summary": "מירי שלחה בריף עיצובי. צריך לבדוק ולהגיב.",
+            "next_action": "להגיב על הבריף", "next_action_date": today_str,
+        },
+        # דוד חיים — inactive
+        {
+            "contact_id": contact_ids["דוד חיים"], "type": "שיחה",
+            "summary": "ניסיתי ליצור קשר אבל דוד לא מעוניין כרגע. אולי בעתיד.",
+            "next_action": "לחזור אליו בעוד 3 חודשים", "next_action_date": None,
+        },
+        {
+            "contact_id": contact_ids["דוד חיים"], "type": "מייל",
+            "summary": "שלחתי מייל מעקב. לא קיבלתי תשובה.",
+            "next_action": "", "next_action_date": two_weeks_ago,
+        },
+        # שרה גולדברג — lead
+        {
+            "contact_id": contact_ids["שרה גולדברג"], "type": "שיחה",
+            "summary": "שרה פנתה דרך האתר. מחפשת פתרון שיווקי דיגיטלי.",
+            "next_action": "לשלוח תיק עבודות", "next_action_date": today_str,
+        },
+        {
+            "contact_id": contact_ids["שרה גולדברג"], "type": "הערה",
+            "summary": "שרה עובדת בחברת שיווק ומחפשת כלי לניהול לידים.",
+            "next_action": "", "next_action_date": None,
+        },
+        # אבי מזרחי — active customer
+        {
+            "contact_id": contact_ids["אבי מזרחי"], "type": "פגישה",
+            "summary": "פגישת סיכום רבעון. הלקוח מרוצה מהשירות.",
+            "next_action": "לשלוח דוח ביצועים רבעוני", "next_action_date": yesterday,
+        },
+        {
+            "contact_id": contact_ids["אבי מזרחי"], "type": "שיחה",
+            "summary": "אבי רוצה להרחיב את החבילה. מעוניין בתוספת אנליטיקה.",
+            "next_action": "להכין הצעה להרחבת שירות", "next_action_date": tomorrow,
+        },
+        # נועה פרידמן — lead
+        {
+            "contact_id": contact_ids["נועה פרידמן"], "type": "מייל",
+            "summary": "נועה שלחה פנייה דרך טופס יצירת קשר.",
+            "next_action": "להתקשר לנועה לשיחת היכרות", "next_action_date": today_str,
+        },
+    ]
+
+
+# ─── Synthetic data ──────────────────────────────────────────────────────────
+
+STATUSES = ["ליד", "לקוח פעיל", "לא פעיל"]
+INTERACTION_TYPES = ["שיחה", "מייל", "פגישה", "הערה"]
+FIRST_NAMES = [c["name"].split()[0] for c in CONTACTS_DATA]
+LAST_NAMES = [c["name"].split()[-1] for c in CONTACTS_DATA]
+COMPANIES = [c["company"] for c in CONTACTS_DATA]
+
+
+def _sample_texts():
+    placeholder_ids = {c["name"]: None for c in CONTACTS_DATA}
+    rows = sample_interactions(placeholder_ids, datetime.date.today())
+    return [r["summary"] for r in rows], [r["next_action"] for r in rows if r["next_action"]]
+
+
+SUMMARIES, NEXT_ACTIONS = _sample_texts()
+
+
+def _timestamp(dt):
+    return dt.isoformat(timespec="microseconds")
+
+
+def generate_contacts(count, seed=0, with_ids=True, now=None):
+    """Yield `count` synthetic contacts, newest last, spread over ~2 years."""
+    rng = random.Random(seed)
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    start = now - datetime.timedelta(days=730)
+    step = datetime.timedelta(days=730) / max(count, 1)
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        contact = {
+            "name": f"{first} {last} {i}",
+            "email": f"user{i}@example.co.il",
+            "phone": f"05{rng.randint(0, 8)}-{rng.randint(1000000, 9999999)}",
+            "company": f"{rng.choice(COMPANIES)} {i % 997}",
+            "status": rng.choices(STATUSES, weights=[5, 3, 2])[0],
+        }
+        if with_ids:
+            contact["id"] = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            contact["created_at"] = _timestamp(start + step * i)
+        yield contact
+
+
+def generate_interactions(contacts, seed=0, per_contact=(0, 4), with_ids=True, today=None):
+    """Yield synthetic interactions for already-identified contacts."""
+    rng = random.Random(seed + 1)
+    today = today or datetime.date.today()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for contact in contacts:
+        created = datetime.datetime.fromisoformat(contact["created_at"])
+        for _ in range(rng.randint(*per_contact)):
+            created += datetime.timedelta(days=rng.randint(1, 30), seconds=rng.randint(0, 86399))
+            created = min(created, now)
+            has_action = rng.random() < 0.6
+            action_date = today + datetime.timedelta(days=rng.randint(-21, 21))
+            interaction = {
+                "contact_id": contact["id"],
+                "type": rng.choice(INTERACTION_TYPES),
+                "summary": rng.choice(SUMMARIES),
+                "next_action": rng.choice(NEXT_ACTIONS) if has_action else "",
+                "next_action_date": action_date.isoformat() if has_action else None,
+            }
+            if with_ids:
+                interaction["id"] = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+                interaction["created_at"] = _timestamp(created)
+            yield interaction
+
+
+def generate_dataset(count, seed=0):
+    """Return (contacts, interactions) lists with ids and timestamps filled in."""
+    contacts = list(generate_contacts(count, seed=seed))
+    interactions = list(generate_interactions(contacts, seed=seed))
+    return contacts, interactions
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ─── Seeding ─────────────────────────────────────────────────────────────────
+
+def clear(supabase):
+    print("Clearing existing data...")
+    supabase.table("interactions").delete().neq("id", "00000000-0000-0000-0000-000000000000").execute()
+    supabase.table("contacts").delete().neq("id", "00000000-0000-0000-0000-000000000000").execute()
+    print("Data cleared.")
+
+
+def seed_sample(supabase):
+    print(f"Inserting {len(CONTACTS_DATA)} contacts...")
+    contacts_result = supabase.table("contacts").insert(CONTACTS_DATA).execute()
+    contacts = contacts_result.data
+    print(f"Inserted {len(contacts)} contacts.")
+
+    # Map contact names to IDs for interaction references
+    contact_ids = {c["name"]: c["id"] for c in contacts}
+    interactions_data = sample_interactions(contact_ids, datetime.date.today())
+
+    print(f"Inserting {len(interactions_data)} interactions...")
+    interactions_result = supabase.table("interactions").insert(interactions_data).execute()
+    print(f"Inserted {len(interactions_result.data)} interactions.")
+
+    print("\nSeed completed successfully!")
+    print(f"  Contacts: {len(contacts)}")
+    print(f"  Interactions: {len(interactions_result.data)}")
+
+
+def seed_synthetic(supabase, count, batch_size=1000, seed=0):
+    total_contacts = total_interactions = 0
+    for batch in _batches(generate_contacts(count, seed=seed, with_ids=False), batch_size):
+        inserted = supabase.table("contacts").insert(batch).execute().data
+        interactions = list(generate_interactions(inserted, seed=seed + total_contacts, with_ids=False))
+        for chunk in _batches(interactions, batch_size):
+            supabase.table("interactions").insert(chunk).execute()
+        total_contacts += len(inserted)
+        total_interactions += len(interactions)
+        print(f"  {total_contacts}/{count} contacts, {total_interactions} interactions")
+    print("\nSynthetic seed completed successfully!")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, metavar="N", help="insert N generated contacts instead of the sample set")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from config import supabase
+
+    clear(supabase)
+    if args.synthetic:
+        seed_synthetic(supabase, args.synthetic, batch_size=args.batch_size, seed=args.seed)
+    else:
+        seed_sample(supabase)
+
 
-print("\nSeed completed successfully!")
-print(f"  Contacts: {len(contacts)}")
-print(f"  Interactions: {len(interactions_result.data)}")
+if __name__ == "__main__":
+    main()
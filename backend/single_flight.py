@@ -0,0 +1,137 @@
+"""
+Request coalescing for hot reads: concurrent identical reads share one call.
+
+    body = read_flights.do(("contacts", search, status, cursor, limit), load)
+
+The first caller for a key (the leader) runs `load`; callers that arrive
+while it runs wait for it and get the same result instead of repeating the
+upstream queries. If `load` raises, the leader gets the exception and each
+waiter a FlightError chained to it. Nothing is kept once the call
+returns, so this is not a cache: a request never sees a result computed
+before it arrived, except one already in flight.
+
+A flight has a deadline `timeout` seconds after it started. Waiters give
+up at the deadline with FlightTimeout, and later arrivals start a new
+flight rather than joining one that is stuck. The deadline does not apply
+to the leader: its own call runs for as long as `load` takes, bounded only
+by the client timeouts underneath. Writes call `forget(route, ...)` so
+reads of those routes that follow them do not join a flight that started
+before.
+
+Results are shared between threads and must not be mutated by callers.
+"""
+import threading
+import time
+
+
+class FlightTimeout(TimeoutError):
+    """The shared call for a key ran past its deadline."""
+
+
+class FlightError(RuntimeError):
+    """The shared call for a key failed; the leader's exception is the cause."""
+
+
+def _route(key):
+    return key[0] if isinstance(key, tuple) else key
+
+
+class _Flight:
+    def __init__(self, started, timeout):
+        self.timeout = timeout
+        self.deadline = started + timeout
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished = False
+
+
+class SingleFlight:
+    def __init__(self, timeout=10.0, enabled=True, clock=time.monotonic, registry=None):
+        self.timeout = timeout
+        self.enabled = enabled
+        self.clock = clock
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = self.coalesced = self.timeouts = self.errors = 0
+        # Prometheus counter by route (the key's first element) and outcome
+        self._counter = registry.counter(
+            "crm_read_flights_total", "Coalesced reads: leader calls, coalesced waiters, timeouts, errors.",
+            ("route", "outcome"),
+        ) if registry is not None else None
+
+    def _count(self, key, outcome):
+        if self._counter is not None:
+            self._counter.inc(str(_route(key)), outcome)
+
+    def do(self, key, call, timeout=None):
+        """Return call(), sharing one run among concurrent callers with the same key."""
+        if not self.enabled:
+            with self._lock:
+                self.leaders += 1
+            self._count(key, "leader")
+            return call()
+
+        now = self.clock()
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None or now >= flight.deadline:
+                flight = self._flights[key] = _Flight(now, self.timeout if timeout is None else timeout)
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        self._count(key, "leader" if leader else "coalesced")
+        if leader:
+            return self._lead(key, flight, call)
+        if not flight.done.wait(max(0.0, flight.deadline - self.clock())):
+            with self._lock:
+                self.timeouts += 1
+            self._count(key, "timeout")
+            raise FlightTimeout(f"shared read did not finish within {flight.timeout:g}s")
+        if flight.error is not None:
+            raise FlightError(f"shared read failed: {flight.error}") from flight.error
+        if not flight.finished:
+            raise FlightError("shared read was interrupted")
+        return flight.result
+
+    def _lead(self, key, flight, call):
+        try:
+            flight.result = call()
+            flight.finished = True
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.errors += 1
+            self._count(key, "error")
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def forget(self, *routes):
+        """Make later callers for `routes` (a key's first element) start new flights.
+
+        Callers already waiting still get their result.
+        """
+        with self._lock:
+            for key in [k for k in self._flights if _route(k) in routes]:
+                del self._flights[key]
+
+    def stats(self):
+        with self._lock:
+            calls = self.leaders + self.coalesced
+            return {
+                "enabled": self.enabled,
+                "in_flight": len(self._flights),
+                "upstream_calls": self.leaders,
+                "coalesced": self.coalesced,
+                "avoided_ratio": round(self.coalesced / calls, 3) if calls else 0.0,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+            }
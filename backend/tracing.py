@@ -0,0 +1,320 @@
+"""
+Request tracing, Prometheus metrics and an opt-in profiler for slow requests.
+
+Every /api/* request gets a RequestTrace, held in a ContextVar so calls run
+by QueryPool threads are attributed to the request that made them. Event
+hooks on the Supabase and OpenAI HTTP clients record one span per upstream
+call, timed from sending the request to receiving the response headers
+(for a streamed completion, that is the time to the first token).
+
+Finished requests feed histograms and counters rendered in the Prometheus
+text format. Requests slower than `slow_ms` are kept, with their spans, for
+/api/metrics/slow. With `profile_rate` > 0 that share of requests is also
+stack-sampled every `profile_interval` seconds by one background thread, so
+a slow request comes with its hottest stacks. Sampling sees the request's
+own thread, not work it hands to QueryPool.
+
+Bookkeeping is a few dictionary updates under a lock per request and per
+upstream call, cheap enough to leave on.
+"""
+import bisect
+import collections
+import contextvars
+import random
+import sys
+import threading
+import time
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+MAX_SPANS = 200
+MAX_STACK_DEPTH = 40
+TOP_STACKS = 15
+
+
+# ─── Metrics ────────────────────────────────────────────────────────────────
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.values = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] += amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self.values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.label_names, labels)} {value:g}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self.series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = (("le", f"{bound:g}"),)
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+            yield f"{self.name}_bucket{_labels(self.label_names, labels, (('le', '+Inf'),))} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]:g}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# ─── Traces ─────────────────────────────────────────────────────────────────
+
+class RequestTrace:
+    def __init__(self, method, route):
+        self.method = method
+        self.route = route
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.spans = []  # (service, operation, offset ms, duration ms, status)
+        self.calls = collections.Counter()
+        self.upstream_seconds = collections.Counter()
+        self.stacks = None  # Counter of folded stacks when profiled
+        self.token = None  # resets the tracer's ContextVar when the request finishes
+        self._lock = threading.Lock()
+
+    def add_span(self, service, operation, started, seconds, status):
+        with self._lock:
+            self.calls[service] += 1
+            self.upstream_seconds[service] += seconds
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append((
+                    service, operation, round((started - self.started) * 1000, 2), round(seconds * 1000, 2), status,
+                ))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Server-Timing header value: total plus time and call count per upstream service."""
+        parts = [f"app;dur={self.elapsed() * 1000:.1f}"]
+        with self._lock:
+            for service, seconds in sorted(self.upstream_seconds.items()):
+                parts.append(f'{service};dur={seconds * 1000:.1f};desc="{self.calls[service]} calls"')
+        return ", ".join(parts)
+
+
+def _fold(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """One daemon thread that samples the stacks of the registered request threads."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.active = {}  # thread id -> RequestTrace
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, trace):
+        trace.stacks = collections.Counter()
+        with self._lock:
+            self.active[threading.get_ident()] = trace
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, trace):
+        with self._lock:
+            for ident, active in list(self.active.items()):
+                if active is trace:
+                    del self.active[ident]
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = dict(self.active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, trace in active.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                try:
+                    stack = _fold(frame)
+                except Exception:
+                    continue  # the thread unwound these frames while they were walked; skip the sample
+                trace.stacks[stack] += 1
+
+
+class Tracer:
+    def __init__(self, registry=None, slow_ms=1000, profile_rate=0.0, profile_interval=0.01, keep=20, logger=None):
+        self.registry = registry or Registry()
+        self.slow_ms = slow_ms
+        self.profile_rate = profile_rate
+        self.profiler = SamplingProfiler(profile_interval)
+        self.slow = collections.deque(maxlen=keep)
+        self.logger = logger
+        self._current = contextvars.ContextVar("request_trace", default=None)
+
+        r = self.registry
+        self.requests = r.counter("crm_http_requests_total", "API requests.", ("method", "route", "status"))
+        self.duration = r.histogram(
+            "crm_http_request_duration_seconds", "API request time, including streamed bodies.", ("method", "route")
+        )
+        self.upstream = r.histogram(
+            "crm_upstream_duration_seconds", "Upstream call time to response headers.", ("service", "operation")
+        )
+        self.upstream_status = r.counter(
+            "crm_upstream_requests_total", "Upstream calls by response status.", ("service", "status")
+        )
+        self.calls_per_request = r.histogram(
+            "crm_upstream_calls_per_request", "Upstream calls made by one API request.",
+            ("route", "service"), buckets=CALL_COUNT_BUCKETS,
+        )
+        self.slow_requests = r.counter("crm_slow_requests_total", "Requests slower than the slow threshold.", ("route",))
+
+    # Requests
+
+    def current(self):
+        return self._current.get()
+
+    def start(self, method, route):
+        trace = RequestTrace(method, route)
+        trace.token = self._current.set(trace)
+        if self.profile_rate and random.random() < self.profile_rate:
+            self.profiler.add(trace)
+        return trace
+
+    def finish(self, trace, status):
+        if self._current.get() is trace:
+            try:
+                self._current.reset(trace.token)
+            except ValueError:  # closed from another context (a streamed body's last chunk)
+                self._current.set(None)
+        if trace.stacks is not None:
+            self.profiler.remove(trace)
+        seconds = trace.elapsed()
+        self.requests.inc(trace.method, trace.route, str(status))
+        self.duration.observe(seconds, trace.method, trace.route)
+        for service in ("supabase", "openai"):
+            self.calls_per_request.observe(trace.calls.get(service, 0), trace.route, service)
+        if self.slow_ms and seconds * 1000 >= self.slow_ms:
+            self.slow_requests.inc(trace.route)
+            report = self._report(trace, status, seconds)
+            self.slow.append(report)
+            if self.logger is not None:
+                self.logger.warning(
+                    "slow request %s %s: %.0f ms, upstream %s", trace.method, trace.route, report["ms"], dict(trace.calls)
+                )
+
+    def _report(self, trace, status, seconds):
+        report = {
+            "method": trace.method,
+            "route": trace.route,
+            "status": status,
+            "started": trace.wall_started,
+            "ms": round(seconds * 1000, 1),
+            "calls": dict(trace.calls),
+            "spans": [
+                {"service": s, "operation": o, "offset_ms": off, "ms": ms, "status": st}
+                for s, o, off, ms, st in trace.spans
+            ],
+        }
+        if trace.stacks is not None:
+            report["samples"] = sum(trace.stacks.values())
+            report["stacks"] = [{"stack": stack, "samples": n} for stack, n in trace.stacks.most_common(TOP_STACKS)]
+        return report
+
+    def slow_reports(self):
+        return list(self.slow)
+
+    # Upstream calls
+
+    def record(self, service, operation, started, seconds, status="ok"):
+        self.upstream.observe(seconds, service, operation)
+        self.upstream_status.inc(service, str(status))
+        trace = self._current.get()
+        if trace is not None:
+            trace.add_span(service, operation, started, seconds, status)
+
+    def httpx_hooks(self, service, operation=None):
+        """Event hooks for an httpx client that record each request as a span.
+
+        `operation(request)` names the call; by default the method and the
+        last path segment (the table, RPC or API resource).
+        """
+        operation = operation or (lambda req: f"{req.method} {req.url.path.rstrip('/').rsplit('/', 1)[-1]}")
+
+        def on_request(request):
+            request.extensions["trace_started"] = time.perf_counter()
+
+        def on_response(response):
+            request = response.request
+            started = request.extensions.get("trace_started")
+            if started is not None:
+                self.record(service, operation(request), started, time.perf_counter() - started, response.status_code)
+
+        return {"request": [on_request], "response": [on_response]}
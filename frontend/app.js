@@ -7,6 +7,18 @@ let currentContactId = null;
 let allContacts = [];
 let currentFilter = '';
 let currentSearch = '';
+let nextContactsCursor = null;
+let contactsLoading = false;
+let contactsRequestId = 0;
+let contactsSentinelVisible = false;
+let contactsSyncToken = null;
+let agendaBucket = '';
+let agendaCursor = null;
+let agendaRequestId = 0;
+
+const CONTACTS_PAGE_SIZE = 50;
+const contactsObserved = 'IntersectionObserver' in window;
+const AGENDA_PAGE_SIZE = 20;
 
 // ─── DOM References ─────────────────────────────────────────────────────────
 const dashboardView = document.getElementById('dashboard-view');
@@ -16,11 +28,16 @@ const tableEmpty = document.getElementById('table-empty');
 const tableLoading = document.getElementById('table-loading');
 const searchInput = document.getElementById('search-input');
 const fab = document.getElementById('fab');
+const contactsSentinel = document.getElementById('contacts-sentinel');
+const contactsMore = document.getElementById('contacts-more');
+const agendaList = document.getElementById('agenda-list');
+const agendaEmpty = document.getElementById('agenda-empty');
+const agendaMore = document.getElementById('agenda-more');
 
 // ─── API Functions ──────────────────────────────────────────────────────────
 
-async function apiGet(path) {
-    const res = await fetch(`${API_BASE_URL}${path}`);
+async function apiGet(path, options = {}) {
+    const res = await fetch(`${API_BASE_URL}${path}`, options);
     if (!res.ok) {
         const err = await res.json().catch(() => ({ error: 'Network error' }));
         throw new Error(err.error || `HTTP ${res.status}`);
@@ -120,7 +137,7 @@ function showDashboard() {
     contactView.style.display = 'none';
     fab.title = 'הוסף איש קשר חדש';
     loadDashboard();
-    loadContacts();
+    refreshContacts();
 }
 
 function showContactDetail(id) {
@@ -143,52 +160,170 @@ async function loadDashboard() {
     } catch (err) {
         showToast('שגיאה בטעינת לוח הבקרה', 'error');
     }
+    loadAgenda();
+}
+
+// ─── Follow-up Agenda ───────────────────────────────────────────────────────
+
+function agendaPath(cursor) {
+    const params = new URLSearchParams({ limit: AGENDA_PAGE_SIZE });
+    if (agendaBucket) params.set('bucket', agendaBucket);
+    if (cursor) params.set('cursor', cursor);
+    return `/api/follow-ups?${params}`;
+}
+
+async function loadAgenda(more = false) {
+    // The server keeps one open action per contact, already sorted by urgency
+    const requestId = more ? agendaRequestId : ++agendaRequestId;
+    try {
+        const data = await apiGet(agendaPath(more ? agendaCursor : null));
+        if (requestId !== agendaRequestId) return;
+        if (data.counts) {
+            document.querySelectorAll('.agenda-count').forEach(el => {
+                el.textContent = data.counts[el.dataset.bucket] || '';
+            });
+        }
+        const items = data.follow_ups.map(f => `
+            <li class="agenda-item agenda-${f.bucket}" onclick="showContactDetail('${f.contact_id}')">
+                <span class="agenda-date">${formatDate(f.next_action_date)}</span>
+                <strong>${escapeHtml(f.contact_name)}</strong>
+                <span>${f.next_action ? escapeHtml(f.next_action) : truncate(f.summary, 60)}</span>
+            </li>
+        `).join('');
+        if (more) {
+            agendaList.insertAdjacentHTML('beforeend', items);
+        } else {
+            agendaList.innerHTML = items;
+        }
+        agendaCursor = data.next_cursor;
+        agendaMore.style.display = agendaCursor ? 'inline-block' : 'none';
+        agendaEmpty.style.display = agendaList.children.length ? 'none' : 'block';
+    } catch (err) {
+        showToast('שגיאה בטעינת סדר היום', 'error');
+    }
 }
 
 // ─── Contacts List ──────────────────────────────────────────────────────────
 
+function contactsPath(cursor) {
+    const params = new URLSearchParams({ limit: CONTACTS_PAGE_SIZE });
+    if (currentSearch) params.set('search', currentSearch);
+    if (currentFilter) params.set('status', currentFilter);
+    if (cursor) params.set('cursor', cursor);
+    return `/api/contacts?${params}`;
+}
+
 async function loadContacts() {
+    // Start over from the first page (filters or data changed)
+    const requestId = ++contactsRequestId;
+    allContacts = [];
+    nextContactsCursor = null;
+    contactsLoading = true;
     try {
         tableLoading.style.display = 'flex';
         tableEmpty.style.display = 'none';
         contactsTbody.innerHTML = '';
+        contactsMore.style.display = 'none';
 
-        const data = await apiGet('/api/contacts');
+        // Take a sync token before the list so later syncs cover anything written meanwhile
+        if (!contactsSyncToken) {
+            contactsSyncToken = await apiGet('/api/contacts/changes').then(d => d.next, () => null);
+        }
+        const data = await apiGet(contactsPath(null));
+        if (requestId !== contactsRequestId) return;
         allContacts = data.contacts;
+        nextContactsCursor = data.next_cursor;
         renderContacts();
     } catch (err) {
         showToast('שגיאה בטעינת אנשי קשר', 'error');
     } finally {
-        tableLoading.style.display = 'none';
+        if (requestId === contactsRequestId) {
+            contactsLoading = false;
+            tableLoading.style.display = 'none';
+            fillContactsViewport();
+        }
     }
 }
 
-function renderContacts() {
-    let filtered = allContacts;
-
-    // Filter by status
-    if (currentFilter) {
-        filtered = filtered.filter(c => c.status === currentFilter);
+async function loadMoreContacts() {
+    if (!nextContactsCursor || contactsLoading) return;
+    const requestId = contactsRequestId;
+    contactsLoading = true;
+    try {
+        const data = await apiGet(contactsPath(nextContactsCursor));
+        if (requestId !== contactsRequestId) return;
+        allContacts = allContacts.concat(data.contacts);
+        nextContactsCursor = data.next_cursor;
+        renderContacts();
+    } catch (err) {
+        showToast('שגיאה בטעינת אנשי קשר', 'error');
+    } finally {
+        if (requestId === contactsRequestId) {
+            contactsLoading = false;
+            fillContactsViewport();
+        }
     }
+}
 
-    // Filter by search
-    if (currentSearch) {
-        const q = currentSearch.toLowerCase();
-        filtered = filtered.filter(c =>
-            (c.name || '').toLowerCase().includes(q) ||
-            (c.company || '').toLowerCase().includes(q)
-        );
+async function refreshContacts() {
+    // Merge what changed since the last sync instead of reloading every page.
+    // Search results are ranked server-side, so a search still reloads.
+    if (!contactsSyncToken || currentSearch || contactsLoading) return loadContacts();
+    const requestId = contactsRequestId;
+    try {
+        let data;
+        do {
+            data = await apiGet(`/api/contacts/changes?since=${encodeURIComponent(contactsSyncToken)}`);
+            if (requestId !== contactsRequestId) return;
+            if (data.reset) {
+                contactsSyncToken = data.next;
+                return loadContacts();
+            }
+            mergeContacts(data.contacts, data.deleted);
+            contactsSyncToken = data.next;
+        } while (data.more);
+        renderContacts();
+    } catch (err) {
+        loadContacts();
     }
+}
 
-    // Sort by next_action_date ASC, nulls last
-    filtered.sort((a, b) => {
-        const dateA = a.next_action_date;
-        const dateB = b.next_action_date;
-        if (!dateA && !dateB) return 0;
-        if (!dateA) return 1;
-        if (!dateB) return -1;
-        return new Date(dateA) - new Date(dateB);
-    });
+function newerThan(a, b) {
+    // List order: created_at DESC, id DESC
+    if (a.created_at !== b.created_at) return a.created_at > b.created_at;
+    return a.id > b.id;
+}
+
+function mergeContacts(changed, deleted) {
+    const removed = new Set(deleted);
+    const byId = new Map(changed.map(c => [c.id, c]));
+    const matches = c => !currentFilter || c.status === currentFilter;
+    // Contacts past the last loaded row arrive with later pages
+    const last = allContacts[allContacts.length - 1];
+    const inLoadedRange = c => !nextContactsCursor || !last || newerThan(c, last);
+
+    const kept = allContacts
+        .filter(c => !removed.has(c.id))
+        .map(c => byId.get(c.id) || c)
+        .filter(matches);
+    const known = new Set(allContacts.map(c => c.id));
+    const added = changed.filter(c => !known.has(c.id) && matches(c) && inLoadedRange(c));
+    allContacts = added.length
+        ? kept.concat(added).sort((a, b) => (newerThan(a, b) ? -1 : 1))
+        : kept;
+}
+
+function fillContactsViewport() {
+    // The observer only fires on changes, so keep paging while the end is still visible
+    if (contactsSentinelVisible && nextContactsCursor) loadMoreContacts();
+}
+
+function renderContacts() {
+    // Status and search filters are applied server-side. Keep the server's
+    // created_at DESC order: re-sorting only the loaded pages would move rows
+    // around as later pages arrive.
+    const filtered = allContacts;
+    contactsMore.style.display = nextContactsCursor && !contactsObserved ? 'inline-block' : 'none';
 
     if (filtered.length === 0) {
         contactsTbody.innerHTML = '';
@@ -228,7 +363,8 @@ function escapeHtml(text) {
 
 async function loadContactDetail(id) {
     try {
-        const data = await apiGet(`/api/contacts/${id}`);
+        // Revalidate with the stored ETag; an unchanged contact comes back as a bodiless 304
+        const data = await apiGet(`/api/contacts/${id}`, { cache: 'no-cache' });
         const contact = data.contact;
         const interactions = data.interactions;
 
@@ -389,17 +525,38 @@ document.addEventListener('DOMContentLoaded', () => {
         clearTimeout(searchTimer);
         searchTimer = setTimeout(() => {
             currentSearch = searchInput.value.trim();
-            renderContacts();
+            loadContacts();
         }, 300);
     });
 
+    // Fetch the next page when the end of the table scrolls into view;
+    // without IntersectionObserver the "load more" button pages instead
+    if (contactsObserved) {
+        new IntersectionObserver(entries => {
+            contactsSentinelVisible = entries.some(e => e.isIntersecting);
+            if (contactsSentinelVisible) loadMoreContacts();
+        }, { rootMargin: '200px' }).observe(contactsSentinel);
+    }
+    contactsMore.addEventListener('click', () => loadMoreContacts());
+
+    // Agenda buckets
+    document.querySelectorAll('.agenda-pill').forEach(pill => {
+        pill.addEventListener('click', () => {
+            document.querySelectorAll('.agenda-pill').forEach(p => p.classList.remove('active'));
+            pill.classList.add('active');
+            agendaBucket = pill.dataset.bucket;
+            loadAgenda();
+        });
+    });
+    agendaMore.addEventListener('click', () => loadAgenda(true));
+
     // Filter pills
-    document.querySelectorAll('.filter-pill').forEach(pill => {
+    document.querySelectorAll('.search-filter-bar .filter-pill').forEach(pill => {
         pill.addEventListener('click', () => {
-            document.querySelectorAll('.filter-pill').forEach(p => p.classList.remove('active'));
+            document.querySelectorAll('.search-filter-bar .filter-pill').forEach(p => p.classList.remove('active'));
             pill.classList.add('active');
             currentFilter = pill.dataset.status;
-            renderContacts();
+            loadContacts();
         });
     });
 
@@ -429,7 +586,7 @@ document.addEventListener('DOMContentLoaded', () => {
             e.target.reset();
             closeModal('add-contact-modal');
             loadDashboard();
-            loadContacts();
+            refreshContacts();
         } catch (err) {
             showToast('שגיאה ביצירת איש קשר: ' + err.message, 'error');
         }
@@ -0,0 +1,145 @@
+"""
+Load benchmark: the old single-threaded static server vs. server.py.
+
+Run:  cd frontend && python bench_server.py --clients 16 --duration 5
+
+Each client loads the page the way a browser does (index.html plus the
+versioned CSS/JS and runtime-config.js) with `Accept-Encoding: gzip, br`;
+every other visit revalidates with the validators from the previous one.
+--slow-clients opens connections that send half a request and stall, to
+show one slow client blocking the old server.
+
+  legacy    socketserver.TCPServer + SimpleHTTPRequestHandler (the old server.py)
+  threaded  server.py: threads, in-memory assets, compression, 304s
+"""
+import argparse
+import functools
+import http.client
+import os
+import shutil
+import socket
+import socketserver
+import statistics
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler
+
+from server import make_server
+
+PAGE = ["/", "/style.css?v=2", "/runtime-config.js", "/app.js?v=4", "/chat.js?v=4"]
+RUNTIME_CONFIG = "window.API_BASE_URL = 'http://localhost:5001';\n"
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class QuietTCPServer(socketserver.TCPServer):
+    def handle_error(self, request, client_address):
+        pass  # clients timing out behind a stalled one
+
+
+def start_legacy(root):
+    handler = functools.partial(QuietHandler, directory=root)
+    server = QuietTCPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_threaded(root):
+    server = make_server(root, 0, runtime_config=RUNTIME_CONFIG, host="127.0.0.1")
+    server.RequestHandlerClass.quiet = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stall(port, stop):
+    """Send half a request line and hold the connection open."""
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(b"GET /index.html HTTP/1.1\r\nHost: x\r\n")
+        stop.wait()
+
+
+def client(port, deadline, timeout, out):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    validators = {}
+    visit = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            for path in PAGE:
+                headers = {"Accept-Encoding": "gzip, br"}
+                if visit % 2 and path in validators:
+                    headers.update(validators[path])
+                conn.request("GET", path, headers=headers)
+                res = conn.getresponse()
+                body = res.read()
+                out["bytes"] += len(body)
+                out["not_modified"] += res.status == 304
+                etag, modified = res.getheader("ETag"), res.getheader("Last-Modified")
+                validators[path] = {k: v for k, v in (("If-None-Match", etag), ("If-Modified-Since", modified)) if v}
+        except (OSError, http.client.HTTPException):
+            out["errors"] += 1
+            conn.close()
+            continue
+        out["pages"].append((time.perf_counter() - started) * 1000)
+        visit += 1
+    conn.close()
+
+
+def run(name, server, args):
+    port = server.server_address[1]
+    stop = threading.Event()
+    stallers = [threading.Thread(target=stall, args=(port, stop), daemon=True) for _ in range(args.slow_clients)]
+    for t in stallers:
+        t.start()
+    time.sleep(0.1)
+
+    results = [{"pages": [], "bytes": 0, "not_modified": 0, "errors": 0} for _ in range(args.clients)]
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=client, args=(port, deadline, args.timeout, r)) for r in results]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stop.set()
+    if name == "threaded":
+        server.shutdown()
+
+    pages = sorted(ms for r in results for ms in r["pages"])
+    requests = len(pages) * len(PAGE)
+    p95 = pages[int(len(pages) * 0.95)] if pages else float("nan")
+    print(
+        f"{name:<9} {len(pages) / args.duration:8.0f} pages/s {requests / args.duration:8.0f} req/s"
+        f"  p50 {statistics.median(pages) if pages else float('nan'):6.1f} ms  p95 {p95:6.1f} ms"
+        f"  {sum(r['bytes'] for r in results) / max(len(pages), 1) / 1024:6.1f} KiB/page"
+        f"  304s {sum(r['not_modified'] for r in results):6d}  errors {sum(r['errors'] for r in results)}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per server")
+    parser.add_argument("--slow-clients", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=2.0, help="client socket timeout")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp()
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in ("index.html", "style.css", "app.js", "chat.js"):
+            shutil.copy(os.path.join(here, name), root)
+        with open(os.path.join(root, "runtime-config.js"), "w") as f:
+            f.write(RUNTIME_CONFIG)
+        # The legacy server cannot be shut down while a stalled client holds it
+        run("legacy", start_legacy(root), args)
+        run("threaded", start_threaded(root), args)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
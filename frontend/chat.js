@@ -122,45 +122,93 @@
         const typingBubble = appendBubble('...חושב', 'assistant typing');
 
         try {
-            const res = await fetch(`${API_BASE_URL}/api/chat`, {
+            const res = await fetch(`${API_BASE_URL}/api/chat/stream`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
                 body: JSON.stringify({ message: text, api_key: savedApiKey }),
             });
 
-            const data = await res.json();
-            typingBubble.remove();
-
-            if (!res.ok || data.error) {
+            if (!res.ok || !res.body) {
+                const data = await res.json().catch(() => ({}));
+                typingBubble.remove();
                 appendBubble('שגיאה: ' + (data.error || `HTTP ${res.status}`), 'assistant error');
-            } else {
-                const reply = data.reply;
-                const processedHtml = makeContactNamesClickable(reply);
-                appendBubbleHtml(processedHtml, 'assistant');
-                chatHistory.push({ role: 'assistant', content: reply });
+                return;
             }
+
+            let replyBubble = null;
+            let reply = '';
+            let mentions = [];
+            await readEventStream(res.body, (event, data) => {
+                if (event === 'plan') {
+                    typingBubble.textContent = data.table ? '...מחפש נתונים' : '...חושב';
+                } else if (event === 'rows') {
+                    typingBubble.textContent = `...נמצאו ${data.count} תוצאות, מסכם`;
+                } else if (event === 'token') {
+                    if (!replyBubble) {
+                        typingBubble.remove();
+                        replyBubble = appendBubble('', 'assistant');
+                    }
+                    reply += data.text;
+                    replyBubble.textContent = reply;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                } else if (event === 'done') {
+                    mentions = data.contacts || [];
+                } else if (event === 'error') {
+                    throw new Error(data.error);
+                }
+            });
+
+            typingBubble.remove();
+            if (!replyBubble) replyBubble = appendBubble('', 'assistant');
+            // Link the contacts the server found in the full reply
+            replyBubble.innerHTML = makeContactNamesClickable(reply, mentions);
+            chatHistory.push({ role: 'assistant', content: reply });
         } catch (err) {
             typingBubble.remove();
-            appendBubble('שגיאה בתקשורת עם השרת. נסה שוב.', 'assistant error');
+            const message = err && err.message ? 'שגיאה: ' + err.message : 'שגיאה בתקשורת עם השרת. נסה שוב.';
+            appendBubble(message, 'assistant error');
         }
     }
 
-    // ─── Helpers ─────────────────────────────────────────────────────────────
-
-    function makeContactNamesClickable(text) {
-        if (typeof allContacts === 'undefined' || !allContacts.length) {
-            return escapeHtmlChat(text);
+    // Parse a Server-Sent Events body from fetch(), calling onEvent(name, data)
+    async function readEventStream(body, onEvent) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                for (const line of block.split('\n')) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                onEvent(event, data ? JSON.parse(data) : {});
+            }
         }
+    }
+
+    // ─── Helpers ─────────────────────────────────────────────────────────────
 
+    // mentions: [{id, name, text}] from the server's search index; `text` is the exact span in the reply
+    function makeContactNamesClickable(text, mentions) {
         let html = escapeHtmlChat(text);
-        for (const contact of allContacts) {
-            if (contact.name && text.includes(contact.name)) {
-                const escapedName = escapeHtmlChat(contact.name);
-                const link = `<a href="#" class="chat-contact-link" data-contact-id="${contact.id}" style="color:#e86c2a;font-weight:600;text-decoration:underline;cursor:pointer;">${escapedName}</a>`;
-                html = html.replace(new RegExp(escapeRegExp(escapedName), 'g'), link);
-            }
+        const ordered = (mentions || []).slice().sort((a, b) => b.text.length - a.text.length);
+        const links = [];
+        for (const mention of ordered) {
+            const escapedText = escapeHtmlChat(mention.text);
+            const link = `<a href="#" class="chat-contact-link" data-contact-id="${escapeHtmlChat(mention.id)}" style="color:#e86c2a;font-weight:600;text-decoration:underline;cursor:pointer;">${escapedText}</a>`;
+            // Placeholders keep a shorter name from matching inside a longer name's link
+            html = html.split(escapedText).join(`\u0000${links.length}\u0000`);
+            links.push(link);
         }
-        return html;
+        return html.replace(/\u0000(\d+)\u0000/g, (_, i) => links[Number(i)]);
     }
 
     function escapeHtmlChat(text) {
@@ -170,10 +218,6 @@
         return div.innerHTML;
     }
 
-    function escapeRegExp(string) {
-        return string.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
-    }
-
     // Handle clicking contact names in chat
     chatMessages.addEventListener('click', (e) => {
         const link = e.target.closest('.chat-contact-link');
@@ -1,3 +1,3 @@
 #!/bin/sh
-echo "window.API_BASE_URL = '${API_URL:-http://localhost:5001}';" > /app/runtime-config.js
-python -m http.server 8080
+# server.py writes runtime-config.js (API_URL) into its in-memory asset cache
+cd /app && exec python server.py
@@ -1,16 +1,214 @@
+"""
+Static file server for the SPA.
+
+Run:  cd frontend && python server.py        (PORT, API_URL from the environment)
+
+Only the SPA's own files (STATIC_ASSETS) are served. Each is read into
+memory at startup, together with gzip and (when the `brotli` package is
+installed) brotli variants, so requests never touch the disk. The variant
+is picked from Accept-Encoding. Responses carry an ETag and Last-Modified
+and answer conditional requests with 304. index.html is served with its
+script and stylesheet references versioned by content hash
+(`app.js?v=<hash>`); a request whose `v` matches the asset's hash is
+cacheable for a year, everything else must be revalidated. Restart the
+server to pick up edits.
+"""
+import email.utils
+import gzip
+import hashlib
+import mimetypes
 import os
-import http.server
-import socketserver
+import re
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+STATIC_ASSETS = ("index.html", "style.css", "app.js", "chat.js")
+# Local asset references in index.html, with any hand-written version query
+ASSET_REF = re.compile(r'(?P<attr>src|href)="(?P<name>[\w.-]+)(?:\?v=[^"]*)?"')
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_SIZE = 256
+VERSIONED_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+
+class Asset:
+    def __init__(self, body, content_type, mtime):
+        self.content_type = content_type
+        self.last_modified = email.utils.formatdate(mtime, usegmt=True)
+        self.mtime = int(mtime)
+        self.digest = digest = hashlib.sha256(body).hexdigest()[:20]
+        # encoding -> (body, etag); each encoding is its own representation
+        self.variants = {"identity": (body, f'"{digest}"')}
+        if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE):
+            candidates = {"gzip": gzip.compress(body, 9, mtime=0)}
+            if brotli is not None:
+                candidates["br"] = brotli.compress(body, quality=11)
+            for encoding, data in candidates.items():
+                if len(data) < len(body):
+                    self.variants[encoding] = (data, f'"{digest}-{encoding}"')
+
+
+def load_assets(root, runtime_config=None, names=STATIC_ASSETS):
+    """Map URL paths to Assets for the files `names` under `root` (missing ones are skipped)."""
+    assets, pages = {}, {}
+    for name in names:
+        path = os.path.join(root, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            body = f.read()
+        if name.endswith(".html"):
+            pages[name] = (body, os.path.getmtime(path))  # versioned below, once every hash is known
+            continue
+        assets[f"/{name}"] = Asset(body, content_type(name), os.path.getmtime(path))
+    if runtime_config is not None:
+        assets["/runtime-config.js"] = Asset(runtime_config.encode(), content_type("runtime-config.js"), time.time())
+    for name, (body, mtime) in pages.items():
+        assets[f"/{name}"] = Asset(versioned_html(body.decode(), assets).encode(), content_type(name), mtime)
+    if "/index.html" in assets:
+        assets["/"] = assets["/index.html"]
+    return assets
+
+
+def content_type(name):
+    kind = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if kind.startswith("text/") or kind == "application/javascript":
+        kind += "; charset=utf-8"
+    return kind
+
+
+def versioned_html(html, assets):
+    """Point `src`/`href` references to served assets at `name?v=<content hash>`."""
+    def version(match):
+        asset = assets.get(f"/{match['name']}")
+        if asset is None:
+            return match.group()
+        return f'{match["attr"]}="{match["name"]}?v={asset.digest}"'
+    return ASSET_REF.sub(version, html)
+
+
+def accepted_encodings(header):
+    """Encodings the client accepts (q > 0) from an Accept-Encoding header."""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
 
-# Generate runtime-config.js with API_URL from environment
-api_url = os.environ.get("API_URL", "http://localhost:5001")
-with open("runtime-config.js", "w") as f:
-    f.write(f"window.API_BASE_URL = '{api_url}';\n")
 
-port = int(os.environ.get("PORT", 8080))
+def choose_variant(asset, accept_encoding):
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in ("br", "gzip"):
+        if encoding in asset.variants and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
 
-handler = http.server.SimpleHTTPRequestHandler
-with socketserver.TCPServer(("0.0.0.0", port), handler) as httpd:
-    print(f"Serving frontend on 0.0.0.0:{port}")
+
+class StaticHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: browsers fetch several assets per page
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    server_version = "CRMStatic/1.0"
+    assets = {}
+    quiet = False
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        url = urlsplit(self.path)
+        asset = self.assets.get(url.path)
+        if asset is None:
+            body = b"Not found\n"
+            self.send_response(HTTPStatus.NOT_FOUND)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+            return
+
+        encoding = choose_variant(asset, self.headers.get("Accept-Encoding"))
+        body, etag = asset.variants[encoding]
+        # Only a version that names this content may be cached for good
+        versioned = parse_qs(url.query).get("v", [None])[-1] == asset.digest
+        status = HTTPStatus.NOT_MODIFIED if self.not_modified(asset, etag) else HTTPStatus.OK
+
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", asset.last_modified)
+        self.send_header("Cache-Control", VERSIONED_CACHE if versioned else REVALIDATE_CACHE)
+        if len(asset.variants) > 1:
+            self.send_header("Vary", "Accept-Encoding")
+        if status == HTTPStatus.NOT_MODIFIED:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", asset.content_type)
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True  # client went away mid-response
+
+    def not_modified(self, asset, etag):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            # Weak comparison, as RFC 9110 requires for If-None-Match
+            tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return asset.mtime <= since
+        return False
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(root, port, runtime_config=None, host="0.0.0.0"):
+    """A threaded server for `root` with every asset already in memory."""
+    handler = type("Handler", (StaticHandler,), {"assets": load_assets(root, runtime_config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    api_url = os.environ.get("API_URL", "http://localhost:5001")
+    port = int(os.environ.get("PORT", 8080))
+    root = os.path.dirname(os.path.abspath(__file__))
+    server = make_server(root, port, runtime_config=f"window.API_BASE_URL = '{api_url}';\n")
+    print(f"Serving frontend on 0.0.0.0:{port} ({len(server.RequestHandlerClass.assets)} assets cached)")
     print(f"API_URL configured as: {api_url}")
-    httpd.serve_forever()
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
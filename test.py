@@ -0,0 +1,1435 @@
+"""
+Backend API and frontend server tests. Run from the repo root:  python -m pytest test.py
+"""
+import csv
+import datetime
+import decimal
+import gzip
+import http.client
+import importlib.util
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import httpx
+from supabase import ClientOptions, create_client
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import app as crm_app  # noqa: E402
+import bench  # noqa: E402
+import bench_serving  # noqa: E402
+from bulk_import import ImportReport, import_rows, iter_json_array  # noqa: E402
+from cache import TTLCache, VersionStore  # noqa: E402
+from chat_aggregates import validate_plan  # noqa: E402
+from chat_compaction import compact_rows, selected_columns  # noqa: E402
+from config import LazyClient  # noqa: E402
+from delta_sync import advance, changed_ids, decode_token, encode_token  # noqa: E402
+from export import iter_pages, ndjson_chunks  # noqa: E402
+from fake_supabase import FakeSupabase, LatencyModel  # noqa: E402
+from json_provider import FastJSONProvider  # noqa: E402
+from openai_pool import ClientPool  # noqa: E402
+from plan_cache import PlanCache  # noqa: E402
+from query_pool import QueryPool  # noqa: E402
+from search_index import ChangeLog, SearchIndex, normalize  # noqa: E402
+from single_flight import FlightError, FlightTimeout, SingleFlight  # noqa: E402
+from tracing import Registry, Tracer  # noqa: E402
+
+# frontend/server.py, loaded by path so it cannot shadow a backend module
+_spec = importlib.util.spec_from_file_location(
+    "static_server", os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "server.py")
+)
+static_server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(static_server)
+
+
+# ─── Fixtures ───────────────────────────────────────────────────────────────
+
+def use_db(db):
+    """Point the app at `db`, drop per-worker caches and return a test client."""
+    crm_app.supabase = db
+    crm_app.dashboard_stats.invalidate()
+    crm_app.contact_cache.clear()
+    crm_app.plan_cache = PlanCache(path=None)
+    crm_app.openai_pool.clear()
+    crm_app.search_index = SearchIndex()
+    crm_app.search_index.rebuild(db)
+    db.reset_counters()
+    return crm_app.app.test_client()
+
+
+def stub_openai(test, client_class=bench.StubOpenAI):
+    """Build chat clients from `client_class` instead of openai.OpenAI until `test` ends."""
+    patcher = mock.patch("openai.OpenAI", client_class)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+def make_db(n_contacts, interactions_per_contact=2):
+    db = FakeSupabase()
+    for i in range(n_contacts):
+        contact_id = f"c{i}"
+        db.load("contacts", [{
+            "id": contact_id, "name": f"איש קשר {i}", "email": "", "phone": "",
+            "company": "", "status": "ליד", "created_at": f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}",
+        }])
+        db.load("interactions", [{
+            "id": f"i{i}-{j}", "contact_id": contact_id, "type": "שיחה",
+            "summary": f"summary {i}-{j}", "next_action": f"action {i}-{j}",
+            "next_action_date": f"2024-02-{j + 1:02d}", "created_at": f"2024-01-{j + 1:02d}T00:00:00",
+        } for j in range(interactions_per_contact)])
+    return db
+
+
+# ─── Contacts ───────────────────────────────────────────────────────────────
+
+class GetContactsTest(unittest.TestCase):
+    def fetch(self, db):
+        client = use_db(db)
+        res = client.get("/api/contacts")
+        self.assertEqual(res.status_code, 200)
+        return res.get_json()["contacts"]
+
+    def test_upstream_calls_do_not_grow_with_contacts(self):
+        small, large = make_db(5), make_db(200)
+        self.fetch(small)
+        self.fetch(large)
+        self.assertEqual(small.calls, large.calls)
+        self.assertLessEqual(large.calls, 2)
+
+    def test_latest_interaction_fields(self):
+        db = make_db(3)
+        db.load("contacts", [{
+            "id": "lonely", "name": "ללא אינטראקציות", "email": "", "phone": "",
+            "company": "", "status": "ליד", "created_at": "2023-01-01T00:00:00",
+        }])
+        contacts = {c["id"]: c for c in self.fetch(db)}
+
+        latest = contacts["c1"]
+        self.assertNotIn("interactions", latest)
+        self.assertEqual(latest["latest_interaction_summary"], "summary 1-1")
+        self.assertEqual(latest["latest_interaction_type"], "שיחה")
+        self.assertEqual(latest["latest_interaction_date"], "2024-01-02T00:00:00")
+        self.assertEqual(latest["next_action"], "action 1-1")
+        self.assertEqual(latest["next_action_date"], "2024-02-02")
+
+        empty = contacts["lonely"]
+        for key in ("latest_interaction_summary", "latest_interaction_type",
+                    "latest_interaction_date", "next_action", "next_action_date"):
+            self.assertIsNone(empty[key])
+
+
+class ContactsPaginationTest(unittest.TestCase):
+    def setUp(self):
+        self.db = make_db(25, interactions_per_contact=1)
+        # Several contacts share a timestamp so the id tiebreak matters
+        for contact in self.db.tables["contacts"][:6]:
+            contact["created_at"] = "2024-01-01T00:00:00"
+        self.db.tables["contacts"][3]["status"] = "לקוח פעיל"
+        self.db.tables["contacts"][4]["name"] = "רונית כהן"
+        self.client = use_db(self.db)
+
+    def walk(self, **params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, limit=4)
+            if cursor:
+                query["cursor"] = cursor
+            res = self.client.get("/api/contacts", query_string=query)
+            self.assertEqual(res.status_code, 200)
+            body = res.get_json()
+            self.assertLessEqual(len(body["contacts"]), 4)
+            ids.extend(c["id"] for c in body["contacts"])
+            cursor = body["next_cursor"]
+            if not cursor:
+                return ids
+
+    def test_pages_cover_every_contact_once_in_order(self):
+        ids = self.walk()
+        expected = sorted(self.db.tables["contacts"], key=lambda c: (c["created_at"], c["id"]), reverse=True)
+        self.assertEqual(ids, [c["id"] for c in expected])
+
+    def test_filters_combine_with_cursor(self):
+        self.assertEqual(self.walk(status="לקוח פעיל"), ["c3"])
+        self.assertEqual(self.walk(search="רונית"), ["c4"])
+
+    def test_limit_is_clamped(self):
+        res = self.client.get("/api/contacts", query_string={"limit": 10000})
+        self.assertEqual(len(res.get_json()["contacts"]), 25)
+
+    def test_invalid_cursor(self):
+        res = self.client.get("/api/contacts", query_string={"cursor": "not-a-cursor"})
+        self.assertEqual(res.status_code, 400)
+
+
+class ContactWritesTest(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeSupabase()
+        self.client = use_db(self.db)
+
+    def test_create_read_delete_round_trip(self):
+        res = self.client.post("/api/contacts", json={"name": "דנה לוי", "company": "אלפא"})
+        self.assertEqual(res.status_code, 201)
+        contact = res.get_json()["contact"]
+        self.assertEqual(contact["status"], "ליד")
+
+        res = self.client.post("/api/interactions", json={
+            "contact_id": contact["id"], "type": "שיחה", "summary": "שיחת היכרות",
+        })
+        self.assertEqual(res.status_code, 201)
+
+        detail = self.client.get(f"/api/contacts/{contact['id']}").get_json()
+        self.assertEqual(detail["contact"]["name"], "דנה לוי")
+        self.assertEqual(len(detail["interactions"]), 1)
+
+        self.client.delete(f"/api/contacts/{contact['id']}")
+        self.assertEqual(self.client.get(f"/api/contacts/{contact['id']}").status_code, 404)
+        self.assertEqual(self.db.tables["interactions"], [])
+
+
+class ContactSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.db = make_db(50)
+        self.client = use_db(self.db)
+        self.token = self.client.get("/api/contacts/changes").get_json()["next"]
+
+    def sync(self):
+        res = self.client.get("/api/contacts/changes", query_string={"since": self.token})
+        self.assertEqual(res.status_code, 200)
+        body = res.get_json()
+        self.token = body["next"]
+        return body
+
+    def test_only_changed_contacts_and_tombstones(self):
+        created = self.client.post("/api/contacts", json={"name": "חדש"}).get_json()["contact"]
+        self.client.put("/api/contacts/c1", json={"status": "לקוח פעיל"})
+        self.client.post("/api/interactions", json={"contact_id": "c2", "type": "מייל", "summary": "הצעת מחיר"})
+        self.client.delete("/api/contacts/c3")
+        self.db.reset_counters()
+
+        body = self.sync()
+        contacts = {c["id"]: c for c in body["contacts"]}
+        self.assertEqual(set(contacts), {created["id"], "c1", "c2"})
+        self.assertEqual(contacts["c1"]["status"], "לקוח פעיל")
+        self.assertEqual(contacts["c2"]["latest_interaction_summary"], "הצעת מחיר")
+        self.assertEqual(body["deleted"], ["c3"])
+        self.assertFalse(body["more"])
+        # One read of the change log and one of the changed contacts, whatever the table size
+        self.assertEqual(self.db.calls, 2)
+
+        self.assertEqual(self.sync()["contacts"], [])
+        self.client.delete("/api/interactions/i4-1")
+        self.assertEqual(self.sync()["contacts"][0]["latest_interaction_summary"], "summary 4-0")
+
+    def test_pages_and_bad_or_stale_tokens(self):
+        for i in range(5):
+            self.client.put(f"/api/contacts/c{i}", json={"company": "בע״מ"})
+            self.client.put(f"/api/contacts/c{i}", json={"company": "בע\"מ"})
+        original = crm_app.SYNC_PAGE_SIZE
+        crm_app.SYNC_PAGE_SIZE = 2
+        try:
+            pages = [self.sync()]
+            while pages[-1]["more"]:
+                pages.append(self.sync())
+        finally:
+            crm_app.SYNC_PAGE_SIZE = original
+        self.assertEqual([sorted(c["id"] for c in p["contacts"]) for p in pages], [["c0", "c1"], ["c2", "c3"], ["c4"]])
+
+        res = self.client.get("/api/contacts/changes", query_string={"since": "nope"})
+        self.assertEqual(res.status_code, 400)
+        stale = encode_token(0, issued=time.time() - crm_app.SYNC_MAX_AGE - 1)
+        body = self.client.get("/api/contacts/changes", query_string={"since": stale}).get_json()
+        self.assertTrue(body["reset"])
+        self.assertEqual(decode_token(body["next"])[0], decode_token(self.token)[0])
+
+    def test_late_commits_are_picked_up(self):
+        ids, seen, more = changed_ids([{"seq": 7, "contact_id": "a"}, {"seq": 9, "contact_id": "a"}], 10)
+        self.assertEqual((ids, seen, more), (["a"], [7, 9], False))
+        seq, gaps = advance(5, [], seen)
+        self.assertEqual((seq, gaps), (9, [6, 8]))
+        self.assertEqual(advance(seq, gaps, [8, 10]), (10, [6]))
+        # Numbers that never commit age out of the window
+        self.assertEqual(advance(10, [6], [2000]), (2000, list(range(1900, 2000))))
+
+        # A write that took its number first but committed after a later one
+        self.db.tables["contact_changes"].sort(key=lambda r: r["seq"])
+        self.db._serials["contact_changes"] += 1
+        late = self.db._serials["contact_changes"]
+        self.client.put("/api/contacts/c5", json={"status": "לא פעיל"})
+        self.assertEqual([c["id"] for c in self.sync()["contacts"]], ["c5"])
+        self.db.load("contact_changes", [{"contact_id": "c6"}])
+        self.db.tables["contact_changes"][-1]["seq"] = late
+        self.assertEqual([c["id"] for c in self.sync()["contacts"]], ["c6"])
+        self.assertEqual(self.sync()["contacts"], [])
+
+
+class ContactDetailCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.db = make_db(3)
+        self.client = use_db(self.db)
+
+    def test_repeat_views_hit_cache_and_revalidate(self):
+        first = self.client.get("/api/contacts/c1")
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+        self.db.reset_counters()
+
+        again = self.client.get("/api/contacts/c1")
+        self.assertEqual(again.get_data(), first.get_data())
+        not_modified = self.client.get("/api/contacts/c1", headers={"If-None-Match": etag})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.get_data(), b"")
+        self.assertEqual(self.db.calls, 0)
+
+        stats = self.client.get("/api/cache/stats").get_json()["contact_detail"]
+        self.assertGreaterEqual(stats["hits"], 2)
+
+    def test_writes_invalidate_only_their_contact(self):
+        etag = self.client.get("/api/contacts/c1").headers["ETag"]
+        self.client.get("/api/contacts/c2")
+
+        self.client.post("/api/interactions", json={"contact_id": "c1", "type": "מייל", "summary": "חדש"})
+        self.db.reset_counters()
+        res = self.client.get("/api/contacts/c1", headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.get_json()["interactions"]), 3)
+        self.client.get("/api/contacts/c2")
+        self.assertEqual(self.db.calls, 2)
+
+        self.client.delete("/api/interactions/i1-0")
+        self.assertEqual(len(self.client.get("/api/contacts/c1").get_json()["interactions"]), 2)
+
+        self.client.put("/api/contacts/c1", json={"name": "שם חדש"})
+        self.assertEqual(self.client.get("/api/contacts/c1").get_json()["contact"]["name"], "שם חדש")
+
+        self.client.delete("/api/contacts/c1")
+        self.assertEqual(self.client.get("/api/contacts/c1").status_code, 404)
+
+    def test_version_store_invalidates_other_workers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "versions.sqlite3")
+            worker_a = TTLCache("contact", versions=VersionStore(path))
+            worker_b = TTLCache("contact", versions=VersionStore(path))
+            worker_b.set("c1", "old", worker_b.version("c1"))
+            worker_a.invalidate("c1")
+            self.assertIsNone(worker_b.get("c1"))
+
+    def test_lru_and_ttl_bounds(self):
+        now = [0.0]
+        cache = TTLCache("t", maxsize=2, ttl=10, clock=lambda: now[0])
+        for key in ("a", "b", "c"):
+            cache.set(key, key, cache.version(key))
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), "c")
+        now[0] = 11
+        self.assertIsNone(cache.get("c"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.db = make_db(3, interactions_per_contact=0)
+        self.db.load("contacts", [
+            {"id": "k1", "name": "רונית כהן", "email": "ronit@alpha.co.il", "company": 'אלפא בע"מ',
+             "status": "לקוח פעיל", "created_at": "2024-03-01T00:00:00"},
+            {"id": "k2", "name": "שָׁלוֹם לוי", "email": "", "company": "בטא", "status": "ליד",
+             "created_at": "2024-03-02T00:00:00"},
+            {"id": "k3", "name": "רונית כהן-לוי", "email": "", "company": "", "status": "ליד",
+             "created_at": "2024-03-03T00:00:00"},
+        ])
+        self.client = use_db(self.db)
+
+    def search(self, term, **params):
+        res = self.client.get("/api/contacts", query_string=dict(params, search=term))
+        self.assertEqual(res.status_code, 200)
+        return [c["id"] for c in res.get_json()["contacts"]]
+
+    def test_hebrew_normalization(self):
+        self.assertEqual(normalize('בע״מ'), normalize("בעמ"))
+        self.assertEqual(normalize("שָׁלוֹם"), "שלומ")
+        self.assertEqual(normalize("כהן־לוי, ג׳ורג'"), "כהנ לוי גורג")
+        self.assertEqual(self.search("בעמ"), ["k1"])
+        self.assertEqual(self.search('בע"מ'), ["k1"])
+        self.assertEqual(self.search("שלום"), ["k2"])
+        self.assertEqual(self.search("כהן"), ["k3", "k1"])
+        self.assertEqual(self.search("ALPHA.CO"), ["k1"])
+
+    def test_prefix_substring_status_and_paging(self):
+        self.assertEqual(self.search("רו"), ["k3", "k1"])
+        self.assertEqual(self.search("ונית"), ["k3", "k1"])
+        self.assertEqual(self.search("ונית", status="ליד"), ["k3"])
+        res = self.client.get("/api/contacts", query_string={"search": "ונית", "limit": 1})
+        body = res.get_json()
+        self.assertEqual([c["id"] for c in body["contacts"]], ["k3"])
+        self.assertEqual(self.search("ונית", limit=1, cursor=body["next_cursor"]), ["k1"])
+        self.assertEqual(self.search("zzz"), [])
+        # One upstream call per search page: the index supplies the ids
+        self.db.reset_counters()
+        self.search("כהן")
+        self.assertEqual(self.db.calls, 1)
+
+    def test_writes_update_the_index(self):
+        created = self.client.post("/api/contacts", json={"name": "מיכל אברהם"}).get_json()["contact"]
+        self.assertEqual(self.search("אברהם"), [created["id"]])
+        self.client.put(f"/api/contacts/{created['id']}", json={"name": "מיכל יעקב"})
+        self.assertEqual(self.search("אברהם"), [])
+        self.client.delete(f"/api/contacts/{created['id']}")
+        self.assertEqual(self.search("מיכל"), [])
+
+    def test_stale_index_is_checked_against_the_database(self):
+        self.assertEqual(self.search("רונית", status="ליד"), ["k3"])
+        # Edits the index has not seen yet (another worker's, within the rebuild interval)
+        self.db.tables["contacts"][-1]["status"] = "לא פעיל"  # k3
+        self.assertEqual(self.search("רונית", status="ליד"), [])
+        self.db.tables["contacts"][-1]["status"] = "ליד"
+        self.db.table("contacts").delete().eq("id", "k3").execute()
+        body = self.client.get("/api/contacts", query_string={"search": "רונית", "limit": 1}).get_json()
+        self.assertEqual(body["contacts"], [])
+        self.assertEqual(self.search("רונית", limit=1, cursor=body["next_cursor"]), ["k1"])
+
+    def test_mention_errors_leave_the_reply_intact(self):
+        self.addCleanup(setattr, crm_app.search_index, "refresh", crm_app.search_index.refresh)
+        crm_app.search_index.refresh = lambda db: 1 / 0
+        self.assertEqual(crm_app.contact_mentions("רונית כהן"), [])
+
+    def test_other_workers_pick_up_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "changes.sqlite3")
+            worker_a, worker_b = SearchIndex(ChangeLog(path)), SearchIndex(ChangeLog(path))
+            worker_a.rebuild(self.db)
+            worker_b.rebuild(self.db)
+            self.db.tables["contacts"][0]["name"] = "יוסי מזרחי"
+            worker_a.put(self.db.tables["contacts"][0])
+            self.assertTrue(worker_b.refresh(self.db))
+            self.assertEqual(worker_b.search("מזרחי"), ["c0"])
+            worker_a.invalidate()
+            self.assertIsNone(worker_b.changes.since(worker_b.seq, worker_b.origin)[1])
+
+    def test_own_writes_during_a_rebuild_are_replayed(self):
+        index = SearchIndex()
+        wait = self.db.latency.wait
+
+        def write_after_first_page(rows):
+            self.db.latency.wait = wait
+            row = self.db.table("contacts").update({"name": "יוסי מזרחי"}).eq("id", "c0").execute().data[0]
+            index.put(row)  # not ready yet: only logged
+
+        self.db.latency.wait = write_after_first_page
+        index.rebuild(self.db)
+        self.assertEqual(index.search("מזרחי"), [])
+        self.assertTrue(index.refresh(self.db))
+        self.assertEqual(index.search("מזרחי"), ["c0"])
+
+    def test_falls_back_to_database_until_loaded(self):
+        crm_app.search_index = SearchIndex(rebuild_every=600)
+        crm_app.search_index.rebuild = lambda db: None  # keep it unloaded
+        self.assertEqual(self.search("רונית"), ["k3", "k1"])
+
+    def test_chat_reply_mentions(self):
+        index = crm_app.search_index
+        reply = 'פגישה עם "רונית כהן-לוי" מחר, ועם שלום לוי. ולרונית כהן כבר התקשרנו.'
+        mentions = index.mentions(reply)
+        self.assertEqual([m["id"] for m in mentions], ["k3", "k2"])
+        self.assertEqual([m["text"] for m in mentions], ["רונית כהן-לוי", "שלום לוי"])
+        mentions = index.mentions("שלחתי לרונית כהן וגם לאיש קשר 2")
+        self.assertEqual([(m["id"], m["text"]) for m in mentions], [("k1", "רונית כהן"), ("c2", "איש קשר 2")])
+
+
+class BulkImportTest(unittest.TestCase):
+    def setUp(self):
+        self.db = make_db(1, interactions_per_contact=0)
+        self.client = use_db(self.db)
+
+    def test_json_rows_are_validated_batched_and_reported(self):
+        rows = [{"name": f"לקוח {i}", "company": "אלפא"} for i in range(5)]
+        rows[1] = {"company": "ללא שם"}
+        rows[3]["status"] = "VIP"
+        self.db.reset_counters()
+        res = self.client.post("/api/contacts/bulk?batch_size=2", json=rows)
+        self.assertEqual(res.status_code, 200)
+        report = res.get_json()
+        self.assertEqual((report["received"], report["inserted"], report["failed"]), (5, 3, 2))
+        self.assertEqual([e["row"] for e in report["errors"]], [2, 4])
+        self.assertEqual(report["errors"][0]["error"], "name is required")
+        self.assertEqual(len(self.db.tables["contacts"]), 4)
+        # Two batches of two valid rows; the rejected second batch is retried row by row
+        self.assertEqual(self.db.calls_by_table[("contacts", "insert")], 4)
+
+    def test_streamed_csv_interactions(self):
+        body = (
+            "\ufeffcontact_id,type,summary,next_action_date\n"
+            'c0,שיחה,"שורה ראשונה\nושנייה",2024-03-01\n'
+            "missing,מייל,לקוח לא קיים,\n"
+            "c0,פגישה,,\n"
+            "c0,הערה,בלי תאריך,\n"
+        ).encode()
+        res = self.client.post("/api/interactions/bulk", data=io.BytesIO(body), content_type="text/csv")
+        report = res.get_json()
+        self.assertEqual((report["inserted"], report["failed"]), (2, 2))
+        self.assertIn("foreign key", report["errors"][0]["error"])
+        self.assertEqual(report["errors"][1], {"row": 3, "error": "summary is required"})
+        first = self.db.tables["interactions"][0]
+        self.assertEqual((first["summary"], first["next_action_date"]), ("שורה ראשונה\nושנייה", "2024-03-01"))
+        self.assertIsNone(self.db.tables["interactions"][1]["next_action_date"])
+
+    def test_malformed_upload_keeps_earlier_rows(self):
+        body = b'[{"name": "\xd7\x90"}, {"name": "b"}, {"name": '
+        res = self.client.post("/api/contacts/bulk", data=body, content_type="application/json")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.get_json()["inserted"], 2)
+
+    def test_transport_errors_abort_without_row_retries(self):
+        calls = []
+
+        def insert(batch):
+            calls.append(len(batch))
+            if len(calls) == 2:
+                raise httpx.ReadTimeout("timed out")  # the batch may have been committed
+
+        rows = ({"name": f"n{i}"} for i in range(10))
+        report = ImportReport()
+        with self.assertRaises(httpx.ReadTimeout):
+            import_rows(rows, lambda d: (d, None), insert, batch_size=4, report=report)
+        self.assertEqual(calls, [4, 4])
+        self.assertEqual((report.inserted, report.failed), (4, 0))
+
+        self.addCleanup(setattr, crm_app, "insert_contacts", crm_app.insert_contacts)
+        crm_app.insert_contacts = lambda batch: insert(batch)
+        calls.clear()
+        calls.append(0)  # the first batch times out
+        res = self.client.post("/api/contacts/bulk", json=[{"name": "a"}, {"name": "b"}])
+        self.assertEqual(res.status_code, 500)
+        self.assertEqual((res.get_json()["inserted"], calls), (0, [0, 2]))
+
+    def test_reader_and_importer_stay_incremental(self):
+        items = [{"name": f"n{i}", "tags": [1, 2.5, None]} for i in range(50)] + [7, "x"]
+        text = json.dumps(items, ensure_ascii=False).encode()
+        self.assertEqual(list(iter_json_array(io.BytesIO(text), chunk_size=7)), items)
+        self.assertEqual(list(iter_json_array(io.BytesIO(b'["x", -1.5, 2]'), chunk_size=1)), ["x", -1.5, 2])
+
+        # A bad item fails without buffering the rest of the upload
+        for bad in (b'[{"name": "a"}, {"name": nope}, ', b'[{"name": "a"}, {"name": "unterminated '):
+            stream = io.BytesIO(bad + b"x" * 1_000_000)
+            reader = iter_json_array(stream, chunk_size=1024, max_item_size=10_000)
+            self.assertEqual(next(reader), {"name": "a"})
+            with self.assertRaises(ValueError):
+                next(reader)
+            self.assertLess(stream.tell(), 20_000)
+
+        batches = []
+        rows = ({"name": f"n{i}"} for i in range(10_000))
+        report = import_rows(rows, lambda d: (d, None), lambda b: batches.append(len(b)), batch_size=300)
+        self.assertEqual(report.inserted, 10_000)
+        self.assertEqual(max(batches), 300)
+
+
+# ─── Export ─────────────────────────────────────────────────────────────────
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.db = make_db(7)
+        self.db.tables["contacts"][2]["status"] = "לקוח"
+        self.db.tables["contacts"][5]["created_at"] = "2024-01-03T09:00:00"
+        self.client = use_db(self.db)
+
+    def test_ndjson_pages_through_all_contacts(self):
+        res = self.client.get("/api/export/contacts?chunk_size=3&include=interactions")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, "application/x-ndjson")
+        self.assertIn("attachment", res.headers["Content-Disposition"])
+        rows = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+        self.assertEqual([r["id"] for r in rows], ["c0", "c1", "c2", "c3", "c4", "c6", "c5"])
+        self.assertEqual([i["id"] for i in rows[0]["interactions"]], ["i0-0", "i0-1"])
+        # 7 rows in pages of 3: one query per page, the short last page ends the scan
+        self.assertEqual(self.db.calls_by_table[("contacts", "select")], 3)
+
+    def test_csv_with_filters_and_interactions(self):
+        self.db.load("contacts", [{
+            "id": "lonely", "name": "ללא אינטראקציות", "email": "", "phone": "",
+            "company": "", "status": "ליד", "created_at": "2024-01-01T00:00:30",
+        }])
+        res = self.client.get("/api/export/contacts?format=csv&include=interactions&status=ליד&to=2024-01-01")
+        self.assertEqual(res.mimetype, "text/csv")
+        text = res.get_data(as_text=True)
+        self.assertTrue(text.startswith("\ufeffid,name,"))
+        records = list(csv.DictReader(io.StringIO(text.lstrip("\ufeff"))))
+        # c2 has another status, c5 is outside the range; the lonely contact gets one bare row
+        self.assertEqual([r["id"] for r in records], ["c0", "c0", "c1", "c1", "c3", "c3", "c4", "c4", "c6", "c6", "lonely"])
+        self.assertEqual(records[-1]["interaction_id"], "")
+        self.assertEqual(records[1]["interaction_summary"], "summary 0-1")
+
+        res = self.client.get("/api/export/contacts?format=csv&from=2024-01-02T00:00:00")
+        self.assertEqual(res.get_data(as_text=True).count("\n"), 2)
+
+    def test_failure_mid_stream_is_detectable(self):
+        wait = self.db.latency.wait
+        pages = []
+
+        def fail_second_page(rows):
+            pages.append(rows)
+            if len(pages) == 2:
+                raise httpx.ConnectError("connection reset")
+            wait(rows)
+
+        self.db.latency.wait = fail_second_page
+        res = self.client.get("/api/export/contacts?chunk_size=3")
+        lines = res.get_data(as_text=True).splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn("Export failed", json.loads(lines[-1])["error"])
+        # CSV cannot carry an error record: the stream breaks instead of ending cleanly
+        pages.clear()
+        with self.assertRaises(httpx.ConnectError):
+            self.client.get("/api/export/contacts?format=csv&chunk_size=3").get_data()
+
+    def test_bad_parameters_and_lazy_paging(self):
+        self.assertEqual(self.client.get("/api/export/contacts?format=xml").status_code, 400)
+        self.assertEqual(self.client.get("/api/export/contacts?from=yesterday").status_code, 400)
+
+        fetched = []
+
+        def fetch_page(after, limit):
+            fetched.append(after)
+            start = int(after[1]) + 1 if after else 0
+            return [{"id": str(i), "created_at": "2024"} for i in range(start, min(start + limit, 10_000))]
+
+        chunks = ndjson_chunks(iter_pages(fetch_page, chunk_size=100))
+        self.assertEqual(next(chunks).count("\n"), 100)
+        self.assertEqual(fetched, [None])
+        self.assertEqual(sum(chunk.count("\n") for chunk in chunks), 9_900)
+        self.assertEqual(len(fetched), 101)
+
+
+# ─── Dashboard ──────────────────────────────────────────────────────────────
+
+class DashboardTest(unittest.TestCase):
+    def setUp(self):
+        self.today = datetime.date(2024, 2, 1)
+        crm_app.dashboard_stats.today = lambda: self.today
+        self.addCleanup(setattr, crm_app.dashboard_stats, "today", datetime.date.today)
+
+    def dashboard(self, client):
+        res = client.get("/api/dashboard")
+        self.assertEqual(res.status_code, 200)
+        return res.get_json()
+
+    def test_counts_and_constant_cost(self):
+        calls = []
+        for n in (10, 300):
+            db = make_db(n)
+            db.tables["contacts"][0]["status"] = "לקוח פעיל"
+            data = self.dashboard(use_db(db))
+            self.assertEqual(data["total_contacts"], n)
+            self.assertEqual(data["by_status"], {"ליד": n - 1, "לקוח פעיל": 1})
+            # make_db's latest interactions (due 2024-02-02) supersede the actions due 2024-02-01
+            self.assertEqual(data["follow_up_count"], 0)
+            self.assertLessEqual(len(data["overdue_interactions"]), crm_app.dashboard_stats.overdue_limit)
+            calls.append(db.calls)
+        self.assertEqual(calls[0], calls[1])
+
+    def test_writes_keep_cached_counts_current(self):
+        db = make_db(3)
+        client = use_db(db)
+        self.dashboard(client)
+
+        client.post("/api/contacts", json={"name": "חדש", "status": "לקוח פעיל"})
+        db.reset_counters()
+        data = self.dashboard(client)
+        self.assertEqual(db.calls, 0)
+        self.assertEqual(data["by_status"]["לקוח פעיל"], 1)
+        self.assertEqual(data["total_contacts"], 4)
+
+        client.put("/api/contacts/c0", json={"status": "לא פעיל"})
+        data = self.dashboard(client)
+        self.assertEqual(data["by_status"], {"ליד": 2, "לא פעיל": 1, "לקוח פעיל": 1})
+
+        created = client.post("/api/interactions", json={
+            "contact_id": "c1", "type": "שיחה", "summary": "x", "next_action_date": "2024-01-15",
+        }).get_json()
+        data = self.dashboard(client)
+        self.assertEqual(data["follow_up_count"], 1)
+        overdue = data["overdue_interactions"][0]
+        self.assertEqual(overdue["contact_id"], "c1")
+        # Same row shape as the original endpoint: "id" is the interaction's id
+        self.assertEqual(sorted(overdue), ["contact_id", "id", "next_action", "next_action_date", "summary", "type"])
+        self.assertEqual(overdue["id"], created["interaction"]["id"])
+
+        client.delete("/api/contacts/c1")
+        data = self.dashboard(client)
+        self.assertEqual(data["total_contacts"], 3)
+        self.assertEqual(data["follow_up_count"], 0)
+
+    def test_midnight_rollover_recounts_follow_ups(self):
+        client = use_db(make_db(3))
+        self.assertEqual(self.dashboard(client)["follow_up_count"], 0)
+        self.today = datetime.date(2024, 2, 2)
+        self.assertEqual(self.dashboard(client)["follow_up_count"], 3)
+
+
+class FollowUpAgendaTest(unittest.TestCase):
+    def setUp(self):
+        crm_app.follow_up_agenda.today = lambda: datetime.date(2024, 2, 1)
+        self.addCleanup(setattr, crm_app.follow_up_agenda, "today", datetime.date.today)
+
+    def agenda(self, client, **params):
+        res = client.get("/api/follow-ups", query_string=params)
+        self.assertEqual(res.status_code, 200)
+        return res.get_json()
+
+    def test_latest_open_action_per_contact_in_buckets(self):
+        db = make_db(0)
+        dates = {
+            "a": ["2024-01-20", "2024-02-05"],  # superseded by a later action this week
+            "b": ["2024-01-25"],
+            "c": ["2024-01-28", None],          # closed by an interaction without one
+            "d": ["2024-02-01"],
+            "e": ["2024-02-20"],                # beyond this week
+        }
+        for contact_id, due_dates in dates.items():
+            db.load("contacts", [{"id": contact_id, "name": f"לקוח {contact_id}", "created_at": "2024-01-01"}])
+            db.load("interactions", [{
+                "id": f"{contact_id}{j}", "contact_id": contact_id, "type": "שיחה", "summary": "s",
+                "next_action_date": due, "created_at": f"2024-01-0{j + 1}T00:00:00",
+            } for j, due in enumerate(due_dates)])
+        client = use_db(db)
+
+        data = self.agenda(client)
+        self.assertEqual(
+            [(f["contact_id"], f["bucket"]) for f in data["follow_ups"]],
+            [("b", "overdue"), ("d", "today"), ("a", "week")],
+        )
+        self.assertEqual(data["follow_ups"][2]["next_action_date"], "2024-02-05")
+        self.assertEqual(data["follow_ups"][0]["contact_name"], "לקוח b")
+        self.assertEqual(data["counts"], {"overdue": 1, "today": 1, "week": 1})
+        self.assertEqual([f["contact_id"] for f in self.agenda(client, bucket="overdue")["follow_ups"]], ["b"])
+        # Read from the precomputed table, never by scanning interactions
+        self.assertEqual(db.calls_by_table[("interactions", "select")], 0)
+
+    def test_pages_and_refreshes_on_interaction_writes(self):
+        db = make_db(30)
+        client = use_db(db)
+        seen, cursor = [], None
+        while True:
+            db.reset_counters()
+            params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+            data = self.agenda(client, **params)
+            # One page query, plus the three bucket counts alongside the first page
+            self.assertEqual(db.calls, 1 if cursor else 4)
+            seen += [f["contact_id"] for f in data["follow_ups"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, sorted(f"c{i}" for i in range(30)))
+
+        client.post("/api/interactions", json={
+            "contact_id": "c3", "type": "מייל", "summary": "דחוף", "next_action_date": "2024-01-10",
+        })
+        client.post("/api/interactions", json={"contact_id": "c4", "type": "הערה", "summary": "טופל"})
+        data = self.agenda(client)
+        self.assertEqual(data["follow_ups"][0]["contact_id"], "c3")
+        self.assertEqual(data["counts"], {"overdue": 1, "today": 0, "week": 28})
+
+        client.delete("/api/contacts/c3")
+        self.assertEqual(self.agenda(client)["counts"]["overdue"], 0)
+        self.assertEqual(client.get("/api/follow-ups?bucket=soon").status_code, 400)
+        self.assertEqual(client.get("/api/follow-ups?cursor=nope").status_code, 400)
+
+
+# ─── AI Chat ────────────────────────────────────────────────────────────────
+
+class ChatPlanCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.client = use_db(make_db(5))
+        stub_openai(self)
+        bench.StubOpenAI.calls = 0
+
+    def ask(self, message):
+        res = self.client.post("/api/chat", json={"message": message, "api_key": "sk-test"})
+        self.assertEqual(res.status_code, 200)
+        return res.get_json()["reply"]
+
+    def test_repeat_question_skips_plan_call(self):
+        self.ask("מי צריך מעקב היום?")
+        self.assertEqual(bench.StubOpenAI.calls, 2)
+        self.ask("  מי צריך   מעקב היום ")
+        self.assertEqual(bench.StubOpenAI.calls, 3)
+        stats = self.client.get("/api/cache/stats").get_json()["chat_plans"]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_key_depends_on_date_and_prompt(self):
+        key = PlanCache.key("שאלה", "2024-01-01", "prompt")
+        self.assertNotEqual(key, PlanCache.key("שאלה", "2024-01-02", "prompt"))
+        self.assertNotEqual(key, PlanCache.key("שאלה", "2024-01-01", "other prompt"))
+        self.assertEqual(key, PlanCache.key(" שאלה? ", "2024-01-01", "prompt"))
+
+    def test_bounded_and_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "plans.sqlite3")
+            worker_a, worker_b = PlanCache(path, maxsize=2), PlanCache(path, maxsize=2)
+            for i in range(3):
+                worker_a.put(f"k{i}", {"table": "contacts", "n": i}, "2024-01-01", 100.0)
+            self.assertIsNone(worker_b.get("k0"))
+            self.assertEqual(worker_b.get("k2"), {"table": "contacts", "n": 2})
+            worker_a.put("k3", {"table": "contacts"}, "2024-01-02", 100.0)
+            self.assertEqual(worker_b.stats()["size"], 1)
+            self.assertEqual(worker_a.stats()["model_ms_saved"], 100.0)
+
+    def test_hits_are_written_in_batches(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "plans.sqlite3")
+            now = [0.0]
+            cache = PlanCache(path, flush_interval=10, clock=lambda: now[0])
+            cache.put("k", {"table": "contacts"}, "2024-01-01", 100.0)
+            db = sqlite3.connect(path)
+            self.addCleanup(db.close)
+            written = db.execute("SELECT last_used FROM plans").fetchone()[0]
+            for _ in range(3):
+                cache.get("k")
+            self.assertEqual(db.execute("SELECT last_used FROM plans").fetchone()[0], written)
+            self.assertEqual(db.execute("SELECT COUNT(*) FROM plan_stats").fetchone()[0], 0)
+
+            now[0] = 10
+            cache.get("k")  # the interval has passed: this hit writes the batch
+            self.assertGreater(db.execute("SELECT last_used FROM plans").fetchone()[0], written)
+            self.assertEqual(dict(db.execute("SELECT name, value FROM plan_stats")), {"hits": 4, "saved_ms": 400.0})
+            cache.get("missing")
+            self.assertEqual(cache.stats()["misses"], 1)  # stats() flushes what is pending
+
+
+class ChatAggregateTest(unittest.TestCase):
+    def aggregate(self, db, aggregate, **plan):
+        plan = validate_plan(dict(plan, aggregate=aggregate))
+        use_db(db)
+        db.reset_counters()
+        rows, total = crm_app.execute_plan(plan, max_rows=200)
+        self.assertEqual(db.calls, 1)
+        self.assertEqual(len(rows), total)
+        return rows
+
+    def test_group_by_joined_column_runs_in_one_call(self):
+        db = make_db(4, interactions_per_contact=3)
+        rows = self.aggregate(
+            db, {"function": "count", "group_by": ["contacts.name"]},
+            table="interactions", filters=[{"column": "next_action_date", "op": "gte", "value": "2024-02-02"}],
+            limit=3,
+        )
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0], {"contacts.name": rows[0]["contacts.name"], "count": 2})
+        self.assertEqual(list(db.calls_by_table), [("rpc/crm_aggregate", "rpc")])
+
+    def test_date_buckets_and_min_max(self):
+        db = make_db(3, interactions_per_contact=3)
+        rows = self.aggregate(
+            db, {"function": "count", "group_by": [{"column": "created_at", "bucket": "week"}]},
+            table="interactions",
+        )
+        self.assertEqual(rows, [{"created_at_week": "2024-01-01", "count": 9}])
+        rows = self.aggregate(db, {"function": "max", "column": "next_action_date"}, table="interactions")
+        self.assertEqual(rows, [{"max_next_action_date": "2024-02-03"}])
+        rows = self.aggregate(db, {"function": "count"}, filters=[{"column": "status", "op": "eq", "value": "לקוח פעיל"}])
+        self.assertEqual(rows, [{"count": 0}])
+
+    def test_plans_are_checked_against_the_schema(self):
+        bad = [
+            {"table": "users"},
+            {"table": "contacts", "filters": [{"column": "salary", "op": "eq", "value": 1}]},
+            {"table": "contacts", "filters": [{"column": "name", "op": "regex", "value": "x"}]},
+            {"table": "contacts", "filters": [{"column": "contacts.name", "op": "eq", "value": "x"}]},
+            {"table": "contacts", "aggregate": {"function": "sum", "column": "name"}},
+            {"table": "contacts", "aggregate": {"function": "max"}},
+            {"table": "contacts", "aggregate": {"group_by": [{"column": "company", "bucket": "month"}]}},
+            {"table": "interactions", "aggregate": {"group_by": ["contact_id"]}},
+            {"table": "contacts", "aggregate": {"group_by": ["interactions.type"]}},
+            {"table": "contacts", "limit": "ten"},
+            {"table": "contacts", "filters": ["name"]},
+            {"table": "contacts", "filters": [{"column": 3}]},
+            {"table": "contacts", "order": "name"},
+        ]
+        for plan in bad:
+            with self.assertRaises(ValueError, msg=plan):
+                validate_plan(plan)
+        self.assertEqual(validate_plan({"table": "contacts"})["filters"], [])
+        for plan in ({"filters": [{"column": "created_at", "op": "ilike", "value": "%2024%"}]},
+                     {"filters": [{"column": "created_at", "op": "lt", "value": None}]}):
+            with self.assertRaises(ValueError, msg=plan):
+                validate_plan(plan)
+        # The model sometimes sends numbers as strings
+        self.assertEqual(validate_plan({"limit": "10"})["limit"], 10)
+        self.assertEqual(validate_plan({"limit": 10 ** 9})["limit"], 1000)
+        self.assertIsNone(validate_plan({"limit": None})["limit"])
+        use_db(make_db(30))
+        rows, total = crm_app.execute_plan(validate_plan({"table": "contacts", "limit": "5"}), max_rows=10)
+        self.assertEqual((len(rows), total), (5, 5))
+
+    def test_row_plans_filter_through_an_inner_embed(self):
+        db = make_db(4, interactions_per_contact=2)
+        db.tables["contacts"][1]["status"] = "לקוח פעיל"
+        use_db(db)
+        plan = validate_plan({"table": "interactions", "select": "*, contacts(name)",
+                              "filters": [{"column": "contacts.status", "op": "eq", "value": "לקוח פעיל"}]})
+        self.assertEqual(plan["select"], "*, contacts!inner(name)")
+        rows, total = crm_app.execute_plan(plan, max_rows=50)
+        self.assertEqual((total, {r["contact_id"] for r in rows}), (2, {"c1"}))
+        # Without !inner PostgREST only nulls the embed and keeps every row
+        rows, total = crm_app.execute_plan(dict(plan, select="*, contacts(name)"), max_rows=50)
+        self.assertEqual(total, 8)
+
+        plan = validate_plan({"table": "interactions", "select": "id, summary",
+                              "filters": [{"column": "contacts.status", "op": "eq", "value": "לקוח פעיל"}]})
+        self.assertEqual(plan["select"], "id, summary, contacts!inner(status)")
+        self.assertEqual(crm_app.execute_plan(plan, max_rows=50)[1], 2)
+
+        # A null value is a null test, not the string "None"
+        db.tables["interactions"][0]["next_action"] = None
+        plan = validate_plan({"table": "interactions",
+                              "filters": [{"column": "next_action", "op": "eq", "value": None}]})
+        self.assertEqual(plan["filters"][0]["op"], "is_null")
+        expected = sum(r["next_action"] is None for r in db.tables["interactions"])
+        self.assertEqual(crm_app.execute_plan(plan, max_rows=50)[1], expected)
+        rows = self.aggregate(db, {"function": "count"}, table="interactions",
+                              filters=[{"column": "next_action", "op": "neq", "value": None}])
+        self.assertEqual(rows, [{"count": 8 - expected}])
+
+    def test_invalid_model_plan_falls_back_to_conversation(self):
+        class BadPlanOpenAI(bench.StubOpenAI):
+            @classmethod
+            def plan(cls):
+                return {"table": "contacts", "filters": [{"column": "password", "op": "eq", "value": "x"}]}
+
+        db = make_db(2)
+        client = use_db(db)
+        stub_openai(self, BadPlanOpenAI)
+        res = client.post("/api/chat", json={"message": "סיסמה?", "api_key": "sk-test"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(db.calls, 0)
+
+
+class ChatCompactionTest(unittest.TestCase):
+    def test_prunes_caps_and_fits_budget(self):
+        rows = [
+            {
+                "id": f"i{i}", "contact_id": f"c{i}", "type": "שיחה", "next_action": None,
+                "summary": "שיחת מעקב " * 80, "created_at": "2024-01-01T10:15:30.123456+00:00",
+                "contacts": {"name": f"איש קשר {i}"},
+            }
+            for i in range(500)
+        ]
+        text, stats = compact_rows(rows, total=1200, token_budget=2000, max_rows=100, max_text=100)
+        payload = json.loads(text.split("\n")[0])
+        self.assertEqual(payload["columns"], ["type", "summary", "created_at", "contacts.name"])
+        self.assertEqual(payload["rows"][0][2], "2024-01-01T10:15+00:00")
+        self.assertLessEqual(stats["rows_sent"], 100)
+        self.assertLessEqual(stats["tokens"], 2000 + 30)
+        self.assertEqual(stats["rows_omitted"], 1200 - stats["rows_sent"])
+        self.assertIn(f"{stats['rows_omitted']} שורות נוספות הושמטו", text)
+        self.assertLess(stats["tokens"] * 10, stats["tokens_uncompacted"])
+
+    def test_small_results_are_sent_whole(self):
+        text, stats = compact_rows([{"id": "c1", "name": "דנה"}])
+        self.assertEqual(text, '{"columns":["name"],"rows":[["דנה"]]}')
+        self.assertEqual(stats["rows_omitted"], 0)
+
+    def test_timestamps_keep_their_offset(self):
+        rows = [{"at": "2024-03-01T22:30:05+02:00"}, {"at": "2024-03-01T20:30:05.5Z"}, {"at": "2024-03-01T22:30:05"}]
+        text, _ = compact_rows(rows)
+        self.assertEqual(json.loads(text)["rows"], [["2024-03-01T22:30+02:00"], ["2024-03-01T20:30Z"], ["2024-03-01T22:30"]])
+
+    def test_requested_and_aggregate_ids_are_kept(self):
+        rows = [{"id": "i1", "contact_id": "c1", "type": "שיחה", "contacts": {"id": "c1", "name": "דנה"}}]
+        keep = selected_columns("contact_id, type, contacts(id, name)")
+        text, _ = compact_rows(rows, keep=keep)
+        self.assertEqual(json.loads(text)["columns"], ["contact_id", "type", "contacts.id", "contacts.name"])
+        text, _ = compact_rows([{"contact_id": "c1", "count": 4}], prune_ids=False)
+        self.assertEqual(json.loads(text)["columns"], ["contact_id", "count"])
+
+    def test_uncompacted_size_covers_rows_not_fetched(self):
+        rows = [{"name": f"איש קשר {i}", "company": "אלפא"} for i in range(10)]
+        _, fetched = compact_rows(rows)
+        _, capped = compact_rows(rows, total=100)
+        self.assertAlmostEqual(capped["tokens_uncompacted"], fetched["tokens_uncompacted"] * 10, delta=10)
+
+    def test_query_fetches_at_most_the_cap(self):
+        use_db(make_db(30))
+        rows, total = crm_app.execute_plan({"table": "contacts", "select": "*"}, max_rows=10)
+        self.assertEqual((len(rows), total), (10, 30))
+        rows, total = crm_app.execute_plan({"table": "contacts", "select": "*", "limit": 5}, max_rows=10)
+        self.assertEqual((len(rows), total), (5, 5))
+
+    def test_chat_records_tokens_sent(self):
+        client = use_db(make_db(5))
+        stub_openai(self)
+        before = client.get("/api/chat/stats").get_json()
+        client.post("/api/chat", json={"message": "מי צריך מעקב?", "api_key": "sk-test"})
+        after = client.get("/api/chat/stats").get_json()
+        self.assertEqual(after["requests"], before["requests"] + 1)
+        self.assertGreater(after["result_tokens_sent"], before["result_tokens_sent"])
+        self.assertGreater(after["result_tokens_saved"], before["result_tokens_saved"])
+
+
+class ChatStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.client = use_db(make_db(5))
+        stub_openai(self)
+
+    def events(self, res):
+        parsed = []
+        for block in res.get_data(as_text=True).strip().split("\n\n"):
+            event, data = block.split("\n")
+            parsed.append((event[len("event: "):], json.loads(data[len("data: "):])))
+        return parsed
+
+    def test_progress_then_tokens(self):
+        res = self.client.post("/api/chat/stream", json={"message": "מי צריך מעקב?", "api_key": "sk-test"})
+        self.assertEqual(res.mimetype, "text/event-stream")
+        events = self.events(res)
+        names = [name for name, _ in events]
+        self.assertEqual(names[:2], ["plan", "rows"])
+        self.assertEqual(names[-1], "done")
+        reply = "".join(data["text"] for name, data in events if name == "token")
+        self.assertEqual(reply.strip(), "נמצאו מספר אנשי קשר שדורשים מעקב היום.")
+
+        plain = self.client.post("/api/chat", json={"message": "מי צריך מעקב?", "api_key": "sk-test"})
+        self.assertEqual(plain.get_json()["reply"], reply.strip())
+
+    def test_validation_errors_are_plain_json(self):
+        res = self.client.post("/api/chat/stream", json={"message": "שלום"})
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("error", res.get_json())
+
+    def test_client_errors_become_an_error_event(self):
+        with mock.patch.object(crm_app.openai_pool, "factory", side_effect=RuntimeError("no client")), \
+                mock.patch.object(crm_app.openai_pool, "release") as release:
+            res = self.client.post("/api/chat/stream", json={"message": "שלום", "api_key": "sk-test"})
+            events = self.events(res)
+        self.assertEqual(events, [("error", {"error": "Chat error: no client"})])
+        release.assert_not_called()
+
+
+class ClientPoolTest(unittest.TestCase):
+    class Client:
+        def __init__(self, api_key):
+            self.api_key = api_key
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+    def test_reuse_idle_eviction_and_deferred_close(self):
+        now = [0.0]
+        pool = ClientPool(self.Client, maxsize=1, idle_ttl=60, clock=lambda: now[0])
+        with pool.client("sk-a") as first:
+            pass
+        with pool.client("sk-a") as second:
+            self.assertIs(first, second)
+        self.assertNotIn("sk-a", str(pool._entries))
+
+        busy = pool.acquire("sk-a")
+        other = pool.acquire("sk-b")  # over maxsize, but sk-a is still in use
+        self.assertFalse(busy.closed)
+        pool.release(busy)
+        self.assertTrue(busy.closed)
+
+        pool.release(other)
+        now[0] = 61
+        pool.acquire("sk-c")
+        self.assertTrue(other.closed)
+        self.assertEqual(pool.stats()["created"], 3)
+
+    def test_chat_requests_share_one_client(self):
+        client = use_db(make_db(2))
+        stub_openai(self)
+        before = crm_app.openai_pool.stats()
+        for _ in range(3):
+            client.post("/api/chat", json={"message": "כמה לידים?", "api_key": "sk-test"})
+        after = client.get("/api/cache/stats").get_json()["openai_clients"]
+        self.assertEqual(after["created"] - before["created"], 1)
+        self.assertEqual(after["reused"] - before["reused"], 2)
+
+
+# ─── Response encoding ──────────────────────────────────────────────────────
+
+class ResponseEncodingTest(unittest.TestCase):
+    def setUp(self):
+        self.client = use_db(make_db(60))
+
+    def test_large_json_is_compressed_when_accepted(self):
+        plain = self.client.get("/api/contacts?limit=60")
+        self.assertIsNone(plain.headers.get("Content-Encoding"))
+        self.assertIn("איש קשר".encode(), plain.get_data())  # UTF-8, not \u-escaped
+
+        res = self.client.get("/api/contacts?limit=60", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(res.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", res.headers["Vary"])
+        self.assertEqual(gzip.decompress(res.get_data()), plain.get_data())
+
+        small = self.client.get("/api/health", headers={"Accept-Encoding": "gzip"})
+        self.assertIsNone(small.headers.get("Content-Encoding"))
+        stub_openai(self)
+        stream = self.client.post("/api/chat/stream", json={"message": "מי?", "api_key": "sk-test"},
+                                  headers={"Accept-Encoding": "gzip"})
+        self.assertIsNone(stream.headers.get("Content-Encoding"))
+        # Drain it here: an unfinished stream_with_context generator pops its
+        # contexts in whichever test later collects it, and fails there
+        self.assertIn(b"event: done", stream.get_data())
+
+    def test_compressed_detail_revalidates_with_weak_etag(self):
+        self.addCleanup(setattr, crm_app.compressor, "min_size", crm_app.compressor.min_size)
+        crm_app.compressor.min_size = 64
+        res = self.client.get("/api/contacts/c1", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(res.headers["Content-Encoding"], "gzip")
+        etag = res.headers["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+        again = self.client.get("/api/contacts/c1", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+
+    def test_encoders_agree(self):
+        payload = {
+            "name": "שרה", "n": 2**70, "d": datetime.date(2024, 3, 1), 1: [None, 1.5, True],
+            "when": datetime.datetime(2024, 3, 1, 12, 30), "amount": decimal.Decimal("9.90"),
+        }
+        encoded = {}
+        for encoder in ("orjson", "stdlib"):
+            try:
+                provider = FastJSONProvider(crm_app.app, encoder=encoder)
+            except ValueError:
+                continue
+            encoded[encoder] = json.loads(provider.response(payload).get_data())
+            self.assertEqual(provider.loads(provider.dumps(["א", {"b": 1}])), ["א", {"b": 1}])
+        self.assertEqual(len({json.dumps(v, sort_keys=True) for v in encoded.values()}), 1)
+        with self.assertRaises(ValueError):
+            FastJSONProvider(crm_app.app, encoder="yaml")
+
+
+# ─── Tracing and metrics ────────────────────────────────────────────────────
+
+class TracingTest(unittest.TestCase):
+    """Runs the real Supabase client over an httpx mock transport, so the span hooks fire."""
+
+    def setUp(self):
+        self.delay = 0
+
+        def handler(request):
+            time.sleep(self.delay)
+            if request.url.path.endswith("/contacts"):
+                return httpx.Response(200, json=[{"id": "c1", "name": "דנה"}])
+            return httpx.Response(200, json=[])
+
+        use_db(FakeSupabase())
+        self.addCleanup(setattr, crm_app, "tracer", crm_app.tracer)
+        self.addCleanup(setattr, crm_app, "supabase", crm_app.supabase)
+        crm_app.tracer = Tracer(slow_ms=0)
+        http = httpx.Client(
+            transport=httpx.MockTransport(handler), event_hooks=crm_app.tracer.httpx_hooks("supabase")
+        )
+        crm_app.supabase = create_client(
+            "https://example.supabase.co", "key", options=ClientOptions(httpx_client=http)
+        )
+        self.client = crm_app.app.test_client()
+
+    def test_spans_follow_the_request_into_query_pool_threads(self):
+        res = self.client.get("/api/contacts/c1", buffered=True)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('supabase;dur=', res.headers["Server-Timing"])
+        self.assertIn('desc="2 calls"', res.headers["Server-Timing"])
+
+        metrics = self.client.get("/api/metrics", buffered=True)
+        self.assertTrue(metrics.content_type.startswith("text/plain; version=0.0.4"))
+        text = metrics.get_data(as_text=True)
+        route = 'route="/api/contacts/<contact_id>"'
+        self.assertIn(f'crm_http_requests_total{{method="GET",{route},status="200"}} 1', text)
+        self.assertIn(f'crm_upstream_calls_per_request_bucket{{{route},service="supabase",le="1"}} 0', text)
+        self.assertIn(f'crm_upstream_calls_per_request_bucket{{{route},service="supabase",le="2"}} 1', text)
+        self.assertIn('crm_upstream_duration_seconds_count{service="supabase",operation="GET interactions"} 1', text)
+
+    def test_slow_requests_keep_spans_and_profile(self):
+        crm_app.tracer.slow_ms = 20
+        crm_app.tracer.profile_rate = 1.0
+        crm_app.tracer.profiler.interval = 0.002
+        self.delay = 0.03
+        self.client.get("/api/contacts/c1", buffered=True)
+        self.delay = 0
+        self.client.get("/api/health", buffered=True)
+
+        reports = self.client.get("/api/metrics/slow").get_json()["requests"]
+        self.assertEqual([r["route"] for r in reports], ["/api/contacts/<contact_id>"])
+        self.assertEqual(sorted(s["operation"] for s in reports[0]["spans"]), ["GET contacts", "GET interactions"])
+        self.assertGreater(reports[0]["samples"], 0)
+        self.assertTrue(any("app.py:get_contact" in s["stack"] for s in reports[0]["stacks"]))
+
+    def test_prometheus_rendering(self):
+        registry = Registry()
+        hist = registry.histogram("t_seconds", "Help.", ("name",), buckets=(0.1, 1))
+        hist.observe(0.05, 'a"b')
+        hist.observe(5, 'a"b')
+        registry.counter("t_total", "Count.").inc(amount=2)
+        self.assertEqual(registry.render().splitlines()[2:], [
+            't_seconds_bucket{name="a\\"b",le="0.1"} 1',
+            't_seconds_bucket{name="a\\"b",le="1"} 1',
+            't_seconds_bucket{name="a\\"b",le="+Inf"} 2',
+            't_seconds_sum{name="a\\"b"} 5.05',
+            't_seconds_count{name="a\\"b"} 2',
+            "# HELP t_total Count.",
+            "# TYPE t_total counter",
+            "t_total 2",
+        ])
+
+
+# ─── Parallel queries ───────────────────────────────────────────────────────
+
+class QueryPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = QueryPool(max_workers=4, fanout=3)
+        self.addCleanup(self.pool.shutdown)
+
+    def test_calls_overlap_and_keep_order(self):
+        barrier = threading.Barrier(3, timeout=2)
+        results = self.pool.gather(*[lambda i=i: (barrier.wait(), i)[1] for i in range(3)])
+        self.assertEqual(results, [0, 1, 2])
+
+    def test_fanout_bounds_calls_in_flight(self):
+        lock, state = threading.Lock(), {"now": 0, "peak": 0}
+
+        def call():
+            with lock:
+                state["now"] += 1
+                state["peak"] = max(state["peak"], state["now"])
+            time.sleep(0.01)
+            with lock:
+                state["now"] -= 1
+            return 1
+
+        self.assertEqual(self.pool.gather(*[call] * 9), [1] * 9)
+        self.assertEqual(state["peak"], 3)
+        # Nested fan-out from a pool thread runs inline instead of waiting on the pool
+        self.assertEqual(self.pool.gather(lambda: 0, lambda: self.pool.gather(*[call] * 5)), [0, [1] * 5])
+
+    def test_errors_propagate_and_cancel_pending_calls(self):
+        started = []
+
+        def fail():
+            raise KeyError("boom")
+
+        def slow(i):
+            started.append(i)
+            time.sleep(0.05)
+
+        with self.assertRaises(KeyError):
+            self.pool.gather(fail, *[lambda i=i: slow(i) for i in range(6)])
+        time.sleep(0.1)
+        self.assertLess(len(started), 6)
+
+    def test_endpoints_wait_for_the_slowest_query_not_the_sum(self):
+        db = make_db(3)
+        client = use_db(db)
+        db.latency = LatencyModel(base_ms=40)
+        for path, serial_calls in (("/api/contacts/c1", 2), ("/api/dashboard", 5)):
+            started = time.perf_counter()
+            self.assertEqual(client.get(path).status_code, 200)
+            elapsed = (time.perf_counter() - started) * 1000
+            self.assertLess(elapsed, 40 * serial_calls - 20, path)
+
+
+# ─── Read coalescing ────────────────────────────────────────────────────────
+
+class SingleFlightTest(unittest.TestCase):
+    def run_concurrently(self, n, target):
+        results = [None] * n
+
+        def run(i):
+            try:
+                results[i] = target()
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        return threads, results
+
+    def test_concurrent_calls_share_one_result_or_error(self):
+        flights = SingleFlight(timeout=5)
+        release, calls = threading.Event(), []
+
+        def load():
+            calls.append(1)
+            release.wait(2)
+            if len(calls) == 2:
+                raise KeyError("boom")
+            return "body"
+
+        for n, expected in enumerate(("body", KeyError), 1):
+            threads, results = self.run_concurrently(5, lambda: flights.do(("contacts", "a"), load))
+            while flights.stats()["coalesced"] < 4 * n:
+                time.sleep(0.005)
+            release.set()
+            for t in threads:
+                t.join()
+            release.clear()
+            if expected == "body":
+                self.assertEqual(results, ["body"] * 5)
+            else:
+                # The leader sees its own error; each waiter a fresh one chained to it
+                self.assertEqual(sum(isinstance(r, KeyError) for r in results), 1)
+                waiters = [r for r in results if isinstance(r, FlightError)]
+                self.assertEqual(len(waiters), 4)
+                self.assertTrue(all(isinstance(r.__cause__, KeyError) for r in waiters))
+                self.assertEqual(len({id(r) for r in waiters}), 4)
+        stats = flights.stats()
+        self.assertEqual((stats["upstream_calls"], stats["coalesced"], stats["errors"]), (2, 8, 1))
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_waiters_time_out_and_stuck_flights_are_not_joined(self):
+        now = [0.0]
+        flights = SingleFlight(timeout=1, clock=lambda: now[0])
+        release = threading.Event()
+        threads, _ = self.run_concurrently(1, lambda: flights.do("dashboard", lambda: release.wait(2)))
+        while flights.stats()["in_flight"] == 0:
+            time.sleep(0.005)
+        flights.forget("contacts")  # writes only drop the routes they affect
+        self.assertEqual(flights.stats()["in_flight"], 1)
+        now[0] = 0.95  # waiters share the flight's deadline, 1s after it began
+        with self.assertRaises(FlightTimeout):
+            flights.do("dashboard", lambda: "unused")
+        self.assertEqual(flights.stats()["timeouts"], 1)
+        now[0] = 1.5
+        self.assertEqual(flights.do("dashboard", lambda: "fresh"), "fresh")
+        flights.forget("contacts", "dashboard")
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(flights.stats()["upstream_calls"], 2)
+
+    def test_identical_list_requests_make_one_upstream_call(self):
+        db = make_db(20)
+        use_db(db)
+        db.latency = LatencyModel(base_ms=100)
+        barrier = threading.Barrier(6, timeout=2)
+
+        def get(path):
+            client = crm_app.app.test_client()
+            barrier.wait()
+            res = client.get(path)
+            return res.status_code, res.get_json()
+
+        before = crm_app.read_flights.stats()["coalesced"]
+        threads, results = self.run_concurrently(6, lambda: get("/api/contacts?limit=5"))
+        for t in threads:
+            t.join()
+        self.assertEqual(db.calls, 1)
+        self.assertEqual(len({json.dumps(r, sort_keys=True) for r in results}), 1)
+        self.assertEqual(results[0][0], 200)
+        self.assertEqual(crm_app.read_flights.stats()["coalesced"] - before, 5)
+
+        # A different page is a different read
+        client = crm_app.app.test_client()
+        self.assertEqual(len(client.get("/api/contacts?limit=6").get_json()["contacts"]), 6)
+        self.assertEqual(db.calls, 2)
+
+
+# ─── Static frontend server ─────────────────────────────────────────────────
+
+class StaticServerTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        with open(os.path.join(self.root, "app.js"), "w") as f:
+            f.write("console.log('שלום');\n" * 100)
+        with open(os.path.join(self.root, "index.html"), "w") as f:
+            f.write('<script src="runtime-config.js"></script><script src="app.js?v=4"></script>')
+        for name in (".env", "requirements.txt"):
+            with open(os.path.join(self.root, name), "w") as f:
+                f.write("SECRET=1\n")
+        self.server = static_server.make_server(self.root, 0, runtime_config="window.X = 1;\n", host="127.0.0.1")
+        self.server.RequestHandlerClass.quiet = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.conn = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=5)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get(self, path, **headers):
+        self.conn.request("GET", path, headers=headers)
+        res = self.conn.getresponse()
+        return res, res.read()
+
+    def test_compressed_variant_and_revalidation(self):
+        _, page = self.get("/")
+        src = page.decode().split('src="')[2].split('"')[0]
+        self.assertRegex(src, r"^app\.js\?v=[0-9a-f]{20}$")
+        res, body = self.get("/" + src, **{"Accept-Encoding": "deflate, gzip;q=0.5"})
+        self.assertEqual(res.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(gzip.decompress(body).decode().count("שלום"), 100)
+        self.assertIn("immutable", res.getheader("Cache-Control"))
+        self.assertEqual(res.getheader("Vary"), "Accept-Encoding")
+
+        res, body = self.get("/app.js", **{"Accept-Encoding": "gzip;q=0", "If-None-Match": res.getheader("ETag")})
+        # The identity representation has its own ETag, so the gzip one does not match it
+        self.assertEqual((res.status, res.getheader("Content-Encoding")), (200, None))
+        self.assertEqual(res.getheader("Cache-Control"), "no-cache")
+        res, body = self.get("/app.js", **{"If-None-Match": res.getheader("ETag")})
+        self.assertEqual((res.status, body), (304, b""))
+        res, _ = self.get("/app.js", **{"If-Modified-Since": res.getheader("Last-Modified")})
+        self.assertEqual(res.status, 304)
+        # A stale or made-up version must not be pinned for a year
+        res, _ = self.get("/app.js?v=4")
+        self.assertEqual(res.getheader("Cache-Control"), "no-cache")
+
+    def test_only_cached_assets_are_served(self):
+        self.assertEqual(self.get("/runtime-config.js")[1], b"window.X = 1;\n")
+        self.assertEqual(self.get("/.env")[0].status, 404)
+        self.assertEqual(self.get("/requirements.txt")[0].status, 404)
+        self.assertEqual(self.get("/../test.py")[0].status, 404)
+
+
+# ─── Benchmark harness ──────────────────────────────────────────────────────
+
+class ColdStartTest(unittest.TestCase):
+    def test_import_app_defers_sdks(self):
+        code = "import sys, app; print(sorted({'openai', 'supabase', 'httpx'} & set(sys.modules)))"
+        out = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(crm_app.__file__),
+                             capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), "[]")
+
+    def test_lazy_client_builds_once_per_process(self):
+        built = []
+        lazy = LazyClient(lambda: built.append(object()) or httpx.URL(f"https://db{len(built)}.test"))
+        self.assertEqual(built, [])
+        self.assertEqual(lazy.host, "db1.test")
+        self.assertIs(lazy.get(), lazy.get())
+        self.assertEqual(len(built), 1)
+        lazy._pid = -1  # as if inherited across a fork
+        self.assertEqual(lazy.host, "db2.test")
+
+    def test_import_budget(self):
+        argv = ["--skip-serving", "--import-runs", "1", "--budget-ms", "100000"]
+        self.assertEqual(bench_serving.main(argv), 0)
+        self.assertEqual(bench_serving.main(argv[:-1] + ["0"]), 1)
+
+
+class BenchTest(unittest.TestCase):
+    def test_smoke_run_and_baseline_compare(self):
+        argv = ["--contacts", "200", "--requests", "5", "--db-latency-ms", "0",
+                "--db-jitter-ms", "0", "--model-latency-ms", "0"]
+        self.assertEqual(bench.main(argv), 0)
+
+    def test_compare_flags_regressions(self):
+        baseline = {"results": {"contacts": {
+            "p50_ms": 10, "p95_ms": 20, "p99_ms": 30, "throughput_rps": 100,
+            "upstream_calls": 1, "model_calls": 0,
+        }}}
+        current = {"contacts": dict(baseline["results"]["contacts"], upstream_calls=3, throughput_rps=50)}
+        regressions = bench.compare(current, baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()